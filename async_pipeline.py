@@ -0,0 +1,186 @@
+"""
+基于 asyncio 的转录流程：各阶段与同步流程共用 init.TranscriptionJob，
+yt-dlp 与 ffmpeg 以异步子进程运行（取消任务时随之结束），
+模型推理交给有界线程池，日志与进度以异步迭代器的形式输出
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+import init
+
+# 同时进行推理的最大任务数（推理受 GPU/CPU 限制，无需太多线程）
+INFERENCE_WORKERS = 2
+_inference_executor = None
+
+@dataclass
+class PipelineEvent:
+    kind: str  # "log" | "stage" | "progress" | "done" | "error"
+    input_source: str
+    message: str = ""
+    stage: Optional[str] = None
+    progress: Optional[float] = None
+    result: Any = None
+    timestamp: float = field(default_factory=time.time)
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    global _inference_executor
+    if _inference_executor is None:
+        _inference_executor = ThreadPoolExecutor(
+            max_workers=INFERENCE_WORKERS, thread_name_prefix="inference"
+        )
+    return _inference_executor
+
+
+async def run_in_inference_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_inference_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_output_stages_async(transcription_job: init.TranscriptionJob):
+    """输出阶段并行时各占一个推理线程，等全部结束后再返回"""
+    if not transcription_job.runs_output_stages_in_parallel():
+        for stage_name in transcription_job.output_stages:
+            await run_in_inference_executor(
+                transcription_job.run_output_stage, stage_name
+            )
+        return
+    transcription_job.enter_parallel_stages()
+    stage_results = await asyncio.gather(
+        *(
+            run_in_inference_executor(
+                transcription_job.run_parallel_output_stage, stage_name
+            )
+            for stage_name in transcription_job.output_stages
+        ),
+        return_exceptions=True,
+    )
+    for stage_result in stage_results:
+        if isinstance(stage_result, BaseException):
+            raise stage_result
+
+
+async def run_full_transcription_pipeline_async(
+    input_source: str,
+    output_format_choice: str = "both",
+    logger_callback=print,
+    stage_callback=None,
+    progress_callback=None,
+    time_range=None,
+) -> list[Path]:
+    """
+    run_full_transcription_pipeline 的异步版本，各阶段与之共用 init.TranscriptionJob。
+    所有回调都可能在工作线程中被调用，需自行保证线程安全。
+    """
+    transcription_job = init.TranscriptionJob(
+        input_source,
+        output_format_choice,
+        logger_callback=logger_callback,
+        stage_callback=stage_callback,
+        progress_callback=progress_callback,
+        time_range=time_range,
+    )
+    # 链接规范化可能需要联网探测，模型预加载也较慢
+    await asyncio.to_thread(transcription_job.prepare)
+    try:
+        if transcription_job.cut_from_full_result:
+            has_speech = await asyncio.to_thread(
+                transcription_job.cut_recognition_result
+            )
+        else:
+            await transcription_job.download_async()
+            await transcription_job.transcode_async()
+            has_speech = await run_in_inference_executor(
+                transcription_job.detect_speech
+            )
+            if has_speech:
+                await run_in_inference_executor(transcription_job.recognize)
+        if has_speech:
+            await run_output_stages_async(transcription_job)
+            final_produced_files = await asyncio.to_thread(
+                transcription_job.copy_outputs
+            )
+            await asyncio.to_thread(transcription_job.progress_tracker.finish)
+    except BaseException:
+        transcription_job.finish_profiling(failed=True)
+        raise
+    await asyncio.to_thread(transcription_job.finish_profiling)
+    if not has_speech:
+        return []
+
+    transcription_job.logger.info("[任务状态] 所有流程均已成功执行完毕")
+    return final_produced_files
+
+
+async def stream_transcription_pipeline(
+    input_source: str, output_format_choice: str = "both", time_range=None
+) -> AsyncIterator[PipelineEvent]:
+    """
+    以异步迭代器形式运行流程，逐条产出日志、阶段、进度与结束事件。
+    进度事件的 result 为 progress.ProgressUpdate。
+    最后一个事件的 kind 为 "done"（result 为生成的文件列表）或 "error"。
+    time_range 的含义与 run_full_transcription_pipeline 相同。
+    """
+    loop = asyncio.get_running_loop()
+    event_queue: asyncio.Queue = asyncio.Queue()
+    current_stage = None
+
+    def publish(event: PipelineEvent):
+        loop.call_soon_threadsafe(event_queue.put_nowait, event)
+
+    def logger_callback(message):
+        publish(PipelineEvent("log", input_source, str(message), stage=current_stage))
+
+    def stage_callback(stage_name):
+        nonlocal current_stage
+        current_stage = stage_name
+        publish(PipelineEvent("stage", input_source, stage=stage_name))
+
+    def progress_callback(progress_update):
+        publish(
+            PipelineEvent(
+                "progress",
+                input_source,
+                stage=progress_update.stage,
+                progress=progress_update.overall_fraction,
+                result=progress_update,
+            )
+        )
+
+    async def run_and_finish():
+        try:
+            result_files = await run_full_transcription_pipeline_async(
+                input_source,
+                output_format_choice,
+                logger_callback=logger_callback,
+                stage_callback=stage_callback,
+                progress_callback=progress_callback,
+                time_range=time_range,
+            )
+            publish(
+                PipelineEvent("done", input_source, progress=1.0, result=result_files)
+            )
+        except Exception as error:
+            publish(
+                PipelineEvent("error", input_source, str(error), stage=current_stage)
+            )
+
+    pipeline_task = asyncio.create_task(run_and_finish())
+    try:
+        while True:
+            event = await event_queue.get()
+            yield event
+            if event.kind in ("done", "error"):
+                break
+    finally:
+        if not pipeline_task.done():
+            pipeline_task.cancel()
+        await asyncio.gather(pipeline_task, return_exceptions=True)
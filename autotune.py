@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+推理参数自动调优：在本机上用短小的测试负载测量 paraformer-zh 与 ct-punc 在不同
+批大小（每批音频秒数）和 torch 线程数下的吞吐量，把最优组合保存为本机配置，
+之后加载模型与推理时自动使用。
+
+    python autotune.py calibrate [--cpu]     测量并保存配置
+    python autotune.py show                  查看已保存的配置
+
+torch 的 inter-op 线程数每个进程只能设置一次，因此每个 inter-op 取值在单独的子进程中测量。
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_PROFILE_DIRECTORY = Path("jobs")
+# 测试负载的长度：足够覆盖多个批次，又不会让调优耗时过长
+CALIBRATION_AUDIO_SECONDS = 120
+CALIBRATION_PUNC_TOKENS = 2000
+CALIBRATION_BATCH_SIZES_S = (60, 120, 300, 600)
+CALIBRATION_INTER_OP_THREADS = (1, 2, 4)
+# 每个组合先预热一次再计时，取多次中的最好成绩
+CALIBRATION_REPEATS = 2
+
+# 没有缓存音频时使用的合成负载：带静音间隔的谐波音节，使 VAD 切出多个片段
+_SYNTHETIC_SEED = 20240611
+_SYNTHETIC_PUNC_SENTENCE = (
+    "今天 我们 来 讨论 一下 这个 问题 的 解决 方法 首先 需要 明确 目标 然后 "
+    "逐步 分析 每 一个 环节 最后 总结 经验"
+)
+
+_thread_settings_applied = False
+_apply_lock = threading.Lock()
+_loaded_profiles = {}
+
+
+def default_profile_path(profile_directory: Path = DEFAULT_PROFILE_DIRECTORY) -> Path:
+    """与 RTF 历史相同，按主机名区分，多台机器可共享同一个 jobs/ 目录"""
+    return profile_directory / f"autotune_{platform.node() or 'local'}.json"
+
+
+def load_tuning_profile(device: str, profile_path: Optional[Path] = None) -> dict:
+    """返回指定设备的调优配置，未调优时返回空字典"""
+    profile_path = Path(profile_path or default_profile_path())
+    if profile_path not in _loaded_profiles:
+        try:
+            with open(profile_path, encoding="utf-8") as f:
+                _loaded_profiles[profile_path] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            _loaded_profiles[profile_path] = {}
+    return _loaded_profiles[profile_path].get(device, {})
+
+
+def save_tuning_profile(device: str, device_profile: dict, profile_path: Path):
+    try:
+        with open(profile_path, encoding="utf-8") as f:
+            saved_profiles = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        saved_profiles = {}
+    saved_profiles[device] = device_profile
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = profile_path.with_suffix(".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(saved_profiles, f, ensure_ascii=False, indent=2)
+    temporary_path.replace(profile_path)
+    _loaded_profiles.pop(profile_path, None)
+
+
+def get_intra_op_threads(model_kind: str, device: str) -> Optional[int]:
+    """model_kind 为 "speech" 或 "punc"，未调优时返回 None（使用 FunASR 默认值）"""
+    return load_tuning_profile(device).get(model_kind, {}).get("intra_op_threads")
+
+
+def get_process_intra_op_threads(device: str) -> Optional[int]:
+    """
+    整个进程使用的 intra-op 线程数。torch 的线程数是进程全局的，
+    各阶段并行推理时无法按模型切换，统一使用耗时最多的语音识别的调优值
+    """
+    return get_intra_op_threads("speech", device)
+
+
+def get_model_init_options(model_kind: str, device: str) -> dict:
+    """
+    传给 AutoModel 的额外参数。FunASR 在加载模型时按 ncpu 设置 torch 线程数，
+    各模型都传入进程统一的线程数，后台加载模型时不会改写正在推理的阶段的设置
+    """
+    intra_op_threads = get_process_intra_op_threads(device)
+    return {} if intra_op_threads is None else {"ncpu": intra_op_threads}
+
+
+def get_generate_options(model_kind: str, device: str) -> dict:
+    """传给 generate 的额外参数"""
+    batch_size_s = load_tuning_profile(device).get(model_kind, {}).get("batch_size_s")
+    return {} if batch_size_s is None else {"batch_size_s": batch_size_s}
+
+
+def apply_thread_settings(device: str):
+    """
+    在首次推理前设置 torch 线程数，每个进程只生效一次：inter-op 线程数只能在首次
+    并行计算前设置，intra-op 线程数是全局的，推理期间再改写会影响并行的其他阶段
+    """
+    global _thread_settings_applied
+    with _apply_lock:
+        if _thread_settings_applied:
+            return
+        _thread_settings_applied = True
+        device_profile = load_tuning_profile(device)
+        if not device_profile:
+            return
+        import torch
+
+        inter_op_threads = device_profile.get("inter_op_threads")
+        if inter_op_threads is not None:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                # 已经执行过并行计算，保持当前设置
+                pass
+        intra_op_threads = get_process_intra_op_threads(device)
+        if intra_op_threads is not None:
+            torch.set_num_threads(intra_op_threads)
+
+
+def get_intra_op_candidates(cpu_count: int) -> list[int]:
+    candidates = {cpu_count}
+    thread_count = 1
+    while thread_count < cpu_count:
+        candidates.add(thread_count)
+        thread_count *= 2
+    return sorted(candidates)
+
+
+def find_cached_audio(jobs_directory: Path) -> Optional[Path]:
+    """优先用已有任务的真实音频做测试负载"""
+    for audio_path in sorted(jobs_directory.glob("*/02_audio/audio.wav")):
+        if (audio_path.parent / "donefile").exists():
+            return audio_path
+    return None
+
+
+def build_synthetic_audio(duration_seconds: int, sampling_rate: int = 16000):
+    import numpy as np
+
+    random_generator = np.random.default_rng(_SYNTHETIC_SEED)
+    audio = np.zeros(duration_seconds * sampling_rate, dtype=np.float32)
+    position = 0
+    while position < len(audio):
+        syllable_length = int(random_generator.uniform(2.0, 5.0) * sampling_rate)
+        sample_times = np.arange(syllable_length) / sampling_rate
+        base_pitch = random_generator.uniform(100, 250)
+        pitch = base_pitch * (1 + 0.1 * np.sin(3 * sample_times))
+        phase = 2 * np.pi * np.cumsum(pitch) / sampling_rate
+        syllable = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+        syllable *= 0.5 + 0.5 * np.sin(2 * np.pi * 4 * sample_times) ** 2
+        syllable += random_generator.normal(0, 0.02, syllable_length)
+        end = min(position + syllable_length, len(audio))
+        audio[position:end] = 0.2 * syllable[: end - position]
+        position = end + int(random_generator.uniform(0.5, 1.5) * sampling_rate)
+    return audio
+
+
+def load_calibration_audio(jobs_directory: Path, logger_callback=print):
+    import init
+
+    cached_audio_path = find_cached_audio(jobs_directory)
+    if cached_audio_path is None:
+        logger_callback("[调优] 没有缓存的任务音频，使用合成音频")
+        return build_synthetic_audio(
+            CALIBRATION_AUDIO_SECONDS, init.AUDIO_SAMPLING_RATE
+        )
+    logger_callback(f"[调优] 使用 {cached_audio_path} 的前 {CALIBRATION_AUDIO_SECONDS} 秒")
+    return init.read_wav_samples(cached_audio_path, 0, CALIBRATION_AUDIO_SECONDS * 1000)
+
+
+def load_calibration_tokens(jobs_directory: Path) -> list[str]:
+    tokens = []
+    for result_path in sorted(jobs_directory.glob("*/03_result/result.json")):
+        with open(result_path, encoding="utf-8") as f:
+            tokens = json.load(f)["text"].split()
+        if len(tokens) >= CALIBRATION_PUNC_TOKENS:
+            break
+    if len(tokens) < CALIBRATION_PUNC_TOKENS:
+        sentence_tokens = _SYNTHETIC_PUNC_SENTENCE.split()
+        tokens = sentence_tokens * (CALIBRATION_PUNC_TOKENS // len(sentence_tokens) + 1)
+    return tokens[:CALIBRATION_PUNC_TOKENS]
+
+
+def time_best_of(workload) -> float:
+    workload()
+    best_seconds = float("inf")
+    for _ in range(CALIBRATION_REPEATS):
+        start_timestamp = time.perf_counter()
+        workload()
+        best_seconds = min(best_seconds, time.perf_counter() - start_timestamp)
+    return best_seconds
+
+
+def split_punctuation_windows(tokens: list[str]) -> list[list[str]]:
+    import init
+
+    window_size = init.PUNC_WINDOW_TOKENS + 2 * init.PUNC_CONTEXT_TOKENS
+    return [
+        tokens[window_start : window_start + window_size]
+        for window_start in range(0, len(tokens), window_size)
+    ]
+
+
+def measure_command(cli_args):
+    """在固定的 inter-op 线程数下测量各组合，每个结果输出一行 JSON"""
+    import torch
+
+    torch.set_num_interop_threads(cli_args.inter_op_threads)
+    import init
+
+    init.FORCE_CPU_INFERENCE = cli_args.device == "cpu"
+    speech_model = init.model.request_model(*init.get_speech_model_spec())
+    punc_model = init.model.request_model(*init.get_punc_model_spec())
+    audio = load_calibration_audio(cli_args.jobs_dir, logger_callback=lambda _: None)
+    audio_seconds = len(audio) / init.AUDIO_SAMPLING_RATE
+    calibration_tokens = load_calibration_tokens(cli_args.jobs_dir)
+    punc_windows = [
+        " ".join(window_tokens)
+        for window_tokens in split_punctuation_windows(calibration_tokens)
+    ]
+
+    def emit(measurement: dict):
+        measurement["inter_op_threads"] = cli_args.inter_op_threads
+        print(json.dumps(measurement), flush=True)
+
+    for intra_op_threads in cli_args.intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+        for batch_size_s in cli_args.batch_sizes:
+            elapsed_seconds = time_best_of(
+                lambda: speech_model.generate(input=audio, batch_size_s=batch_size_s)
+            )
+            emit(
+                {
+                    "model": "speech",
+                    "intra_op_threads": intra_op_threads,
+                    "batch_size_s": batch_size_s,
+                    "throughput": audio_seconds / elapsed_seconds,
+                }
+            )
+        elapsed_seconds = time_best_of(
+            lambda: [punc_model.generate(input=window) for window in punc_windows]
+        )
+        emit(
+            {
+                "model": "punc",
+                "intra_op_threads": intra_op_threads,
+                "throughput": CALIBRATION_PUNC_TOKENS / elapsed_seconds,
+            }
+        )
+
+
+def run_measurement_process(
+    device: str,
+    inter_op_threads: int,
+    intra_op_candidates: list[int],
+    jobs_directory: Path,
+    logger_callback=print,
+) -> list[dict]:
+    measure_command_line = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "measure",
+        "--device",
+        device,
+        "--jobs-dir",
+        str(jobs_directory),
+        "--inter-op-threads",
+        str(inter_op_threads),
+        "--intra-op-threads",
+        *map(str, intra_op_candidates),
+        "--batch-sizes",
+        *map(str, CALIBRATION_BATCH_SIZES_S),
+    ]
+    measurements = []
+    with subprocess.Popen(
+        measure_command_line,
+        stdout=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    ) as measure_process:
+        for output_line in measure_process.stdout:
+            if not output_line.startswith("{"):
+                continue
+            measurement = json.loads(output_line)
+            measurements.append(measurement)
+            logger_callback(format_measurement(measurement))
+    if measure_process.returncode != 0:
+        logger_callback(f"[调优] inter-op={inter_op_threads} 的测量进程异常退出")
+    return measurements
+
+
+def format_measurement(measurement: dict) -> str:
+    if measurement["model"] == "speech":
+        return (
+            f"  识别 inter={measurement['inter_op_threads']} "
+            f"intra={measurement['intra_op_threads']} "
+            f"batch={measurement['batch_size_s']}s: "
+            f"{measurement['throughput']:.1f} 秒音频/秒"
+        )
+    return (
+        f"  标点 inter={measurement['inter_op_threads']} "
+        f"intra={measurement['intra_op_threads']}: "
+        f"{measurement['throughput']:.0f} 词/秒"
+    )
+
+
+def select_best_profile(measurements: list[dict], cpu_count: int) -> dict:
+    """
+    inter-op 线程数对整个进程生效，按识别吞吐量选取；
+    在该 inter-op 取值下，识别与标点分别选吞吐量最高的组合
+    """
+    speech_measurements = [m for m in measurements if m["model"] == "speech"]
+    best_speech = max(speech_measurements, key=lambda m: m["throughput"])
+    inter_op_threads = best_speech["inter_op_threads"]
+    best_punc = max(
+        (
+            m
+            for m in measurements
+            if m["model"] == "punc" and m["inter_op_threads"] == inter_op_threads
+        ),
+        key=lambda m: m["throughput"],
+    )
+    return {
+        "calibrated_at": datetime.now().isoformat(timespec="seconds"),
+        "cpu_count": cpu_count,
+        "inter_op_threads": inter_op_threads,
+        "speech": {
+            "intra_op_threads": best_speech["intra_op_threads"],
+            "batch_size_s": best_speech["batch_size_s"],
+            "throughput": round(best_speech["throughput"], 2),
+        },
+        "punc": {
+            "intra_op_threads": best_punc["intra_op_threads"],
+            "throughput": round(best_punc["throughput"], 2),
+        },
+    }
+
+
+def calibrate(
+    device: str, jobs_directory: Path, profile_path: Path, logger_callback=print
+) -> Optional[dict]:
+    cpu_count = os.cpu_count() or 1
+    intra_op_candidates = get_intra_op_candidates(cpu_count)
+    inter_op_candidates = [
+        thread_count
+        for thread_count in CALIBRATION_INTER_OP_THREADS
+        if thread_count <= cpu_count
+    ]
+    logger_callback(
+        f"[调优] 设备 {device}，{cpu_count} 个 CPU 核心，"
+        f"intra-op 候选 {intra_op_candidates}，inter-op 候选 {inter_op_candidates}，"
+        f"批大小候选 {list(CALIBRATION_BATCH_SIZES_S)} 秒"
+    )
+    measurements = []
+    for inter_op_threads in inter_op_candidates:
+        measurements += run_measurement_process(
+            device,
+            inter_op_threads,
+            intra_op_candidates,
+            jobs_directory,
+            logger_callback=logger_callback,
+        )
+    if not any(m["model"] == "speech" for m in measurements):
+        logger_callback("[调优] 没有得到任何测量结果，配置未保存")
+        return None
+    device_profile = select_best_profile(measurements, cpu_count)
+    save_tuning_profile(device, device_profile, profile_path)
+    logger_callback(f"[调优] 已保存到 {profile_path}")
+    return device_profile
+
+
+def main():
+    cli_parser = argparse.ArgumentParser(description="推理参数自动调优")
+    subparsers = cli_parser.add_subparsers(dest="command", required=True)
+
+    calibrate_parser = subparsers.add_parser("calibrate", help="测量并保存本机最优配置")
+    calibrate_parser.add_argument("--cpu", action="store_true", help="针对 CPU 推理调优")
+    calibrate_parser.add_argument(
+        "--jobs-dir", type=Path, default=DEFAULT_PROFILE_DIRECTORY, help="任务目录"
+    )
+
+    show_parser = subparsers.add_parser("show", help="查看本机已保存的配置")
+    show_parser.add_argument(
+        "--jobs-dir", type=Path, default=DEFAULT_PROFILE_DIRECTORY, help="任务目录"
+    )
+
+    measure_parser = subparsers.add_parser(
+        "measure", help="在固定的 inter-op 线程数下测量（供 calibrate 调用）"
+    )
+    measure_parser.add_argument("--device", choices=["cpu", "cuda"], required=True)
+    measure_parser.add_argument("--jobs-dir", type=Path, required=True)
+    measure_parser.add_argument("--inter-op-threads", type=int, required=True)
+    measure_parser.add_argument(
+        "--intra-op-threads", type=int, nargs="+", required=True
+    )
+    measure_parser.add_argument("--batch-sizes", type=int, nargs="+", required=True)
+
+    cli_args = cli_parser.parse_args()
+    if cli_args.command == "calibrate":
+        device = "cpu" if cli_args.cpu else "cuda"
+        profile_path = default_profile_path(cli_args.jobs_dir)
+        if calibrate(device, cli_args.jobs_dir, profile_path) is None:
+            sys.exit(1)
+    elif cli_args.command == "show":
+        profile_path = default_profile_path(cli_args.jobs_dir)
+        if not profile_path.exists():
+            print(f"尚未调优: {profile_path} 不存在")
+            sys.exit(1)
+        print(profile_path.read_text(encoding="utf-8"))
+    else:
+        measure_command(cli_args)
+
+
+if __name__ == "__main__":
+    main()
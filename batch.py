@@ -1,72 +1,357 @@
 #!/usr/bin/env python3
 """
 批量处理B站视频链接 - 直接调用 init.py 的函数
+
+任务状态保存在 SQLite 队列中，重启后从中断处继续：
+    python batch.py <链接文件>              处理链接文件（等同于 run）
+    链接文件每行为 "<链接> [开始] [结束]"，指定时间范围时只转录该范围
+    python batch.py run <链接文件>
+    python batch.py status [--state failed]
+    python batch.py requeue [--state failed] [--url URL ...]
+
+多台机器共享 jobs/ 时，用任务目录中的租约文件保证每个任务只处理一次：
+    python batch.py run <链接文件> --shard 1/3 [--steal]
+    python batch.py run <链接文件> --steal     不分片，各进程动态领取
+每台机器使用自己本地的队列数据库（默认 logs/queue.sqlite3），不要放进共享的 jobs/。
 """
 
 import sys
 import time
+import argparse
 from pathlib import Path
-from datetime import datetime
 
 # 直接导入 init.py 的所有功能
 import init
+import model
+from eventlog import ConsoleSink, EventLog, JobFileSink
+from jobqueue import JobQueue, JOB_STATES
+from leases import (
+    DEFAULT_LEASE_TTL_SECONDS,
+    HEARTBEATS_PER_TTL,
+    JobLease,
+    clear_completed,
+    get_worker_id,
+    order_items_for_shard,
+    parse_shard,
+)
+from progress import ConsoleProgressPrinter, format_duration
+from timerange import parse_link_line
 
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
+QUEUE_DATABASE_PATH = LOG_DIR / "queue.sqlite3"
 
+BATCH_COMMANDS = ("run", "status", "requeue")
 
-def main():
-    if len(sys.argv) < 2:
-        print("用法: python batch.py <链接文件>")
-        sys.exit(1)
 
-    input_file = sys.argv[1]
-    if not Path(input_file).exists():
-        print(f"错误: 文件 '{input_file}' 不存在")
-        sys.exit(1)
+def open_job_queue(database_path: Path) -> JobQueue:
+    """队列数据库位于共享任务目录中时提示并改用不依赖共享内存的日志模式"""
+    on_shared_filesystem = Path(database_path).resolve().is_relative_to(
+        init.TEMPORARY_JOBS_DIRECTORY.resolve()
+    )
+    if on_shared_filesystem:
+        print(
+            f"警告: 队列数据库 {database_path} 位于共享任务目录中，"
+            "建议每台机器使用本地路径；已关闭 WAL 模式"
+        )
+    return JobQueue(database_path, on_shared_filesystem=on_shared_filesystem)
 
-    # 读取所有链接
+
+def read_link_file(input_file: str) -> list[str]:
+    """返回各行的任务描述（链接及可选的时间范围），格式错误的行会被跳过"""
     urls = []
     with open(input_file, 'r', encoding='utf-8') as f:
-        for line in f:
+        for line_number, line in enumerate(f, 1):
             line = line.strip()
             if line and not line.startswith('#'):
-                urls.append(line)
+                try:
+                    parse_link_line(line)
+                except ValueError as e:
+                    print(f"跳过第 {line_number} 行: {e}")
+                    continue
+                urls.append(" ".join(line.split()))
+    return urls
+
+
+def create_event_log() -> tuple[EventLog, JobFileSink]:
+    """控制台输出 INFO 及以上，logs/NNN.log 另外记录 yt-dlp、ffmpeg 等子进程输出"""
+    job_file_sink = JobFileSink(
+        LOG_DIR, file_name_for_job=lambda job_id: f"{job_id:03d}.log"
+    )
+    return EventLog([ConsoleSink(), job_file_sink]), job_file_sink
+
+
+def process_job(queue: JobQueue, job, event_log: EventLog):
+    """执行单个任务，返回任务的新状态 (done / pending / failed)"""
+    log_callback = event_log.get_logger("pipeline", job=job.id)
+
+    stage_timings = {}
+    current_stage = None
+    stage_started_at = time.time()
+
+    def close_current_stage():
+        if current_stage is not None:
+            stage_timings[current_stage] = round(time.time() - stage_started_at, 3)
+
+    def stage_callback(stage_name):
+        nonlocal current_stage, stage_started_at
+        close_current_stage()
+        current_stage = stage_name
+        stage_started_at = time.time()
+        queue.record_stage(job.id, stage_name, stage_timings)
+
+    try:
+        start = time.time()
+        url, time_range = parse_link_line(job.url)
+        results = init.run_full_transcription_pipeline(
+            url,
+            "text",
+            log_callback,
+            stage_callback=stage_callback,
+            progress_callback=ConsoleProgressPrinter(),
+            time_range=time_range,
+        )
+        elapsed = time.time() - start
+        close_current_stage()
+        queue.mark_done(job.id, stage_timings)
+        # 先写出排队中的日志，避免与下面直接打印的结果交错
+        event_log.flush()
+
+        print(f"  ✅ 成功 (耗时: {elapsed:.1f}秒)")
+        for r in results:
+            print(f"    生成: {Path(r).name}")
+        return "done"
+
+    except Exception as e:
+        close_current_stage()
+        event_log.flush()
+        updated_job = queue.mark_failed(
+            job.id,
+            str(e),
+            stage_timings,
+            retryable=isinstance(e, init.DownloadError),
+        )
+        if updated_job.state == "pending":
+            retry_delay = updated_job.next_attempt_at - time.time()
+            print(f"  ⚠️ 下载失败: {e}，{retry_delay:.0f} 秒后重试 (第 {updated_job.attempts} 次)")
+        else:
+            print(f"  ❌ 失败: {e}")
+        return updated_job.state
+
+
+def process_job_with_lease(
+    queue: JobQueue, job, event_log: EventLog, worker_id: str, lease_ttl: float
+):
+    """
+    先在共享任务目录上获取租约再处理；任务已被其他进程完成或正在处理时跳过，
+    返回任务的新状态，被跳过时返回 None
+    """
+    task_directory = init.get_job_directory(*parse_link_line(job.url))
+    lease = JobLease(
+        task_directory,
+        worker_id,
+        lease_ttl,
+        completion_fingerprint=init.compute_pipeline_fingerprint("text"),
+    )
+    if not lease.acquire():
+        if lease.is_completed():
+            queue.mark_done_elsewhere(job.id)
+            print("  ⏭️ 已由其他进程完成")
+            return None
+        # 持有者崩溃时租约在有效期后过期，届时再检查并接管
+        remaining_seconds = lease.seconds_until_expiry() or 0.0
+        queue.defer(job.id, max(remaining_seconds, lease_ttl / HEARTBEATS_PER_TTL))
+        holder = lease.read_holder() or {}
+        print(f"  ⏭️ 正由 {holder.get('worker', '其他进程')} 处理，稍后再检查")
+        return None
+
+    job_state = None
+    try:
+        job_state = process_job(queue, job, event_log)
+    finally:
+        lease.release(completed=job_state == "done")
+    if lease.lost.is_set():
+        print("  ⚠️ 处理期间租约被其他进程接管，该任务可能被重复处理")
+    return job_state
+
+
+def run_command(cli_args):
+    input_file = cli_args.link_file
+    if not Path(input_file).exists():
+        print(f"错误: 文件 '{input_file}' 不存在")
+        sys.exit(1)
+
+    init.PROFILE_PIPELINE = cli_args.profile
+    try:
+        shard = parse_shard(cli_args.shard) if cli_args.shard else None
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    use_leases = shard is not None or cli_args.steal
+    worker_id = get_worker_id()
+
+    queue = open_job_queue(cli_args.db)
+    event_log, job_file_sink = create_event_log()
+    model.LOGGER_CALLBACK = event_log.get_logger("model")
+    # 读取所有链接
+    urls = read_link_file(input_file)
+    if shard is not None:
+        urls = order_items_for_shard(urls, *shard, steal=cli_args.steal)
+        print(f"分片 {shard[0]}/{shard[1]}，工作进程 {worker_id}")
+    added = queue.add_urls(urls)
+    if shard is not None:
+        # 队列中可能还有以往批次或其他分片的任务，只领取本进程的链接
+        queue.restrict_claims(urls)
+    # 本机已退出的进程领取的任务立即恢复；其他机器领取的超过租约有效期后才恢复
+    recovered = queue.recover_interrupted(stale_after_seconds=cli_args.lease_ttl)
 
-    print(f"\n找到 {len(urls)} 个链接，开始处理...")
+    counts = queue.count_by_state()
+    print(f"\n找到 {len(urls)} 个链接，新增 {added} 个，恢复中断任务 {recovered} 个")
+    print(f"队列状态: 待处理 {counts['pending']}, 已完成 {counts['done']}, 失败 {counts['failed']}")
     print("=" * 60)
 
     success = 0
     failed = 0
+    retried = 0
 
-    for i, url in enumerate(urls, 1):
-        print(f"\n[{i}/{len(urls)}] 处理: {url}")
-        
-        # 自定义日志函数
-        def log_callback(msg):
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            print(f"[{timestamp}] {msg}")
-            with open(LOG_DIR / f"{i:03d}.log", 'a', encoding='utf-8') as f:
-                f.write(f"[{timestamp}] {msg}\n")
-        
-        try:
-            start = time.time()
-            results = init.run_full_transcription_pipeline(url, "text", log_callback)
-            elapsed = time.time() - start
-            
-            print(f"  ✅ 成功 (耗时: {elapsed:.1f}秒)")
-            for r in results:
-                print(f"    生成: {Path(r).name}")
+    while True:
+        job = queue.claim_next()
+        if job is None:
+            retry_delay = queue.seconds_until_next_retry()
+            if retry_delay is None:
+                break
+            print(f"\n等待 {retry_delay:.0f} 秒后重试下载失败的任务...")
+            time.sleep(retry_delay)
+            continue
+
+        counts = queue.count_by_state()
+        print(f"\n[#{job.id} 剩余 {counts['pending']}] 处理: {job.url} (第 {job.attempts} 次尝试)")
+        average_elapsed = queue.average_elapsed()
+        if average_elapsed is not None:
+            batch_eta = average_elapsed * (counts["pending"] + counts["running"])
+            print(f"  批次预计剩余: {format_duration(batch_eta)}")
+
+        if use_leases:
+            job_state = process_job_with_lease(
+                queue, job, event_log, worker_id, cli_args.lease_ttl
+            )
+            if job_state is None:
+                continue
+        else:
+            job_state = process_job(queue, job, event_log)
+        job_file_sink.close_job(job.id)
+        if job_state == "done":
             success += 1
-            
-        except Exception as e:
-            print(f"  ❌ 失败: {e}")
+        elif job_state == "pending":
+            retried += 1
+        else:
             failed += 1
-        
+
         time.sleep(2)
 
+    queue.close()
+    event_log.close()
     print("\n" + "=" * 60)
-    print(f"处理完成！成功: {success}, 失败: {failed}")
+    print(f"处理完成！成功: {success}, 失败: {failed}, 重试: {retried}")
+
+
+def status_command(cli_args):
+    queue = open_job_queue(cli_args.db)
+    counts = queue.count_by_state()
+    print(" ".join(f"{state}: {counts[state]}" for state in JOB_STATES))
+    for job in queue.list_jobs(cli_args.state):
+        line = f"#{job.id:<5} {job.state:<8} 尝试 {job.attempts} 阶段 {job.stage or '-':<10}"
+        if job.elapsed is not None:
+            line += f" 耗时 {job.elapsed:.1f}s"
+        line += f" {job.url}"
+        if job.error:
+            line += f"\n       错误: {job.error}"
+        print(line)
+    queue.close()
+
+
+def requeue_command(cli_args):
+    queue = open_job_queue(cli_args.db)
+    requeued_urls = queue.requeue(tuple(cli_args.state), urls=cli_args.url)
+    queue.close()
+    # 删除共享任务目录中的完成标记，否则使用租约时这些任务仍会被当作已由其他进程完成
+    cleared = 0
+    for url in requeued_urls:
+        task_directory = init.get_job_directory(*parse_link_line(url), offline=True)
+        cleared += clear_completed(task_directory)
+    print(f"已重新排队 {len(requeued_urls)} 个任务，清除完成标记 {cleared} 个")
+
+
+def main():
+    argv = sys.argv[1:]
+    # 兼容旧用法: python batch.py <链接文件>
+    if argv and argv[0] not in BATCH_COMMANDS and not argv[0].startswith("-"):
+        argv = ["run"] + argv
+
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument(
+        "--db",
+        type=Path,
+        default=QUEUE_DATABASE_PATH,
+        help="任务队列数据库路径，应位于本机磁盘",
+    )
+    cli_parser = argparse.ArgumentParser(description="批量处理视频链接")
+    subparsers = cli_parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run", parents=[common_parser], help="处理链接文件中的所有链接"
+    )
+    run_parser.add_argument("link_file", help="每行一个链接，# 开头为注释")
+    run_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="逐阶段记录性能数据到各任务目录的 profile/ 下",
+    )
+    run_parser.add_argument(
+        "--shard",
+        metavar="i/N",
+        help="只处理链接文件中的第 i 份（共 N 份，按行轮流分配），用租约避免重复处理",
+    )
+    run_parser.add_argument(
+        "--steal",
+        action="store_true",
+        help="处理完本分片后继续领取其他进程未处理或已崩溃的任务；不指定 --shard 时动态领取全部任务",
+    )
+    run_parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=DEFAULT_LEASE_TTL_SECONDS,
+        help="租约有效期（秒），持有者超过该时间未心跳即视为崩溃",
+    )
+    run_parser.set_defaults(handler=run_command)
+
+    status_parser = subparsers.add_parser(
+        "status", parents=[common_parser], help="查看队列状态"
+    )
+    status_parser.add_argument("--state", choices=JOB_STATES, help="只显示指定状态")
+    status_parser.set_defaults(handler=status_command)
+
+    requeue_parser = subparsers.add_parser(
+        "requeue", parents=[common_parser], help="重新排队任务"
+    )
+    requeue_parser.add_argument(
+        "--state",
+        choices=JOB_STATES,
+        action="append",
+        default=None,
+        help="按状态重新排队，可重复指定 (默认: failed)",
+    )
+    requeue_parser.add_argument("--url", action="append", help="按链接重新排队")
+    requeue_parser.set_defaults(handler=requeue_command)
+
+    if not argv:
+        print("用法: python batch.py <链接文件>")
+        sys.exit(1)
+
+    cli_args = cli_parser.parse_args(argv)
+    if cli_args.command == "requeue" and cli_args.state is None:
+        cli_args.state = ["failed"]
+    cli_args.handler(cli_args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+链接规范化：把同一视频的不同链接（短链接、分享参数、youtu.be 与 watch?v= 等）
+归一为 "站点-视频ID" 形式的资源键，并在 jobs/_keys/ 下记录资源键到任务目录的对应关系。
+
+常见站点的链接离线解析；短链接只跟随重定向，其他站点用 yt-dlp 只读取元数据，不下载媒体。
+索引为每个资源键一个小文件，用硬链接原子创建，可放在 NFS 等共享目录上供多台机器使用。
+
+    python canonical.py reindex    为已有任务补建索引
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+KEY_INDEX_DIRECTORY_NAME = "_keys"
+# 需要联网解析的输入缓存在这里，避免重复请求
+INPUT_CACHE_DIRECTORY_NAME = "_inputs"
+PROBE_TIMEOUT_SECONDS = 30
+SHORT_LINK_HOSTS = ("b23.tv",)
+
+_BILIBILI_VIDEO_PATTERN = re.compile(
+    r"/video/(BV[0-9A-Za-z]{10}|av\d+)", re.IGNORECASE
+)
+_YOUTUBE_VIDEO_ID_PATTERN = re.compile(r"^[0-9A-Za-z_-]{11}$")
+_YOUTUBE_PATH_PREFIXES = ("shorts", "live", "embed", "v")
+_UNSAFE_KEY_CHARACTERS = re.compile(r"[^0-9A-Za-z._-]")
+
+
+def normalize_host(hostname: Optional[str]) -> str:
+    host = (hostname or "").lower()
+    for prefix in ("www.", "m."):
+        host = host.removeprefix(prefix)
+    return host
+
+
+def canonicalize_bilibili_url(path: str, query: dict) -> Optional[str]:
+    video_match = _BILIBILI_VIDEO_PATTERN.search(path)
+    if video_match is None:
+        return None
+    video_id = video_match.group(1)
+    if video_id[:2].lower() == "bv":
+        video_id = "BV" + video_id[2:]
+    else:
+        video_id = video_id.lower()
+    # 多P视频的第1P与不带参数的链接相同
+    part_number = query.get("p", ["1"])[0]
+    if part_number.isdigit() and int(part_number) > 1:
+        return f"bilibili-{video_id}-p{int(part_number)}"
+    return f"bilibili-{video_id}"
+
+
+def canonicalize_youtube_url(host: str, path: str, query: dict) -> Optional[str]:
+    path_segments = [segment for segment in path.split("/") if segment]
+    video_id = None
+    if host == "youtu.be" and path_segments:
+        video_id = path_segments[0]
+    elif path == "/watch":
+        video_id = query.get("v", [None])[0]
+    elif len(path_segments) >= 2 and path_segments[0] in _YOUTUBE_PATH_PREFIXES:
+        video_id = path_segments[1]
+    if video_id and _YOUTUBE_VIDEO_ID_PATTERN.match(video_id):
+        return f"youtube-{video_id}"
+    return None
+
+
+def canonicalize_url(url: str) -> Optional[str]:
+    """离线解析资源键，无法识别时返回 None"""
+    parsed_url = urlsplit(url.strip())
+    host = normalize_host(parsed_url.hostname)
+    query = parse_qs(parsed_url.query)
+    if host == "bilibili.com" or host.endswith(".bilibili.com"):
+        return canonicalize_bilibili_url(parsed_url.path, query)
+    if host == "youtu.be" or host == "youtube.com" or host.endswith(".youtube.com"):
+        return canonicalize_youtube_url(host, parsed_url.path, query)
+    return None
+
+
+def is_network_url(input_source: str) -> bool:
+    return urlsplit(input_source.strip()).scheme in ("http", "https")
+
+
+def follow_short_link(url: str) -> Optional[str]:
+    """跟随短链接的重定向，只读取响应头"""
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    try:
+        with urllib.request.urlopen(request, timeout=PROBE_TIMEOUT_SECONDS) as response:
+            return response.geturl()
+    except OSError:
+        return None
+
+
+def probe_resource_key(probe_command: list[str]) -> Optional[str]:
+    """
+    运行只读取元数据的 yt-dlp 命令，其输出应为 "提取器\\tID\\t页面链接"。
+    页面链接能离线解析时优先使用，保证与离线解析得到的资源键一致。
+    """
+    try:
+        probe_process = subprocess.run(
+            probe_command,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=PROBE_TIMEOUT_SECONDS,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if probe_process.returncode != 0:
+        return None
+    for output_line in probe_process.stdout.splitlines():
+        probe_fields = output_line.split("\t")
+        if len(probe_fields) != 3:
+            continue
+        extractor_key, video_id, webpage_url = probe_fields
+        return canonicalize_url(webpage_url) or (
+            f"{extractor_key.lower()}-{video_id}" if video_id != "NA" else None
+        )
+    return None
+
+
+def make_safe_filename(resource_key: str) -> str:
+    safe_filename = _UNSAFE_KEY_CHARACTERS.sub("_", resource_key)
+    if safe_filename != resource_key:
+        # 替换字符后可能与其他键重名，附加原始键的摘要区分
+        safe_filename += "-" + hashlib.md5(resource_key.encode()).hexdigest()[:8]
+    return safe_filename
+
+
+class ResourceKeyIndex:
+    """jobs/_keys/<资源键> 文件中保存对应的任务目录名"""
+
+    def __init__(self, jobs_directory: Path):
+        self.jobs_directory = Path(jobs_directory)
+        self.index_directory = self.jobs_directory / KEY_INDEX_DIRECTORY_NAME
+
+    def _read_entry(self, entry_path: Path) -> Optional[str]:
+        try:
+            return entry_path.read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+
+    def _create_entry(self, entry_path: Path, value: str) -> str:
+        """原子地创建条目；已存在时保留先写入者的值并返回它"""
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = entry_path.with_name(
+            f".{entry_path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+        )
+        temporary_path.write_text(value, encoding="utf-8")
+        try:
+            # link 在目标已存在时失败，在 NFS 上同样是原子操作
+            os.link(temporary_path, entry_path)
+        except FileExistsError:
+            value = self._read_entry(entry_path) or value
+        finally:
+            temporary_path.unlink(missing_ok=True)
+        return value
+
+    def lookup(self, resource_key: str) -> Optional[str]:
+        """返回已登记且仍存在的任务目录名"""
+        task_name = self._read_entry(
+            self.index_directory / make_safe_filename(resource_key)
+        )
+        if task_name and (self.jobs_directory / task_name).is_dir():
+            return task_name
+        return None
+
+    def register(self, resource_key: str, task_name: str) -> str:
+        """
+        登记资源键并返回最终对应的任务目录名。条目已存在时以先登记者为准，
+        即使其目录尚未创建（对方可能刚登记完）或已被删除，调用方按返回的名字创建目录即可。
+        """
+        entry_path = self.index_directory / make_safe_filename(resource_key)
+        return self._create_entry(entry_path, task_name)
+
+    def _input_cache_path(self, input_source: str) -> Path:
+        return (
+            self.index_directory
+            / INPUT_CACHE_DIRECTORY_NAME
+            / hashlib.md5(input_source.encode()).hexdigest()
+        )
+
+    def resolve(
+        self,
+        input_source: str,
+        probe_command: Optional[list[str]] = None,
+        offline: bool = False,
+    ) -> Optional[str]:
+        """
+        解析输入对应的资源键：先离线解析，其次跟随短链接，最后用 probe_command 探测。
+        联网得到的结果会缓存；本地文件与无法解析的输入返回 None。
+        offline 为 True 时只用离线解析与已有缓存，不联网也不写入任何文件。
+        """
+        if not is_network_url(input_source):
+            return None
+        resource_key = canonicalize_url(input_source)
+        if resource_key is not None:
+            return resource_key
+
+        input_cache_path = self._input_cache_path(input_source)
+        resource_key = self._read_entry(input_cache_path)
+        if resource_key is not None or offline:
+            return resource_key
+        if normalize_host(urlsplit(input_source).hostname) in SHORT_LINK_HOSTS:
+            redirected_url = follow_short_link(input_source)
+            if redirected_url is not None:
+                resource_key = canonicalize_url(redirected_url)
+        if resource_key is None and probe_command is not None:
+            resource_key = probe_resource_key(probe_command)
+        if resource_key is not None:
+            self._create_entry(input_cache_path, resource_key)
+        return resource_key
+
+
+def reindex_existing_jobs(jobs_directory: Path) -> int:
+    """按各任务记录的原始链接离线补建索引，返回新登记的数量"""
+    key_index = ResourceKeyIndex(jobs_directory)
+    registered_count = 0
+    for metadata_path in sorted(jobs_directory.glob("*/01_download/raw.info.json")):
+        try:
+            with open(metadata_path, encoding="utf-8") as f:
+                original_url = json.load(f).get("original_url") or ""
+        except (OSError, json.JSONDecodeError):
+            continue
+        resource_key = canonicalize_url(original_url)
+        if resource_key is None or key_index.lookup(resource_key) is not None:
+            continue
+        key_index.register(resource_key, metadata_path.parent.parent.name)
+        registered_count += 1
+    return registered_count
+
+
+if __name__ == "__main__":
+    cli_parser = argparse.ArgumentParser(description="链接规范化索引")
+    subparsers = cli_parser.add_subparsers(dest="command", required=True)
+    reindex_parser = subparsers.add_parser("reindex", help="为已有任务补建资源键索引")
+    reindex_parser.add_argument(
+        "--jobs-dir", type=Path, default=Path("jobs"), help="任务目录"
+    )
+    key_parser = subparsers.add_parser("key", help="显示链接的离线资源键")
+    key_parser.add_argument("url")
+    cli_args = cli_parser.parse_args()
+    if cli_args.command == "reindex":
+        print(f"新登记 {reindex_existing_jobs(cli_args.jobs_dir)} 个任务")
+    else:
+        print(canonicalize_url(cli_args.url) or "无法离线解析")
@@ -0,0 +1,420 @@
+"""
+基于队列的日志：调用方只把结构化事件放入队列，格式化与写入都在后台线程中按批完成。
+
+    event_log = EventLog([ConsoleSink(), JobFileSink(Path("logs"))])
+    log = event_log.get_logger("pipeline", job=12)
+    log("开始处理")                          # 与原来的 logger_callback 用法相同
+    log.debug("已处理 %d 个切片", count)      # 级别未启用时不会格式化
+
+- 队列满时丢弃新事件并计数，不会阻塞调用方；
+- 各输出端每批只写一次：任务日志文件保持打开，GUI 每批只收到一次回调；
+- yt-dlp、ffmpeg 等输出频繁的来源可按来源限速，被省略的条数会在之后或关闭日志时汇总记录。
+"""
+
+import abc
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+DEFAULT_QUEUE_SIZE = 10000
+# 后台线程最长等待这么久就写出一批
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.2
+MAX_BATCH_EVENTS = 500
+# 子进程输出的默认限速：每个任务每个来源每秒条数与突发上限
+SUBPROCESS_RATE_PER_SECOND = 5.0
+SUBPROCESS_RATE_BURST = 20
+
+
+class LogEvent(NamedTuple):
+    created_at: float
+    level: int
+    source: str
+    job: Optional[object]
+    message: str
+    args: tuple = ()
+
+    def format_message(self) -> str:
+        if not self.args:
+            return self.message
+        try:
+            return self.message % self.args
+        except (TypeError, ValueError):
+            return f"{self.message} {self.args}"
+
+    def format_line(self) -> str:
+        timestamp = datetime.fromtimestamp(self.created_at).strftime("%H:%M:%S")
+        prefix = f"[{timestamp}]"
+        if self.level >= WARNING:
+            prefix += f" [{LEVEL_NAMES.get(self.level, self.level)}]"
+        return f"{prefix} {self.format_message()}"
+
+
+class LogSink(abc.ABC):
+    """输出端：min_level 以下的事件不会交给它"""
+
+    def __init__(self, min_level: int = INFO):
+        self.min_level = min_level
+
+    @abc.abstractmethod
+    def write_batch(self, events: list[LogEvent]):
+        """在后台线程中调用，events 按入队顺序排列"""
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(LogSink):
+    def __init__(self, min_level: int = INFO, stream=None):
+        super().__init__(min_level)
+        self.stream = stream
+
+    def write_batch(self, events: list[LogEvent]):
+        stream = self.stream or sys.stdout
+        stream.write("".join(event.format_line() + "\n" for event in events))
+        stream.flush()
+
+
+class JobFileSink(LogSink):
+    """按任务写入 <目录>/<任务>.log，文件在整个运行期间保持打开"""
+
+    def __init__(
+        self,
+        log_directory: Path,
+        min_level: int = DEBUG,
+        file_name_for_job: Callable[[object], str] = lambda job: f"{job}.log",
+    ):
+        super().__init__(min_level)
+        self.log_directory = Path(log_directory)
+        self.file_name_for_job = file_name_for_job
+        self.open_files = {}
+        self._lock = threading.Lock()
+
+    def write_batch(self, events: list[LogEvent]):
+        lines_by_job = {}
+        for event in events:
+            if event.job is not None:
+                lines_by_job.setdefault(event.job, []).append(event.format_line())
+        with self._lock:
+            self._write_job_lines(lines_by_job)
+
+    def _write_job_lines(self, lines_by_job: dict):
+        for job, job_lines in lines_by_job.items():
+            log_file = self.open_files.get(job)
+            if log_file is None:
+                self.log_directory.mkdir(parents=True, exist_ok=True)
+                log_file = open(
+                    self.log_directory / self.file_name_for_job(job),
+                    "a",
+                    encoding="utf-8",
+                )
+                self.open_files[job] = log_file
+            log_file.write("".join(line + "\n" for line in job_lines))
+            log_file.flush()
+
+    def close_job(self, job):
+        """任务结束后关闭其日志文件；之后再有该任务的事件时会重新以追加方式打开"""
+        with self._lock:
+            log_file = self.open_files.pop(job, None)
+        if log_file is not None:
+            log_file.close()
+
+    def close(self):
+        for job in list(self.open_files):
+            self.close_job(job)
+
+
+class CallbackSink(LogSink):
+    """每批调用一次 callback(已格式化的行列表)，如转发为一次 Qt 信号"""
+
+    def __init__(self, callback: Callable[[list[str]], None], min_level: int = INFO):
+        super().__init__(min_level)
+        self.callback = callback
+
+    def write_batch(self, events: list[LogEvent]):
+        self.callback([event.format_line() for event in events])
+
+
+class RateLimiter:
+    """令牌桶：每个键每秒补充 rate_per_second 个令牌，最多积累 burst 个"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key) -> tuple[bool, int]:
+        """返回 (是否放行, 放行时此前被省略的条数)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, suppressed = self._buckets.get(
+                key, (self.burst, now, 0)
+            )
+            tokens = min(
+                self.burst, tokens + (now - updated_at) * self.rate_per_second
+            )
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False, 0
+            self._buckets[key] = (tokens - 1, now, 0)
+            return True, suppressed
+
+    def take_suppressed(self) -> dict:
+        """取出各键尚未汇报的省略条数并清零"""
+        with self._lock:
+            suppressed_counts = {
+                key: suppressed
+                for key, (_, _, suppressed) in self._buckets.items()
+                if suppressed
+            }
+            for key in suppressed_counts:
+                tokens, updated_at, _ = self._buckets[key]
+                self._buckets[key] = (tokens, updated_at, 0)
+        return suppressed_counts
+
+
+class Logger:
+    """可直接作为 logger_callback 使用：调用即记录 INFO 级事件"""
+
+    def __init__(
+        self,
+        event_log: "EventLog",
+        source: str,
+        job=None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        self.event_log = event_log
+        self.source = source
+        self.job = job
+        self.rate_limiter = rate_limiter
+        # 最近一条被省略的事件的级别，汇总记录沿用该级别
+        self._suppressed_level = INFO
+
+    def log(self, level: int, message: str, *args):
+        if level < self.event_log.min_level:
+            return
+        if self.rate_limiter is not None:
+            allowed, suppressed = self.rate_limiter.allow((self.job, self.source))
+            if not allowed:
+                self._suppressed_level = level
+                return
+            if suppressed:
+                self._emit_suppressed(level, suppressed)
+        self.event_log.emit(level, self.source, self.job, message, args)
+
+    def _emit_suppressed(self, level: int, suppressed: int):
+        self.event_log.emit(
+            level,
+            self.source,
+            self.job,
+            "[已省略 %d 条 %s 输出]",
+            (suppressed, self.source),
+        )
+
+    def flush_suppressed(self):
+        """记录限速后尚未汇报的省略条数；之后再没有放行的事件时由 EventLog.close 调用"""
+        if self.rate_limiter is None:
+            return
+        for suppressed in self.rate_limiter.take_suppressed().values():
+            self._emit_suppressed(self._suppressed_level, suppressed)
+
+    def __call__(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def debug(self, message: str, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message: str, *args):
+        self.log(ERROR, message, *args)
+
+    def with_source(
+        self, source: str, rate_per_second: Optional[float] = None, burst: int = 1
+    ) -> "Logger":
+        """同一任务下的另一个来源，可单独限速；同一任务的同一来源共用一个令牌桶"""
+        if rate_per_second is None:
+            return Logger(self.event_log, source, self.job)
+        return self.event_log.get_rate_limited_logger(
+            source, self.job, rate_per_second, burst
+        )
+
+
+class CallbackLogger:
+    """
+    把 print、GUI 信号等只接收一条消息的回调包装成与 Logger 相同的接口：
+    DEBUG 级不输出，警告与错误在消息前加上级别，其余与直接调用回调相同
+    """
+
+    LEVEL_PREFIXES = {WARNING: "[警告] ", ERROR: "[错误] "}
+
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
+
+    def log(self, level: int, message: str, *args):
+        if level < INFO:
+            return
+        event = LogEvent(time.time(), level, "", None, message, args)
+        self.callback(self.LEVEL_PREFIXES.get(level, "") + event.format_message())
+
+    def __call__(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def debug(self, message: str, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message: str, *args):
+        self.log(ERROR, message, *args)
+
+
+def as_logger(logger_callback):
+    """Logger 原样返回，其他回调包装为 CallbackLogger，以便按级别记录并延迟格式化"""
+    if isinstance(logger_callback, (Logger, CallbackLogger)):
+        return logger_callback
+    return CallbackLogger(logger_callback)
+
+
+def get_subprocess_output_logger(logger_callback, source: str):
+    """
+    为子进程的逐行输出取得限速的 DEBUG 级记录函数；
+    logger_callback 不是 Logger（如 print）时返回 None，保持原来不记录的行为
+    """
+    if not isinstance(logger_callback, Logger):
+        return None
+    return logger_callback.with_source(
+        source, SUBPROCESS_RATE_PER_SECOND, SUBPROCESS_RATE_BURST
+    ).debug
+
+
+class EventLog:
+    def __init__(
+        self,
+        sinks: list[LogSink],
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.sinks = sinks
+        self.min_level = min(sink.min_level for sink in sinks)
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dropped_count = 0
+        self._dropped_lock = threading.Lock()
+        # 按 (任务, 来源) 复用的限速 Logger，关闭时汇报其尚未汇报的省略条数
+        self._rate_limited_loggers = {}
+        self._rate_limited_lock = threading.Lock()
+        self._closed = False
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop, name="event-log-writer", daemon=True
+        )
+        self._writer_thread.start()
+
+    def get_logger(self, source: str, job=None) -> Logger:
+        return Logger(self, source, job)
+
+    def get_rate_limited_logger(
+        self, source: str, job, rate_per_second: float, burst: int
+    ) -> Logger:
+        with self._rate_limited_lock:
+            logger = self._rate_limited_loggers.get((job, source))
+            if logger is None:
+                logger = Logger(
+                    self, source, job, RateLimiter(rate_per_second, burst)
+                )
+                self._rate_limited_loggers[(job, source)] = logger
+            return logger
+
+    def emit(self, level: int, source: str, job, message: str, args: tuple = ()):
+        try:
+            self._queue.put_nowait(
+                LogEvent(time.time(), level, source, job, message, args)
+            )
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped_count += 1
+
+    def _take_dropped_count(self) -> int:
+        with self._dropped_lock:
+            dropped_count, self._dropped_count = self._dropped_count, 0
+        return dropped_count
+
+    def _writer_loop(self):
+        while True:
+            try:
+                first_event = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                continue
+            batch = [first_event]
+            while len(batch) < MAX_BATCH_EVENTS:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop_requested = None in batch
+            events = [event for event in batch if event is not None]
+            dropped_count = self._take_dropped_count()
+            if dropped_count:
+                events.append(
+                    LogEvent(
+                        time.time(),
+                        WARNING,
+                        "eventlog",
+                        None,
+                        "[日志队列已满，丢弃 %d 条]",
+                        (dropped_count,),
+                    )
+                )
+            self._dispatch(events)
+            for _ in batch:
+                self._queue.task_done()
+            if stop_requested:
+                return
+
+    def _dispatch(self, events: list[LogEvent]):
+        for sink in self.sinks:
+            sink_events = [event for event in events if event.level >= sink.min_level]
+            if not sink_events:
+                continue
+            try:
+                sink.write_batch(sink_events)
+            except Exception as e:
+                # 某个输出端出错不影响其他输出端，也不能让后台线程退出
+                print(f"[日志] {type(sink).__name__} 写入失败: {e}", file=sys.stderr)
+
+    def flush(self):
+        """等待已入队的事件全部写出，用于在直接 print 之前保持输出顺序"""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._rate_limited_lock:
+            rate_limited_loggers = list(self._rate_limited_loggers.values())
+        for logger in rate_limited_loggers:
+            logger.flush_suppressed()
+        # 关闭时允许阻塞，保证结束标记一定能放入队列
+        self._queue.put(None)
+        self._writer_thread.join()
+        for sink in self.sinks:
+            sink.close()
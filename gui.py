@@ -19,22 +19,31 @@ from PyQt5.QtWidgets import (
     QGroupBox,
     QMessageBox,
     QSplitter,
+    QProgressBar,
 )
 from PyQt5.QtCore import Qt, pyqtSignal, QThread
 from PyQt5.QtGui import QFont, QTextCursor
+from eventlog import CallbackSink, EventLog
+from progress import format_progress_update
+from timerange import parse_time_range
 
 
 class TranscriptionWorker(QThread):
-    log_updated = pyqtSignal(str)
+    # 每批日志行只发送一次信号
+    log_lines_updated = pyqtSignal(list)
     progress_updated = pyqtSignal(int)
+    progress_status_updated = pyqtSignal(str)
     transcription_completed = pyqtSignal(list)
     transcription_failed = pyqtSignal(str)
 
-    def __init__(self, input_media_path, output_format_type, enable_cpu_mode):
+    def __init__(
+        self, input_media_path, output_format_type, enable_cpu_mode, time_range=None
+    ):
         super().__init__()
         self.media_input_path = input_media_path
         self.selected_output_format = output_format_type
         self.should_use_cpu = enable_cpu_mode
+        self.time_range = time_range
 
     def execute_transcription(self):
         try:
@@ -48,16 +57,30 @@ class TranscriptionWorker(QThread):
 
             transcription_module.FORCE_CPU_INFERENCE = self.should_use_cpu
 
-            def log_callback(message):
-                self.log_updated.emit(message)
+            event_log = EventLog([CallbackSink(self.log_lines_updated.emit)])
+            log_callback = event_log.get_logger("pipeline")
 
-            transcription_results = (
-                transcription_module.run_full_transcription_pipeline(
-                    self.media_input_path,
-                    self.selected_output_format,
-                    logger_callback=log_callback,
+            def progress_callback(progress_update):
+                self.progress_updated.emit(
+                    int(progress_update.overall_fraction * 100)
                 )
-            )
+                self.progress_status_updated.emit(
+                    format_progress_update(progress_update)
+                )
+
+            try:
+                transcription_results = (
+                    transcription_module.run_full_transcription_pipeline(
+                        self.media_input_path,
+                        self.selected_output_format,
+                        logger_callback=log_callback,
+                        progress_callback=progress_callback,
+                        time_range=self.time_range,
+                    )
+                )
+            finally:
+                # 确保剩余日志先于完成/失败信号送达界面
+                event_log.close()
 
             self.transcription_completed.emit(transcription_results)
 
@@ -99,6 +122,18 @@ class TranscriptionApplication(QMainWindow):
 
         input_configuration_layout.addLayout(file_selection_layout)
 
+        time_range_layout = QHBoxLayout()
+        time_range_layout.addWidget(QLabel("开始时间:"))
+        self.range_start_input = QLineEdit()
+        self.range_start_input.setPlaceholderText("留空从头开始，如 30:00")
+        time_range_layout.addWidget(self.range_start_input)
+        time_range_layout.addWidget(QLabel("结束时间:"))
+        self.range_end_input = QLineEdit()
+        self.range_end_input.setPlaceholderText("留空直到结尾，如 45:00")
+        time_range_layout.addWidget(self.range_end_input)
+
+        input_configuration_layout.addLayout(time_range_layout)
+
         # 输出设置区域
         output_configuration_group = QGroupBox("输出设置")
         output_configuration_layout = QHBoxLayout(output_configuration_group)
@@ -154,6 +189,15 @@ class TranscriptionApplication(QMainWindow):
         file_operations_layout.addWidget(self.copy_file_contents_button)
         file_operations_layout.addStretch()
 
+        # 进度显示区域
+        progress_display_layout = QHBoxLayout()
+        self.transcription_progress_bar = QProgressBar()
+        self.transcription_progress_bar.setRange(0, 100)
+        self.transcription_progress_bar.setValue(0)
+        progress_display_layout.addWidget(self.transcription_progress_bar, 1)
+        self.progress_status_label = QLabel("")
+        progress_display_layout.addWidget(self.progress_status_label)
+
         # 主内容分割器
         content_splitter = QSplitter(Qt.Vertical)
 
@@ -207,6 +251,7 @@ class TranscriptionApplication(QMainWindow):
         primary_layout.addWidget(output_configuration_group)
         primary_layout.addLayout(control_buttons_layout)
         primary_layout.addLayout(file_operations_layout)
+        primary_layout.addLayout(progress_display_layout)
         primary_layout.addWidget(content_splitter, 1)
 
     def browse_for_media_file(self):
@@ -227,6 +272,13 @@ class TranscriptionApplication(QMainWindow):
         cursor_position.movePosition(QTextCursor.End)
         self.log_display_area.setTextCursor(cursor_position)
 
+    def append_log_lines(self, formatted_lines):
+        """追加后台日志线程送来的一批已带时间戳的日志"""
+        self.log_display_area.append("\n".join(formatted_lines))
+        cursor_position = self.log_display_area.textCursor()
+        cursor_position.movePosition(QTextCursor.End)
+        self.log_display_area.setTextCursor(cursor_position)
+
     def clear_all_logs(self):
         self.log_display_area.clear()
 
@@ -241,6 +293,15 @@ class TranscriptionApplication(QMainWindow):
                 QMessageBox.warning(self, "警告", "指定的本地文件不存在")
                 return
 
+        try:
+            time_range = parse_time_range(
+                self.range_start_input.text().strip(),
+                self.range_end_input.text().strip(),
+            )
+        except ValueError as range_error:
+            QMessageBox.warning(self, "警告", f"时间范围无效: {range_error}")
+            return
+
         self.start_transcription_button.setEnabled(False)
         self.terminate_transcription_button.setEnabled(True)
 
@@ -251,16 +312,26 @@ class TranscriptionApplication(QMainWindow):
         self.append_log_message(
             f"使用CPU: {'是' if self.cpu_mode_checkbox.isChecked() else '否'}"
         )
+        if time_range is not None:
+            self.append_log_message(f"时间范围: {time_range.label()}")
 
         self.generated_files_list = []
         self.preview_file_selector.clear()
         self.preview_text_area.clear()
+        self.transcription_progress_bar.setValue(0)
+        self.progress_status_label.setText("")
 
         self.current_worker_thread = TranscriptionWorker(
-            input_media_path, "both", self.cpu_mode_checkbox.isChecked()
+            input_media_path, "both", self.cpu_mode_checkbox.isChecked(), time_range
         )
 
-        self.current_worker_thread.log_updated.connect(self.append_log_message)
+        self.current_worker_thread.log_lines_updated.connect(self.append_log_lines)
+        self.current_worker_thread.progress_updated.connect(
+            self.transcription_progress_bar.setValue
+        )
+        self.current_worker_thread.progress_status_updated.connect(
+            self.progress_status_label.setText
+        )
         self.current_worker_thread.transcription_completed.connect(
             self.handle_transcription_completion
         )
@@ -280,6 +351,7 @@ class TranscriptionApplication(QMainWindow):
 
     def handle_transcription_completion(self, result_files):
         self.append_log_message("转录任务完成！")
+        self.transcription_progress_bar.setValue(100)
         self.append_log_message("生成的文件:")
 
         self.generated_files_list = result_files
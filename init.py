@@ -1,14 +1,33 @@
+import asyncio
 import hashlib
 import json
 import sys
 import subprocess
 import shutil
+import sqlite3
 import argparse
+import os
 import time
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
+import autotune
+import canonical
+import eventlog
 import model
-from process import to_word_timestamp_list
+from process import to_word_timestamps
+from progress import (
+    ConsoleProgressPrinter,
+    ProgressTracker,
+    RTFHistory,
+    default_history_path,
+)
+from profiling import PipelineProfiler
+import search
+import timerange
+from stages import StageCache, compute_file_digest
 
 SPEECH_MODEL_ID = "paraformer-zh"
 VAD_MODEL_ID = "fsmn-vad"
@@ -19,6 +38,39 @@ TEMPORARY_JOBS_DIRECTORY.mkdir(exist_ok=True)
 FINAL_OUTPUT_DIRECTORY = Path("output")
 FINAL_OUTPUT_DIRECTORY.mkdir(exist_ok=True)
 FORCE_CPU_INFERENCE = False
+# 时长超过该值（秒）的媒体按时间切片、由多个 ffmpeg 进程并行转码
+PARALLEL_TRANSCODE_MIN_DURATION_SECONDS = 1800
+# 每个切片的最短时长（秒），避免切得过碎
+MIN_TRANSCODE_SLICE_SECONDS = 300
+# 切片数，0 表示根据 CPU 核心数自动选择
+TRANSCODE_SLICE_COUNT = 0
+# 取消异步任务时先请求子进程退出，超过该时间（秒）仍未退出则强制结束
+SUBPROCESS_TERMINATE_TIMEOUT_SECONDS = 5
+# 按 VAD 语音片段把长音频切成若干块分别识别，以便上报识别进度并限制单次推理的内存
+ASR_CHUNK_SECONDS = 300
+# 识别块两端保留的静音（毫秒）
+ASR_CHUNK_PADDING_MS = 200
+# 语音占比低于该值的输入（纯音乐、静音等）跳过语音识别；默认 0 不跳过，
+# 需要时通过 --min-speech-ratio 开启
+MIN_SPEECH_RATIO = 0.0
+# 标点恢复按窗口分批进行：每个窗口输出 PUNC_WINDOW_TOKENS 个词，
+# 两侧各附带 PUNC_CONTEXT_TOKENS 个词作为上下文；每 PUNC_BATCH_WINDOWS 个窗口加锁一次并写盘
+PUNC_WINDOW_TOKENS = 400
+PUNC_CONTEXT_TOKENS = 50
+PUNC_BATCH_WINDOWS = 8
+# 为 True 时逐阶段记录性能数据到任务目录的 profile/ 下，并关闭模型预加载，
+# 使模型加载耗时计入实际使用它的阶段
+PROFILE_PIPELINE = False
+# SRT 按静音切分字幕条的参数，见 SRTGenerator.merge_words_into_sentences_with_dynamic_threshold
+SRT_BASE_SILENCE_THRESHOLD_MS = 1000
+SRT_LENGTH_PENALTY_FACTOR = 0.05
+# SRTGenerator 使用的模型；标点模型与文本输出共用同一个实例 (get_punc_model_spec)
+SRT_PUNC_MODEL_ID = PUNC_MODEL_ID
+ALIGNMENT_MODEL_ID = "fa-zh"
+
+
+class DownloadError(RuntimeError):
+    """网络资源获取失败，通常可以稍后重试"""
 
 
 def import_srt_generator_class():
@@ -33,212 +85,1725 @@ def verify_ffmpeg_installation():
         sys.exit(1)
 
 
-def get_initialized_speech_model(logger_callback=print):
-    """使用 model.py 提供的接口获取模型实例"""
-    compute_device = "cpu" if FORCE_CPU_INFERENCE else "cuda"
-    logger_callback(
-        f"[模型初始化] 正在加载语音识别模型 (设备: {'CPU' if FORCE_CPU_INFERENCE else 'GPU'})..."
-    )
-    start_timestamp = time.time()
+def get_compute_device() -> str:
+    return "cpu" if FORCE_CPU_INFERENCE else "cuda"
 
-    speech_model = model.request_model(
+
+def get_speech_model_spec() -> model.ModelSpec:
+    compute_device = get_compute_device()
+    # 本机调优得到的线程数 (python autotune.py calibrate)
+    tuned_options = autotune.get_model_init_options("speech", compute_device)
+    return model.ModelSpec(
         SPEECH_MODEL_ID,
         lambda AutoModel: AutoModel(
             model=SPEECH_MODEL_ID,
             vad_model=VAD_MODEL_ID,
             punc_model=None,
             device=compute_device,
+            **tuned_options,
         ),
+        device=compute_device,
+        options={"vad_model": VAD_MODEL_ID, "punc_model": None, **tuned_options},
     )
 
-    logger_callback(
-        f"[模型初始化] 加载完成，耗时: {time.time() - start_timestamp:.2f}s"
+
+def get_punc_model_spec() -> model.ModelSpec:
+    compute_device = get_compute_device()
+    tuned_options = autotune.get_model_init_options("punc", compute_device)
+    return model.ModelSpec(
+        PUNC_MODEL_ID,
+        lambda AutoModel: AutoModel(
+            model=PUNC_MODEL_ID,
+            device=compute_device,
+            **tuned_options,
+        ),
+        device=compute_device,
+        options=tuned_options or None,
     )
+
+
+def get_vad_model_spec() -> model.ModelSpec:
+    compute_device = get_compute_device()
+    return model.ModelSpec(
+        VAD_MODEL_ID,
+        lambda AutoModel: AutoModel(
+            model=VAD_MODEL_ID,
+            device=compute_device,
+        ),
+        device=compute_device,
+    )
+
+
+def get_initialized_speech_model(logger_callback=print):
+    """使用 model.py 提供的接口获取模型实例"""
+    logger = eventlog.as_logger(logger_callback)
+    logger.info(
+        "[模型初始化] 正在加载语音识别模型 (设备: %s)...",
+        "CPU" if FORCE_CPU_INFERENCE else "GPU",
+    )
+    start_timestamp = time.time()
+
+    speech_model = model.request_model(*get_speech_model_spec())
+
+    logger.info("[模型初始化] 加载完成，耗时: %.2fs", time.time() - start_timestamp)
     return speech_model
 
 
 def get_initialized_punc_model(logger_callback=print):
     """使用 model.py 提供的接口获取模型实例"""
-    compute_device = "cpu" if FORCE_CPU_INFERENCE else "cuda"
-    logger_callback(
-        f"[模型初始化] 正在加载标点恢复模型 (设备: {'CPU' if FORCE_CPU_INFERENCE else 'GPU'})..."
+    logger = eventlog.as_logger(logger_callback)
+    logger.info(
+        "[模型初始化] 正在加载标点恢复模型 (设备: %s)...",
+        "CPU" if FORCE_CPU_INFERENCE else "GPU",
     )
     start_timestamp = time.time()
 
-    speech_model = model.request_model(
-        PUNC_MODEL_ID,
-        lambda AutoModel: AutoModel(
-            model=PUNC_MODEL_ID,
-            device=compute_device,
-        ),
+    punc_model = model.request_model(*get_punc_model_spec())
+
+    logger.info("[模型初始化] 加载完成，耗时: %.2fs", time.time() - start_timestamp)
+    return punc_model
+
+
+def preload_pipeline_models(
+    stage_cache: StageCache,
+    output_format_choice: str,
+    logger_callback=print,
+    cut_from_full_result: bool = False,
+) -> list:
+    """在后台预加载后续步骤需要的模型，使其与下载、转码重叠进行"""
+    stale_reasons = stage_cache.plan(
+        get_pipeline_stages(output_format_choice, cut_from_full_result)
     )
+    model_specs = []
+    if stale_reasons.get("vad") is not None:
+        model_specs.append(get_vad_model_spec())
+    # 从完整任务截取识别结果时不需要语音识别模型
+    if stale_reasons["recognize"] is not None and not cut_from_full_result:
+        model_specs.append(get_speech_model_spec())
+    if stale_reasons.get("text") is not None:
+        model_specs.append(get_punc_model_spec())
+    if not model_specs:
+        return []
+    eventlog.as_logger(logger_callback).info(
+        "[模型初始化] 后台预加载: %s", ", ".join(spec.model_id for spec in model_specs)
+    )
+    return model.preload(model_specs)
+
 
-    logger_callback(
-        f"[模型初始化] 加载完成，耗时: {time.time() - start_timestamp:.2f}s"
+def get_task_directory(
+    input_source_string: str, logger_callback=print, offline: bool = False
+) -> Path:
+    """
+    按资源键定位任务目录，同一视频的不同链接共用一个目录；
+    本地文件与无法解析的链接仍按原始输入命名。
+    offline 为 True 时不联网探测、不登记索引，只返回将会使用的目录（用于预演）
+    """
+    legacy_task_name = hashlib.md5(input_source_string.encode()).hexdigest()
+    legacy_task_dir = TEMPORARY_JOBS_DIRECTORY / legacy_task_name
+    key_index = canonical.ResourceKeyIndex(TEMPORARY_JOBS_DIRECTORY)
+    resource_key = key_index.resolve(
+        input_source_string,
+        build_yt_dlp_probe_command(input_source_string),
+        offline=offline,
     )
-    return speech_model
+    if resource_key is None:
+        return legacy_task_dir
+    existing_task_name = key_index.lookup(resource_key)
+    if existing_task_name is not None:
+        if existing_task_name != legacy_task_dir.name:
+            eventlog.as_logger(logger_callback).info(
+                "[去重] %s 已有任务目录，直接复用", resource_key
+            )
+        return TEMPORARY_JOBS_DIRECTORY / existing_task_name
+    # 旧版按原始链接命名的任务目录存在时沿用
+    if legacy_task_dir.is_dir():
+        task_name = legacy_task_dir.name
+    else:
+        task_name = hashlib.md5(resource_key.encode()).hexdigest()
+    if offline:
+        return TEMPORARY_JOBS_DIRECTORY / task_name
+    return TEMPORARY_JOBS_DIRECTORY / key_index.register(resource_key, task_name)
 
 
-def generate_task_unique_directory(input_source_string: str) -> Path:
-    unique_hash = hashlib.md5(input_source_string.encode()).hexdigest()
-    task_specific_dir = TEMPORARY_JOBS_DIRECTORY / unique_hash
+def get_range_task_directory(task_directory: Path, time_range) -> Path:
+    """范围任务放在完整任务目录下，可以直接复用完整任务已有的下载、音频与识别结果"""
+    return task_directory / "ranges" / time_range.directory_name()
+
+
+def get_job_directory(
+    input_source_string: str,
+    time_range=None,
+    logger_callback=print,
+    offline: bool = False,
+) -> Path:
+    task_directory = get_task_directory(
+        input_source_string, logger_callback=logger_callback, offline=offline
+    )
+    if time_range is None:
+        return task_directory
+    return get_range_task_directory(task_directory, time_range)
+
+
+def generate_task_unique_directory(
+    input_source_string: str, logger_callback=print
+) -> Path:
+    task_specific_dir = get_task_directory(
+        input_source_string, logger_callback=logger_callback
+    )
     task_specific_dir.mkdir(parents=True, exist_ok=True)
     return task_specific_dir
 
 
-def acquire_input_resource(
-    input_argument: str, task_directory: Path, logger_callback=print
-) -> tuple[Path, dict]:
+def get_stage_parameters(stage_name: str) -> dict:
+    """影响各阶段输出的参数，任一参数变化都会使该阶段及其下游的缓存失效"""
+    if stage_name == "download":
+        # 任务目录本身就对应一个资源，下载结果与参数无关
+        return {}
+    if stage_name == "transcode":
+        return {"sampling_rate": AUDIO_SAMPLING_RATE, "channels": 1}
+    if stage_name == "vad":
+        return {"vad_model": VAD_MODEL_ID}
+    if stage_name == "recognize":
+        return {
+            "speech_model": SPEECH_MODEL_ID,
+            "vad_model": VAD_MODEL_ID,
+            "chunk_seconds": ASR_CHUNK_SECONDS,
+            "chunk_padding_ms": ASR_CHUNK_PADDING_MS,
+        }
+    if stage_name == "text":
+        return {
+            "punc_model": PUNC_MODEL_ID,
+            "window_tokens": PUNC_WINDOW_TOKENS,
+            "context_tokens": PUNC_CONTEXT_TOKENS,
+        }
+    if stage_name == "srt":
+        return {
+            "punc_model": SRT_PUNC_MODEL_ID,
+            "alignment_model": ALIGNMENT_MODEL_ID,
+            "base_silence_threshold_ms": SRT_BASE_SILENCE_THRESHOLD_MS,
+            "length_penalty_factor": SRT_LENGTH_PENALTY_FACTOR,
+        }
+    return {}
+
+
+def create_stage_cache(
+    task_directory: Path, parameter_overrides: dict | None = None
+) -> StageCache:
+    """parameter_overrides 为 {阶段: 参数}，替换这些阶段的默认参数"""
+    parameter_overrides = parameter_overrides or {}
+    return StageCache(
+        task_directory,
+        lambda stage_name: parameter_overrides.get(
+            stage_name, get_stage_parameters(stage_name)
+        ),
+    )
+
+
+def print_stage_plan(
+    input_source_string: str, output_format_choice: str, time_range=None
+):
+    """--dry-run：列出各阶段是否会重新计算及原因，不执行任何步骤，也不联网或写入文件"""
+    task_directory = get_task_directory(input_source_string, offline=True)
+    stage_parameter_overrides = None
+    cut_from_full_result = False
+    if time_range is not None:
+        stage_parameter_overrides = get_range_cut_parameters(
+            task_directory, time_range
+        )
+        cut_from_full_result = stage_parameter_overrides is not None
+        task_directory = get_range_task_directory(task_directory, time_range)
+    stage_cache = create_stage_cache(task_directory, stage_parameter_overrides)
+    stale_reasons = stage_cache.plan(
+        get_pipeline_stages(output_format_choice, cut_from_full_result)
+    )
+    for stage_name, stale_reason in stale_reasons.items():
+        if stage_name == "copy":
+            continue
+        if stale_reason is None:
+            print(f"  {stage_name:<10} 使用缓存")
+        else:
+            print(f"  {stage_name:<10} 重新计算 ({stale_reason})")
+
+
+def find_raw_resource_file(download_step_dir: Path) -> Path:
+    return next(
+        f
+        for f in download_step_dir.iterdir()
+        if f.stem == "raw" and f.suffix != ".json"
+    )
+
+
+def load_cached_input_resource(task_directory: Path) -> tuple[Path, dict] | None:
+    """若下载步骤已完成，返回缓存的原始文件与元数据"""
     download_step_dir = task_directory / "01_download"
-    download_step_dir.mkdir(exist_ok=True)
     completion_flag_file = download_step_dir / "donefile"
     metadata_json_file = download_step_dir / "raw.info.json"
+    if not (completion_flag_file.exists() and metadata_json_file.exists()):
+        return None
+    with open(metadata_json_file, encoding="utf-8") as f:
+        return find_raw_resource_file(download_step_dir), json.load(f)
+
 
-    if completion_flag_file.exists() and metadata_json_file.exists():
-        logger_callback("检测到已存在缓存资源，跳过下载或复制环节")
-        raw_resource_file = next(
-            f
-            for f in download_step_dir.iterdir()
-            if f.stem == "raw" and f.suffix != ".json"
+def build_yt_dlp_command(input_argument: str, time_range=None) -> list[str]:
+    """指定 time_range 时只下载该片段，并在切点强制关键帧，使片段恰好从起点开始"""
+    section_options = []
+    if time_range is not None:
+        section_end = (
+            "inf"
+            if time_range.end_ms is None
+            else timerange.format_timestamp(time_range.end_ms)
         )
-        with open(metadata_json_file, encoding="utf-8") as f:
-            return raw_resource_file, json.load(f)
+        section_options = [
+            "--download-sections",
+            f"*{timerange.format_timestamp(time_range.start_ms)}-{section_end}",
+            "--force-keyframes-at-cuts",
+        ]
+    return [
+        "yt-dlp",
+        "--cookies-from-browser",
+        "firefox",
+        "-f",
+        "worst*",
+        "-o",
+        "raw.%(ext)s",
+        "--write-info-json",
+        "--no-playlist",
+        "--newline",
+        "--progress",
+        "--progress-template",
+        "download:[progress] %(progress.downloaded_bytes)s "
+        "%(progress.total_bytes)s %(progress.total_bytes_estimate)s",
+        *section_options,
+        input_argument,
+    ]
+
+
+def build_yt_dlp_probe_command(input_argument: str) -> list[str]:
+    """只读取元数据、不下载媒体，输出 "提取器\tID\t页面链接"，供链接规范化使用"""
+    return [
+        "yt-dlp",
+        "--cookies-from-browser",
+        "firefox",
+        "--simulate",
+        "--no-playlist",
+        "--print",
+        "%(extractor_key)s\t%(id)s\t%(webpage_url)s",
+        input_argument,
+    ]
+
+
+def parse_yt_dlp_progress_line(output_line: str) -> float | None:
+    """解析 build_yt_dlp_command 中进度模板输出的一行，返回下载进度"""
+    if not output_line.startswith("[progress] "):
+        return None
+    downloaded, total, estimate = (output_line.split()[1:] + ["NA"] * 3)[:3]
+    for expected_total in (total, estimate):
+        try:
+            return min(float(downloaded) / float(expected_total), 1.0)
+        except (ValueError, ZeroDivisionError):
+            continue
+    return None
+
+
+def parse_ffmpeg_progress_line(
+    output_line: str, duration_seconds: float | None
+) -> float | None:
+    """解析 ffmpeg -progress 输出中的 out_time_us 行，返回转码进度"""
+    if not duration_seconds or not output_line.startswith(
+        ("out_time_us=", "out_time_ms=")
+    ):
+        return None
+    try:
+        # 两个字段的单位实际上都是微秒
+        processed_seconds = int(output_line.split("=", 1)[1]) / 1_000_000
+    except ValueError:
+        return None
+    return min(processed_seconds / duration_seconds, 1.0)
+
+
+def run_command_with_line_parser(
+    command: list[str],
+    line_parser,
+    progress_callback=None,
+    cwd=None,
+    output_logger=None,
+) -> tuple[int, str]:
+    """
+    运行子进程并逐行读取合并后的输出。line_parser 从一行中解析出进度
+    （不是进度行时返回 None）；返回 (returncode, 非进度输出的最后若干行)。
+    output_logger 不为空时，非进度输出同时逐行交给它记录。
+    """
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    output_tail = deque(maxlen=50)
+    for output_line in process.stdout:
+        output_line = output_line.rstrip()
+        fraction = line_parser(output_line)
+        if fraction is None:
+            output_tail.append(output_line)
+            if output_logger is not None:
+                output_logger(output_line)
+        elif progress_callback is not None:
+            progress_callback(fraction)
+    return process.wait(), "\n".join(output_tail)
+
+
+async def terminate_async_process(process: asyncio.subprocess.Process):
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(process.wait(), SUBPROCESS_TERMINATE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run_command_async(command: list[str], cwd=None) -> tuple[int, str, str]:
+    """异步运行子进程，返回 (returncode, stdout, stderr)；协程被取消时结束子进程"""
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except BaseException:
+        await terminate_async_process(process)
+        raise
+    return (
+        process.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
+
+
+async def run_command_with_line_parser_async(
+    command: list[str],
+    line_parser,
+    progress_callback=None,
+    cwd=None,
+    output_logger=None,
+) -> tuple[int, str]:
+    """run_command_with_line_parser 的异步版本，协程被取消时结束子进程"""
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    output_tail = deque(maxlen=50)
+    try:
+        async for output_line in process.stdout:
+            output_line = output_line.decode("utf-8", errors="replace").rstrip()
+            fraction = line_parser(output_line)
+            if fraction is None:
+                output_tail.append(output_line)
+                if output_logger is not None:
+                    output_logger(output_line)
+            elif progress_callback is not None:
+                progress_callback(fraction)
+        returncode = await process.wait()
+    except BaseException:
+        await terminate_async_process(process)
+        raise
+    return returncode, "\n".join(output_tail)
+
+
+def build_local_resource_metadata(local_path: Path) -> dict:
+    return {
+        "title": local_path.stem,
+        "uploader": "local_user",
+        "timestamp": datetime.now().timestamp(),
+    }
+
+
+def build_network_resource_metadata(
+    download_step_dir: Path, input_argument: str
+) -> dict:
+    yt_dlp_info_file = download_step_dir / "raw.info.json"
+    if yt_dlp_info_file.exists():
+        with open(yt_dlp_info_file, encoding="utf-8") as f:
+            yt_dlp_info = json.load(f)
+    else:
+        yt_dlp_info = {}
+
+    return {
+        "title": yt_dlp_info.get("title", "unknown"),
+        "uploader": yt_dlp_info.get("uploader", "unknown"),
+        "timestamp": yt_dlp_info.get("timestamp", datetime.now().timestamp()),
+        "original_url": input_argument,
+    }
+
+
+def build_range_resource_metadata(
+    resource_metadata: dict, time_range, media_trimmed: bool
+) -> dict:
+    """media_trimmed 表示下载的媒体已只包含该范围，转码时无需再截取"""
+    return {
+        **resource_metadata,
+        "time_range": [time_range.start_ms, time_range.end_ms],
+        "media_trimmed": media_trimmed,
+    }
+
+
+def finalize_input_resource(
+    download_step_dir: Path, resource_metadata: dict, logger_callback=print
+):
+    with open(download_step_dir / "raw.info.json", "w", encoding="utf-8") as f:
+        json.dump(resource_metadata, f, ensure_ascii=False, indent=2)
+
+    (download_step_dir / "donefile").touch()
+    eventlog.as_logger(logger_callback).info("资源定位成功")
 
+
+def link_or_copy_file(source_path: Path, target_path: Path) -> str:
+    """
+    以尽量不复制数据的方式将文件放到目标位置，依次尝试硬链接、reflink、
+    符号链接，最后才完整复制。返回实际使用的方式。
+    """
+    if target_path.exists() or target_path.is_symlink():
+        target_path.unlink()
+    try:
+        os.link(source_path, target_path)
+        return "hardlink"
+    except OSError:
+        pass
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        linux_ficlone_request = 0x40049409
+        try:
+            with open(source_path, "rb") as source_file, open(
+                target_path, "wb"
+            ) as target_file:
+                fcntl.ioctl(
+                    target_file.fileno(), linux_ficlone_request, source_file.fileno()
+                )
+            shutil.copystat(source_path, target_path)
+            return "reflink"
+        except OSError:
+            target_path.unlink(missing_ok=True)
+    try:
+        target_path.symlink_to(Path(source_path).resolve())
+        return "symlink"
+    except OSError:
+        pass
+    shutil.copy2(source_path, target_path)
+    return "copy"
+
+
+def download_network_resource(
+    input_argument: str,
+    download_step_dir: Path,
+    time_range=None,
+    logger_callback=print,
+    progress_callback=None,
+) -> tuple[int, str]:
+    return run_command_with_line_parser(
+        build_yt_dlp_command(input_argument, time_range),
+        parse_yt_dlp_progress_line,
+        progress_callback=progress_callback,
+        cwd=download_step_dir,
+        output_logger=eventlog.get_subprocess_output_logger(logger_callback, "yt-dlp"),
+    )
+
+
+async def download_network_resource_async(
+    input_argument: str,
+    download_step_dir: Path,
+    time_range=None,
+    logger_callback=print,
+    progress_callback=None,
+) -> tuple[int, str]:
+    return await run_command_with_line_parser_async(
+        build_yt_dlp_command(input_argument, time_range),
+        parse_yt_dlp_progress_line,
+        progress_callback=progress_callback,
+        cwd=download_step_dir,
+        output_logger=eventlog.get_subprocess_output_logger(logger_callback, "yt-dlp"),
+    )
+
+
+def complete_input_resource(
+    download_step_dir: Path,
+    raw_resource_file: Path,
+    resource_metadata: dict,
+    time_range=None,
+    media_trimmed: bool = False,
+    logger_callback=print,
+) -> tuple[Path, dict]:
+    if time_range is not None:
+        resource_metadata = build_range_resource_metadata(
+            resource_metadata, time_range, media_trimmed
+        )
+    finalize_input_resource(
+        download_step_dir, resource_metadata, logger_callback=logger_callback
+    )
+    return raw_resource_file, resource_metadata
+
+
+def complete_network_resource(
+    input_argument: str,
+    download_step_dir: Path,
+    time_range=None,
+    media_trimmed: bool = False,
+    logger_callback=print,
+) -> tuple[Path, dict]:
+    return complete_input_resource(
+        download_step_dir,
+        find_raw_resource_file(download_step_dir),
+        build_network_resource_metadata(download_step_dir, input_argument),
+        time_range,
+        media_trimmed,
+        logger_callback=logger_callback,
+    )
+
+
+def acquire_existing_input_resource(
+    input_argument: str,
+    task_directory: Path,
+    logger_callback=print,
+    time_range=None,
+    full_task_directory: Path | None = None,
+) -> tuple[Path, dict] | None:
+    """
+    接入无需下载的媒体：已缓存的资源、完整任务已下载的媒体或本地文件。
+    都不是时返回 None，需要从网络下载
+    """
+    logger = eventlog.as_logger(logger_callback)
+    download_step_dir = task_directory / "01_download"
+    download_step_dir.mkdir(parents=True, exist_ok=True)
+
+    cached_resource = load_cached_input_resource(task_directory)
+    if cached_resource is not None:
+        logger.info("检测到已存在缓存资源，跳过下载或复制环节")
+        return cached_resource
+
+    full_resource = None
+    if time_range is not None and full_task_directory is not None:
+        full_resource = load_cached_input_resource(full_task_directory)
     potential_local_path = Path(input_argument)
-    if potential_local_path.exists():
-        logger_callback(f"正在处理本地文件: {potential_local_path.name}")
+    if full_resource is not None:
+        full_raw_file, resource_metadata = full_resource
+        raw_resource_file = download_step_dir / full_raw_file.name
+        ingest_method = link_or_copy_file(full_raw_file, raw_resource_file)
+        logger.info("复用完整任务已下载的媒体 (方式: %s)", ingest_method)
+    elif potential_local_path.exists():
+        logger.info("正在处理本地文件: %s", potential_local_path.name)
         file_extension = potential_local_path.suffix
         raw_resource_file = download_step_dir / f"raw{file_extension}"
-        shutil.copy2(potential_local_path, raw_resource_file)
-        resource_metadata = {
-            "title": potential_local_path.stem,
-            "uploader": "local_user",
-            "timestamp": datetime.now().timestamp(),
-        }
+        ingest_method = link_or_copy_file(potential_local_path, raw_resource_file)
+        logger.info("本地文件已接入 (方式: %s)", ingest_method)
+        resource_metadata = build_local_resource_metadata(potential_local_path)
     else:
-        logger_callback(f"正在尝试从网络获取资源: {input_argument}")
-        yt_dlp_command = [
-            "yt-dlp",
-            "--cookies-from-browser",
-            "firefox",
-            "-f",
-            "worst*",
-            "-o",
-            "raw.%(ext)s",
-            "--write-info-json",
-            "--no-playlist",
+        return None
+    return complete_input_resource(
+        download_step_dir,
+        raw_resource_file,
+        resource_metadata,
+        time_range,
+        logger_callback=logger_callback,
+    )
+
+
+def acquire_input_resource(
+    input_argument: str,
+    task_directory: Path,
+    logger_callback=print,
+    progress_callback=None,
+    time_range=None,
+    full_task_directory: Path | None = None,
+) -> tuple[Path, dict]:
+    """
+    指定 time_range 时为范围任务获取媒体：优先复用完整任务已下载的文件，
+    网络资源只下载该片段（站点不支持时退回下载完整媒体，转码时再截取）
+    """
+    existing_resource = acquire_existing_input_resource(
+        input_argument,
+        task_directory,
+        logger_callback=logger_callback,
+        time_range=time_range,
+        full_task_directory=full_task_directory,
+    )
+    if existing_resource is not None:
+        return existing_resource
+
+    logger = eventlog.as_logger(logger_callback)
+    download_step_dir = task_directory / "01_download"
+    logger.info("正在尝试从网络获取资源: %s", input_argument)
+    if progress_callback is not None:
+        progress_callback(0.0)
+    returncode, command_output = download_network_resource(
+        input_argument,
+        download_step_dir,
+        time_range,
+        logger_callback=logger_callback,
+        progress_callback=progress_callback,
+    )
+    media_trimmed = time_range is not None and returncode == 0
+    if time_range is not None and returncode != 0:
+        logger.warning("片段下载失败，改为下载完整媒体后再截取")
+        returncode, command_output = download_network_resource(
             input_argument,
-        ]
-        execution_result = subprocess.run(
-            yt_dlp_command, cwd=download_step_dir, capture_output=True, text=True
+            download_step_dir,
+            logger_callback=logger_callback,
+            progress_callback=progress_callback,
         )
-        if execution_result.returncode != 0:
-            logger_callback(f"[错误] 下载失败详情: {execution_result.stderr}")
-            raise RuntimeError(f"无法获取网络资源: {input_argument}")
+    if returncode != 0:
+        logger.error("下载失败详情: %s", command_output)
+        raise DownloadError(f"无法获取网络资源: {input_argument}")
+    return complete_network_resource(
+        input_argument,
+        download_step_dir,
+        time_range,
+        media_trimmed,
+        logger_callback=logger_callback,
+    )
 
-        raw_resource_file = next(
-            f
-            for f in download_step_dir.iterdir()
-            if f.stem == "raw" and f.suffix != ".json"
+
+async def acquire_input_resource_async(
+    input_argument: str,
+    task_directory: Path,
+    logger_callback=print,
+    progress_callback=None,
+    time_range=None,
+    full_task_directory: Path | None = None,
+) -> tuple[Path, dict]:
+    """acquire_input_resource 的异步版本：yt-dlp 以异步子进程运行，不占用线程"""
+    existing_resource = await asyncio.to_thread(
+        acquire_existing_input_resource,
+        input_argument,
+        task_directory,
+        logger_callback=logger_callback,
+        time_range=time_range,
+        full_task_directory=full_task_directory,
+    )
+    if existing_resource is not None:
+        return existing_resource
+
+    logger = eventlog.as_logger(logger_callback)
+    download_step_dir = task_directory / "01_download"
+    logger.info("正在尝试从网络获取资源: %s", input_argument)
+    if progress_callback is not None:
+        progress_callback(0.0)
+    returncode, command_output = await download_network_resource_async(
+        input_argument,
+        download_step_dir,
+        time_range,
+        logger_callback=logger_callback,
+        progress_callback=progress_callback,
+    )
+    media_trimmed = time_range is not None and returncode == 0
+    if time_range is not None and returncode != 0:
+        logger.warning("片段下载失败，改为下载完整媒体后再截取")
+        returncode, command_output = await download_network_resource_async(
+            input_argument,
+            download_step_dir,
+            logger_callback=logger_callback,
+            progress_callback=progress_callback,
         )
+    if returncode != 0:
+        logger.error("下载失败详情: %s", command_output)
+        raise DownloadError(f"无法获取网络资源: {input_argument}")
+    return await asyncio.to_thread(
+        complete_network_resource,
+        input_argument,
+        download_step_dir,
+        time_range,
+        media_trimmed,
+        logger_callback=logger_callback,
+    )
 
-        yt_dlp_info_file = download_step_dir / "raw.info.json"
-        if yt_dlp_info_file.exists():
-            with open(yt_dlp_info_file, encoding="utf-8") as f:
-                yt_dlp_info = json.load(f)
-        else:
-            yt_dlp_info = {}
 
-        resource_metadata = {
-            "title": yt_dlp_info.get("title", "unknown"),
-            "uploader": yt_dlp_info.get("uploader", "unknown"),
-            "timestamp": yt_dlp_info.get("timestamp", datetime.now().timestamp()),
-            "original_url": input_argument,
-        }
+def build_ffmpeg_transcode_command(
+    raw_media_path: Path, target_wav_path: Path, clip_range=None
+) -> list[str]:
+    """clip_range 不为 None 时只解码该时间范围"""
+    clip_options = []
+    if clip_range is not None:
+        clip_options = ["-ss", f"{clip_range.start_ms / 1000:.3f}"]
+        if clip_range.end_ms is not None:
+            clip_duration_ms = clip_range.end_ms - clip_range.start_ms
+            clip_options += ["-t", f"{clip_duration_ms / 1000:.3f}"]
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+        "-y",
+        *clip_options,
+        "-i",
+        str(raw_media_path),
+        "-ar",
+        str(AUDIO_SAMPLING_RATE),
+        "-ac",
+        "1",
+        "-sample_fmt",
+        "s16",
+        str(target_wav_path),
+    ]
 
-    with open(metadata_json_file, "w", encoding="utf-8") as f:
-        json.dump(resource_metadata, f, ensure_ascii=False, indent=2)
 
-    completion_flag_file.touch()
-    logger_callback("资源定位成功")
-    return raw_resource_file, resource_metadata
+def build_ffprobe_command(media_path: Path) -> list[str]:
+    return [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "format=duration,format_name:stream=codec_name,sample_rate,channels",
+        "-of",
+        "json",
+        str(media_path),
+    ]
 
 
-def extract_standard_audio_wav(
-    raw_media_path: Path, target_wav_path: Path, logger_callback=print
-):
-    step_completion_flag = target_wav_path.parent / "donefile"
-    if step_completion_flag.exists():
-        logger_callback("检测到已转换的音频缓存，跳过转码")
-        return
-    logger_callback(f"正在执行音频标准化 (采样率: {AUDIO_SAMPLING_RATE}Hz)...")
-    target_wav_path.parent.mkdir(exist_ok=True)
-    start_timestamp = time.time()
+def parse_ffprobe_output(ffprobe_output: str) -> dict:
+    """解析 ffprobe 的 JSON 输出，取出时长、容器与第一条音频流的格式"""
+    try:
+        probe_data = json.loads(ffprobe_output or "{}")
+    except json.JSONDecodeError:
+        probe_data = {}
+    format_info = probe_data.get("format", {})
+    audio_streams = probe_data.get("streams", [])
+    audio_stream = audio_streams[0] if audio_streams else {}
+    try:
+        duration_seconds = float(format_info["duration"])
+    except (KeyError, ValueError):
+        duration_seconds = None
+    return {
+        "duration": duration_seconds,
+        "format_name": format_info.get("format_name"),
+        "codec_name": audio_stream.get("codec_name"),
+        "sample_rate": int(audio_stream.get("sample_rate", 0) or 0),
+        "channels": int(audio_stream.get("channels", 0) or 0),
+    }
+
+
+def probe_media_info(media_path: Path) -> dict:
+    """使用 ffprobe 读取媒体信息，ffprobe 不可用时各字段为空"""
+    try:
+        probe_result = subprocess.run(
+            build_ffprobe_command(media_path),
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        return parse_ffprobe_output("")
+    return parse_ffprobe_output(probe_result.stdout)
+
+
+async def probe_media_info_async(media_path: Path) -> dict:
+    try:
+        _, probe_output, _ = await run_command_async(build_ffprobe_command(media_path))
+    except FileNotFoundError:
+        probe_output = ""
+    return parse_ffprobe_output(probe_output)
+
+
+def is_readable_standard_wav(wav_file_path: Path) -> bool:
+    try:
+        with wave.open(str(wav_file_path), "rb") as wav_file:
+            return (
+                wav_file.getframerate() == AUDIO_SAMPLING_RATE
+                and wav_file.getnchannels() == 1
+                and wav_file.getsampwidth() == 2
+            )
+    except (wave.Error, EOFError, OSError):
+        return False
+
+
+def choose_audio_extraction_method(raw_media_path: Path, media_info: dict) -> str:
+    """
+    已是目标格式的输入无需重新编码：
+    "link"        16kHz 单声道 s16 WAV，直接链接
+    "stream_copy" 音频流已是目标格式但封装在其他容器中，仅复制音频流
+    "transcode"   需要完整转码
+    """
+    is_target_audio = (
+        media_info["codec_name"] == "pcm_s16le"
+        and media_info["sample_rate"] == AUDIO_SAMPLING_RATE
+        and media_info["channels"] == 1
+    )
+    if not is_target_audio:
+        return "transcode"
+    if media_info["format_name"] == "wav" and is_readable_standard_wav(raw_media_path):
+        return "link"
+    return "stream_copy"
+
+
+def build_ffmpeg_stream_copy_command(
+    raw_media_path: Path, target_wav_path: Path
+) -> list[str]:
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        str(raw_media_path),
+        "-map",
+        "0:a:0",
+        "-c:a",
+        "copy",
+        str(target_wav_path),
+    ]
+
+
+def choose_transcode_slice_count(duration_seconds: float | None) -> int:
+    if duration_seconds is None:
+        return 1
+    if TRANSCODE_SLICE_COUNT > 0:
+        return TRANSCODE_SLICE_COUNT
+    if duration_seconds < PARALLEL_TRANSCODE_MIN_DURATION_SECONDS:
+        return 1
+    if hasattr(os, "sched_getaffinity"):
+        available_cores = len(os.sched_getaffinity(0))
+    else:
+        available_cores = os.cpu_count() or 1
+    return max(
+        1, min(available_cores, int(duration_seconds // MIN_TRANSCODE_SLICE_SECONDS))
+    )
+
+
+def build_transcode_slice_plan(
+    duration_seconds: float, slice_count: int
+) -> list[tuple[int, int | None]]:
+    """按采样点划分切片，返回 (起始采样点, 采样点数)，最后一片的采样点数为 None（读到结尾）"""
+    total_samples = int(duration_seconds * AUDIO_SAMPLING_RATE)
+    boundaries = [
+        total_samples * slice_index // slice_count
+        for slice_index in range(slice_count + 1)
+    ]
+    return [
+        (
+            boundaries[slice_index],
+            boundaries[slice_index + 1] - boundaries[slice_index]
+            if slice_index < slice_count - 1
+            else None,
+        )
+        for slice_index in range(slice_count)
+    ]
+
+
+def build_ffmpeg_slice_command(
+    raw_media_path: Path,
+    start_sample: int,
+    sample_count: int | None,
+    slice_pcm_path: Path,
+) -> list[str]:
+    """将一个时间切片解码为 16kHz 单声道 s16 裸 PCM；多解码 1 秒，拼接时再精确截断"""
     ffmpeg_command = [
         "ffmpeg",
         "-hide_banner",
         "-loglevel",
         "error",
+        "-y",
+        "-ss",
+        f"{start_sample / AUDIO_SAMPLING_RATE:.7f}",
         "-i",
         str(raw_media_path),
+    ]
+    if sample_count is not None:
+        ffmpeg_command += ["-t", f"{sample_count / AUDIO_SAMPLING_RATE + 1:.7f}"]
+    ffmpeg_command += [
+        "-vn",
         "-ar",
         str(AUDIO_SAMPLING_RATE),
         "-ac",
         "1",
-        "-sample_fmt",
-        "s16",
-        str(target_wav_path),
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        str(slice_pcm_path),
     ]
-    subprocess.run(ffmpeg_command, check=True)
+    return ffmpeg_command
+
+
+def assemble_wav_from_slices(
+    slice_pcm_paths: list[Path],
+    slice_plan: list[tuple[int, int | None]],
+    target_wav_path: Path,
+):
+    """按计划的采样点数截断（或以静音补齐）各切片，拼接为一个 WAV 文件"""
+    copy_chunk_bytes = 4 * 1024 * 1024
+    with wave.open(str(target_wav_path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(AUDIO_SAMPLING_RATE)
+        for slice_pcm_path, (_, sample_count) in zip(slice_pcm_paths, slice_plan):
+            remaining_bytes = None if sample_count is None else sample_count * 2
+            with open(slice_pcm_path, "rb") as slice_file:
+                while remaining_bytes is None or remaining_bytes > 0:
+                    read_size = (
+                        copy_chunk_bytes
+                        if remaining_bytes is None
+                        else min(copy_chunk_bytes, remaining_bytes)
+                    )
+                    pcm_chunk = slice_file.read(read_size)
+                    if not pcm_chunk:
+                        break
+                    wav_file.writeframes(pcm_chunk)
+                    if remaining_bytes is not None:
+                        remaining_bytes -= len(pcm_chunk)
+            if remaining_bytes:
+                # 切片比预期短时补静音，保证后续切片的时间轴不偏移
+                wav_file.writeframes(bytes(remaining_bytes))
+            slice_pcm_path.unlink()
+
+
+def transcode_in_parallel_slices(
+    raw_media_path: Path,
+    target_wav_path: Path,
+    duration_seconds: float,
+    slice_count: int,
+    progress_callback=None,
+):
+    slice_plan = build_transcode_slice_plan(duration_seconds, slice_count)
+    slice_pcm_paths = [
+        target_wav_path.with_name(f"slice_{slice_index:03d}.pcm")
+        for slice_index in range(slice_count)
+    ]
+    with ThreadPoolExecutor(max_workers=slice_count) as executor:
+        slice_futures = [
+            executor.submit(
+                subprocess.run,
+                build_ffmpeg_slice_command(
+                    raw_media_path, start_sample, sample_count, slice_pcm_path
+                ),
+                check=True,
+            )
+            for (start_sample, sample_count), slice_pcm_path in zip(
+                slice_plan, slice_pcm_paths
+            )
+        ]
+        for finished_count, slice_future in enumerate(
+            as_completed(slice_futures), 1
+        ):
+            slice_future.result()
+            if progress_callback is not None:
+                # 拼接很快，切片全部完成前最多报告 99%
+                progress_callback(finished_count / slice_count * 0.99)
+    assemble_wav_from_slices(slice_pcm_paths, slice_plan, target_wav_path)
+
+
+async def transcode_in_parallel_slices_async(
+    raw_media_path: Path,
+    target_wav_path: Path,
+    duration_seconds: float,
+    slice_count: int,
+    progress_callback=None,
+):
+    """transcode_in_parallel_slices 的异步版本：任一切片失败或被取消时结束其余切片"""
+    slice_plan = build_transcode_slice_plan(duration_seconds, slice_count)
+    slice_pcm_paths = [
+        target_wav_path.with_name(f"slice_{slice_index:03d}.pcm")
+        for slice_index in range(slice_count)
+    ]
+    slice_tasks = [
+        asyncio.ensure_future(
+            run_command_async(
+                build_ffmpeg_slice_command(
+                    raw_media_path, start_sample, sample_count, slice_pcm_path
+                )
+            )
+        )
+        for (start_sample, sample_count), slice_pcm_path in zip(
+            slice_plan, slice_pcm_paths
+        )
+    ]
+    try:
+        for finished_count, slice_task in enumerate(
+            asyncio.as_completed(slice_tasks), 1
+        ):
+            returncode, _, stderr = await slice_task
+            if returncode != 0:
+                raise subprocess.CalledProcessError(
+                    returncode, "ffmpeg", stderr=stderr
+                )
+            if progress_callback is not None:
+                progress_callback(finished_count / slice_count * 0.99)
+    finally:
+        for slice_task in slice_tasks:
+            slice_task.cancel()
+        await asyncio.gather(*slice_tasks, return_exceptions=True)
+    await asyncio.to_thread(
+        assemble_wav_from_slices, slice_pcm_paths, slice_plan, target_wav_path
+    )
+
+
+def get_clip_duration_seconds(
+    duration_seconds: float | None, clip_range
+) -> float | None:
+    end_seconds = (
+        duration_seconds if clip_range.end_ms is None else clip_range.end_ms / 1000
+    )
+    if duration_seconds is not None and end_seconds is not None:
+        end_seconds = min(end_seconds, duration_seconds)
+    if end_seconds is None:
+        return None
+    return max(end_seconds - clip_range.start_ms / 1000, 0.0)
+
+
+def start_audio_extraction(
+    target_wav_path: Path, logger_callback=print, progress_callback=None
+) -> bool:
+    """转码缓存有效时返回 False；否则清理上次中断留下的目标文件并返回 True"""
+    logger = eventlog.as_logger(logger_callback)
+    if (target_wav_path.parent / "donefile").exists():
+        logger.info("检测到已转换的音频缓存，跳过转码")
+        return False
+    logger.info("正在执行音频标准化 (采样率: %dHz)...", AUDIO_SAMPLING_RATE)
+    target_wav_path.parent.mkdir(exist_ok=True)
+    # 上次中断留下的目标文件可能是原始文件的硬链接，必须先解除，不能原地覆盖
+    target_wav_path.unlink(missing_ok=True)
+    if progress_callback is not None:
+        progress_callback(0.0)
+    return True
+
+
+def plan_audio_extraction(
+    raw_media_path: Path, media_info: dict, clip_range=None, logger_callback=print
+) -> tuple[str, float | None, int]:
+    """返回 (提取方式, 需处理的时长, 切片数)，提取方式见 choose_audio_extraction_method"""
+    logger = eventlog.as_logger(logger_callback)
+    extraction_method = choose_audio_extraction_method(raw_media_path, media_info)
+    duration_seconds = media_info["duration"]
+    slice_count = choose_transcode_slice_count(duration_seconds)
+    if clip_range is not None:
+        # 只转码范围内的一段：总是完整解码，进度按范围时长计算
+        logger.info("仅转码 %s 范围内的音频", clip_range.label())
+        extraction_method = "transcode"
+        slice_count = 1
+        duration_seconds = get_clip_duration_seconds(duration_seconds, clip_range)
+    if extraction_method == "link":
+        logger.info("输入已是标准格式，跳过转码")
+    elif extraction_method == "stream_copy":
+        logger.info("音频流已是标准格式，仅复制音频流")
+    elif slice_count > 1:
+        logger.info(
+            "媒体时长 %.0fs，使用 %d 个切片并行转码", duration_seconds, slice_count
+        )
+    return extraction_method, duration_seconds, slice_count
+
+
+def finish_audio_extraction(
+    target_wav_path: Path, start_timestamp: float, logger_callback=print
+):
+    (target_wav_path.parent / "donefile").touch()
+    eventlog.as_logger(logger_callback).info(
+        "音频转码完成，耗时: %.2fs", time.time() - start_timestamp
+    )
+
+
+def extract_standard_audio_wav(
+    raw_media_path: Path,
+    target_wav_path: Path,
+    logger_callback=print,
+    progress_callback=None,
+    clip_range=None,
+):
+    if not start_audio_extraction(target_wav_path, logger_callback, progress_callback):
+        return
+    start_timestamp = time.time()
+    media_info = probe_media_info(raw_media_path)
+    extraction_method, duration_seconds, slice_count = plan_audio_extraction(
+        raw_media_path, media_info, clip_range, logger_callback=logger_callback
+    )
+    if extraction_method == "link":
+        link_or_copy_file(raw_media_path, target_wav_path)
+    elif extraction_method == "stream_copy":
+        subprocess.run(
+            build_ffmpeg_stream_copy_command(raw_media_path, target_wav_path),
+            check=True,
+        )
+    elif slice_count > 1:
+        transcode_in_parallel_slices(
+            raw_media_path,
+            target_wav_path,
+            duration_seconds,
+            slice_count,
+            progress_callback=progress_callback,
+        )
+    else:
+        returncode, command_output = run_command_with_line_parser(
+            build_ffmpeg_transcode_command(
+                raw_media_path, target_wav_path, clip_range
+            ),
+            lambda output_line: parse_ffmpeg_progress_line(
+                output_line, duration_seconds
+            ),
+            progress_callback=progress_callback,
+            output_logger=eventlog.get_subprocess_output_logger(
+                logger_callback, "ffmpeg"
+            ),
+        )
+        if returncode != 0:
+            eventlog.as_logger(logger_callback).error(
+                "音频转码失败: %s", command_output
+            )
+            raise RuntimeError(f"音频转码失败: {raw_media_path}")
+    finish_audio_extraction(target_wav_path, start_timestamp, logger_callback)
+
+
+async def extract_standard_audio_wav_async(
+    raw_media_path: Path,
+    target_wav_path: Path,
+    logger_callback=print,
+    progress_callback=None,
+    clip_range=None,
+):
+    """extract_standard_audio_wav 的异步版本：ffprobe 与 ffmpeg 以异步子进程运行"""
+    if not await asyncio.to_thread(
+        start_audio_extraction, target_wav_path, logger_callback, progress_callback
+    ):
+        return
+    start_timestamp = time.time()
+    media_info = await probe_media_info_async(raw_media_path)
+    extraction_method, duration_seconds, slice_count = await asyncio.to_thread(
+        plan_audio_extraction,
+        raw_media_path,
+        media_info,
+        clip_range,
+        logger_callback=logger_callback,
+    )
+    if extraction_method == "link":
+        await asyncio.to_thread(link_or_copy_file, raw_media_path, target_wav_path)
+    elif extraction_method == "stream_copy":
+        stream_copy_command = build_ffmpeg_stream_copy_command(
+            raw_media_path, target_wav_path
+        )
+        returncode, _, stderr = await run_command_async(stream_copy_command)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, stream_copy_command, stderr=stderr
+            )
+    elif slice_count > 1:
+        await transcode_in_parallel_slices_async(
+            raw_media_path,
+            target_wav_path,
+            duration_seconds,
+            slice_count,
+            progress_callback=progress_callback,
+        )
+    else:
+        returncode, command_output = await run_command_with_line_parser_async(
+            build_ffmpeg_transcode_command(
+                raw_media_path, target_wav_path, clip_range
+            ),
+            lambda output_line: parse_ffmpeg_progress_line(
+                output_line, duration_seconds
+            ),
+            progress_callback=progress_callback,
+            output_logger=eventlog.get_subprocess_output_logger(
+                logger_callback, "ffmpeg"
+            ),
+        )
+        if returncode != 0:
+            eventlog.as_logger(logger_callback).error(
+                "音频转码失败: %s", command_output
+            )
+            raise RuntimeError(f"音频转码失败: {raw_media_path}")
+    await asyncio.to_thread(
+        finish_audio_extraction, target_wav_path, start_timestamp, logger_callback
+    )
+
+
+def cut_wav_range(source_wav_path: Path, target_wav_path: Path, time_range):
+    """从已转码的标准 WAV 中按采样点截取范围，无需重新解码"""
+    copy_chunk_frames = 1024 * 1024
+    with wave.open(str(source_wav_path), "rb") as source_wav:
+        frame_rate = source_wav.getframerate()
+        total_frames = source_wav.getnframes()
+        start_frame = min(time_range.start_ms * frame_rate // 1000, total_frames)
+        end_frame = total_frames
+        if time_range.end_ms is not None:
+            end_frame = min(time_range.end_ms * frame_rate // 1000, total_frames)
+        source_wav.setpos(start_frame)
+        with wave.open(str(target_wav_path), "wb") as target_wav:
+            target_wav.setnchannels(source_wav.getnchannels())
+            target_wav.setsampwidth(source_wav.getsampwidth())
+            target_wav.setframerate(frame_rate)
+            remaining_frames = end_frame - start_frame
+            while remaining_frames > 0:
+                frame_count = min(copy_chunk_frames, remaining_frames)
+                target_wav.writeframes(source_wav.readframes(frame_count))
+                remaining_frames -= frame_count
+
+
+def cut_range_from_full_audio(
+    target_wav_path: Path,
+    full_task_directory: Path,
+    time_range,
+    logger_callback=print,
+) -> bool:
+    """完整任务已有标准音频时直接从中截取范围并返回 True，否则返回 False"""
+    step_completion_flag = target_wav_path.parent / "donefile"
+    full_audio_path = full_task_directory / "02_audio" / "audio.wav"
+    if (
+        step_completion_flag.exists()
+        or not (full_audio_path.parent / "donefile").exists()
+    ):
+        return False
+    eventlog.as_logger(logger_callback).info("从完整任务的音频中截取范围，跳过转码")
+    target_wav_path.parent.mkdir(exist_ok=True)
+    # 上次中断留下的目标文件可能是硬链接，先解除再写入
+    target_wav_path.unlink(missing_ok=True)
+    cut_wav_range(full_audio_path, target_wav_path, time_range)
     step_completion_flag.touch()
-    logger_callback(f"音频转码完成，耗时: {time.time() - start_timestamp:.2f}s")
+    return True
+
+
+def extract_range_audio_wav(
+    raw_media_path: Path,
+    target_wav_path: Path,
+    resource_info: dict,
+    full_task_directory: Path,
+    time_range,
+    logger_callback=print,
+    progress_callback=None,
+):
+    """范围任务的转码：完整任务已有标准音频时直接截取，否则只转码该范围"""
+    if cut_range_from_full_audio(
+        target_wav_path, full_task_directory, time_range, logger_callback
+    ):
+        return
+    extract_standard_audio_wav(
+        raw_media_path,
+        target_wav_path,
+        logger_callback=logger_callback,
+        progress_callback=progress_callback,
+        clip_range=None if resource_info.get("media_trimmed") else time_range,
+    )
+
+
+async def extract_range_audio_wav_async(
+    raw_media_path: Path,
+    target_wav_path: Path,
+    resource_info: dict,
+    full_task_directory: Path,
+    time_range,
+    logger_callback=print,
+    progress_callback=None,
+):
+    if await asyncio.to_thread(
+        cut_range_from_full_audio,
+        target_wav_path,
+        full_task_directory,
+        time_range,
+        logger_callback,
+    ):
+        return
+    await extract_standard_audio_wav_async(
+        raw_media_path,
+        target_wav_path,
+        logger_callback=logger_callback,
+        progress_callback=progress_callback,
+        clip_range=None if resource_info.get("media_trimmed") else time_range,
+    )
+
+
+def get_wav_duration_ms(wav_file_path: Path) -> int:
+    with wave.open(str(wav_file_path), "rb") as wav_file:
+        return int(wav_file.getnframes() * 1000 / wav_file.getframerate())
+
+
+def load_speech_segments(task_directory: Path) -> dict | None:
+    """读取 VAD 阶段保存的语音片段信息，未执行过 VAD 时返回 None"""
+    vad_step_dir = task_directory / "02_vad"
+    if not (vad_step_dir / "donefile").exists():
+        return None
+    with open(vad_step_dir / "segments.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def detect_speech_segments(
+    wav_file_path: Path, task_directory: Path, logger_callback=print
+) -> dict:
+    """独立的 VAD 预处理：检测语音片段并计算语音占比，结果保存在任务目录中"""
+    logger = eventlog.as_logger(logger_callback)
+    cached_segments = load_speech_segments(task_directory)
+    if cached_segments is not None:
+        logger.info("检测到语音活动检测缓存结果，直接读取")
+        return cached_segments
+
+    vad_step_dir = task_directory / "02_vad"
+    vad_step_dir.mkdir(exist_ok=True)
+    vad_model = model.request_model(*get_vad_model_spec())
+    logger.info("正在进行语音活动检测...")
+    start_timestamp = time.time()
+    vad_result = vad_model.generate(input=str(wav_file_path))[0]
+    speech_segments = [
+        [int(start), int(end)] for start, end in vad_result.get("value", [])
+    ]
+
+    duration_ms = get_wav_duration_ms(wav_file_path)
+    speech_ms = sum(end - start for start, end in speech_segments)
+    segment_data = {
+        "duration_ms": duration_ms,
+        "speech_ms": speech_ms,
+        "speech_ratio": speech_ms / duration_ms if duration_ms else 0.0,
+        "segments": speech_segments,
+    }
+    with open(vad_step_dir / "segments.json", "w", encoding="utf-8") as f:
+        json.dump(segment_data, f, ensure_ascii=False)
+    (vad_step_dir / "donefile").touch()
+    logger.info(
+        "语音活动检测完成，共 %d 个语音片段，语音占比 %.1f%%，耗时: %.2fs",
+        len(speech_segments),
+        segment_data["speech_ratio"] * 100,
+        time.time() - start_timestamp,
+    )
+    return segment_data
+
+
+def has_enough_speech(segment_data: dict, logger_callback=print) -> bool:
+    if segment_data["speech_ratio"] >= MIN_SPEECH_RATIO:
+        return True
+    eventlog.as_logger(logger_callback).warning(
+        "[任务状态] 语音占比 %.1f%% 低于阈值 %.1f%%，跳过语音识别",
+        segment_data["speech_ratio"] * 100,
+        MIN_SPEECH_RATIO * 100,
+    )
+    return False
+
+
+def plan_recognition_chunks(
+    speech_segments: list[list[int]], duration_ms: int
+) -> list[tuple[int, int]]:
+    """
+    将相邻的语音片段合并为不超过 ASR_CHUNK_SECONDS 的识别块，块边界总是落在静音处。
+    返回各块的 (起始毫秒, 结束毫秒)。
+    """
+    max_chunk_ms = ASR_CHUNK_SECONDS * 1000
+    chunk_spans = []
+    for segment_start, segment_end in speech_segments:
+        if chunk_spans and segment_end - chunk_spans[-1][0] <= max_chunk_ms:
+            chunk_spans[-1][1] = segment_end
+        else:
+            chunk_spans.append([segment_start, segment_end])
+
+    padded_chunks = []
+    for chunk_index, (chunk_start, chunk_end) in enumerate(chunk_spans):
+        previous_end = chunk_spans[chunk_index - 1][1] if chunk_index > 0 else None
+        next_start = (
+            chunk_spans[chunk_index + 1][0]
+            if chunk_index + 1 < len(chunk_spans)
+            else None
+        )
+        # 相邻块之间的静音不足两倍留白时各取一半，避免同一段音频被识别两次
+        start_padding = ASR_CHUNK_PADDING_MS
+        if previous_end is not None:
+            start_padding = min(start_padding, (chunk_start - previous_end) // 2)
+        end_padding = ASR_CHUNK_PADDING_MS
+        if next_start is not None:
+            end_padding = min(end_padding, (next_start - chunk_end) // 2)
+        padded_chunks.append(
+            (
+                max(chunk_start - start_padding, 0),
+                min(chunk_end + end_padding, duration_ms),
+            )
+        )
+    return padded_chunks
+
+
+def read_wav_samples(wav_file_path: Path, start_ms: int, end_ms: int):
+    """读取 WAV 中的一段，返回 [-1, 1] 范围的 float32 数组"""
+    import numpy as np
+
+    with wave.open(str(wav_file_path), "rb") as wav_file:
+        frame_rate = wav_file.getframerate()
+        start_frame = start_ms * frame_rate // 1000
+        end_frame = min(end_ms * frame_rate // 1000, wav_file.getnframes())
+        wav_file.setpos(start_frame)
+        pcm_bytes = wav_file.readframes(max(end_frame - start_frame, 0))
+    return np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def recognize_in_chunks(
+    speech_model,
+    wav_file_path: Path,
+    recognition_chunks: list[tuple[int, int]],
+    progress_callback=None,
+) -> dict:
+    """逐块识别并把各块的时间戳平移回整段音频的时间轴"""
+    chunk_texts = []
+    merged_timestamps = []
+    has_timestamps = True
+    for chunk_index, (chunk_start, chunk_end) in enumerate(recognition_chunks):
+        chunk_audio = read_wav_samples(wav_file_path, chunk_start, chunk_end)
+        chunk_result = speech_model.generate(
+            input=chunk_audio,
+            **autotune.get_generate_options("speech", get_compute_device()),
+        )[0]
+        chunk_text = chunk_result.get("text", "").strip()
+        if chunk_text:
+            chunk_word_count = len(chunk_text.split(" "))
+            chunk_timestamps = [
+                [word_start + chunk_start, word_end + chunk_start]
+                for word_start, word_end in chunk_result.get("timestamp", [])
+            ]
+            if not chunk_timestamps:
+                has_timestamps = False
+            else:
+                # 保持词与时间戳一一对应，避免某一块的偏差影响后续所有块
+                chunk_timestamps += [chunk_timestamps[-1]] * (
+                    chunk_word_count - len(chunk_timestamps)
+                )
+                merged_timestamps.extend(chunk_timestamps[:chunk_word_count])
+            chunk_texts.append(chunk_text)
+        if progress_callback is not None:
+            progress_callback((chunk_index + 1) / len(recognition_chunks))
+    return {
+        "key": wav_file_path.stem,
+        "text": " ".join(chunk_texts),
+        "timestamp": merged_timestamps if has_timestamps else [],
+    }
 
 
 def perform_speech_recognition(
-    wav_file_path: Path, result_storage_path: Path, logger_callback=print
+    wav_file_path: Path,
+    result_storage_path: Path,
+    logger_callback=print,
+    progress_callback=None,
+    speech_segments: list[list[int]] | None = None,
+    timestamp_offset_ms: int = 0,
 ) -> dict:
+    """timestamp_offset_ms 为音频在原始媒体中的起点，保存的时间戳总以原始媒体为准"""
+    logger = eventlog.as_logger(logger_callback)
     recognition_completion_flag = result_storage_path.parent / "donefile"
     if recognition_completion_flag.exists():
-        logger_callback("检测到语音识别缓存结果，直接读取")
+        logger.info("检测到语音识别缓存结果，直接读取")
         with open(result_storage_path, "r", encoding="utf-8") as f:
             return json.load(f)
     speech_model = get_initialized_speech_model(logger_callback=logger_callback)
-    logger_callback("开始语音识别推理 (此过程取决于硬件性能)...")
+    logger.info("开始语音识别推理 (此过程取决于硬件性能)...")
     start_timestamp = time.time()
-    inference_result = speech_model.generate(input=str(wav_file_path))[0]
+    if progress_callback is not None:
+        progress_callback(0.0)
+    recognition_chunks = (
+        plan_recognition_chunks(speech_segments, get_wav_duration_ms(wav_file_path))
+        if speech_segments
+        else []
+    )
+    if len(recognition_chunks) > 1:
+        logger.info("音频按语音片段分为 %d 块依次识别", len(recognition_chunks))
+        inference_result = recognize_in_chunks(
+            speech_model,
+            wav_file_path,
+            recognition_chunks,
+            progress_callback=progress_callback,
+        )
+    else:
+        inference_result = speech_model.generate(
+            input=str(wav_file_path),
+            **autotune.get_generate_options("speech", get_compute_device()),
+        )[0]
     formatted_result_data = {
         "text": inference_result["text"],
         "timestamp": inference_result.get("timestamp", []),
         "raw_inference_output": inference_result,
     }
+    if timestamp_offset_ms:
+        formatted_result_data = timerange.offset_recognition_result(
+            formatted_result_data, timestamp_offset_ms
+        )
     result_storage_path.parent.mkdir(exist_ok=True)
     with open(result_storage_path, "w", encoding="utf-8") as f:
         json.dump(formatted_result_data, f, ensure_ascii=False, indent=2)
     recognition_completion_flag.touch()
-    logger_callback(f"识别完毕，推理引擎耗时: {time.time() - start_timestamp:.2f}s")
+    logger.info("识别完毕，推理引擎耗时: %.2fs", time.time() - start_timestamp)
     return formatted_result_data
 
 
+def get_range_cut_parameters(task_directory: Path, time_range) -> dict | None:
+    """
+    完整任务已有带时间戳的识别结果时，范围任务可直接从中截取。返回此时 recognize
+    阶段的参数（完整结果的摘要与范围），完整结果变化后截取结果随之失效；
+    无法截取时返回 None。
+    """
+    full_result_path = task_directory / "03_result" / "result.json"
+    if not (full_result_path.parent / "donefile").exists():
+        return None
+    if load_cached_input_resource(task_directory) is None:
+        return None
+    with open(full_result_path, encoding="utf-8") as f:
+        if not json.load(f).get("timestamp"):
+            return None
+    return {
+        "recognize": {
+            "source_result": compute_file_digest(full_result_path),
+            "time_range": [time_range.start_ms, time_range.end_ms],
+        }
+    }
+
+
+def cut_recognition_result_from_full_job(
+    full_task_directory: Path,
+    result_storage_path: Path,
+    time_range,
+    logger_callback=print,
+) -> dict:
+    """从完整任务的识别结果中截取范围内的单词，不做任何推理"""
+    logger = eventlog.as_logger(logger_callback)
+    completion_flag = result_storage_path.parent / "donefile"
+    if completion_flag.exists():
+        logger.info("检测到截取的识别结果缓存，直接读取")
+        with open(result_storage_path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(
+        full_task_directory / "03_result" / "result.json", encoding="utf-8"
+    ) as f:
+        range_result = timerange.slice_recognition_result(json.load(f), time_range)
+    result_storage_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(result_storage_path, "w", encoding="utf-8") as f:
+        json.dump(range_result, f, ensure_ascii=False, indent=2)
+    completion_flag.touch()
+    logger.info(
+        "已从完整任务的识别结果中截取 %s，共 %d 个词，无需推理",
+        time_range.label(),
+        len(range_result["timestamp"]),
+    )
+    return range_result
+
+
+def plan_punctuation_windows(token_count: int) -> list[tuple[int, int, int, int]]:
+    """
+    将词序列划分为窗口，返回 (上下文起点, 输出起点, 输出终点, 上下文终点)。
+    相邻窗口的输出区间首尾相接，上下文区间互相重叠。
+    """
+    punctuation_windows = []
+    for core_start in range(0, token_count, PUNC_WINDOW_TOKENS):
+        core_end = min(core_start + PUNC_WINDOW_TOKENS, token_count)
+        punctuation_windows.append(
+            (
+                max(core_start - PUNC_CONTEXT_TOKENS, 0),
+                core_start,
+                core_end,
+                min(core_end + PUNC_CONTEXT_TOKENS, token_count),
+            )
+        )
+    return punctuation_windows
+
+
+def locate_tokens_in_punctuated_text(
+    tokens: list[str], punctuated_text: str
+) -> list[int]:
+    """
+    找出每个输入词在标点模型输出中的起始位置。模型会删去中文之间的空格并插入标点，
+    但不改变词本身；找不到的词（极少见）记为上一个词的结尾。
+    """
+    lowered_text = punctuated_text.lower()
+    token_offsets = []
+    search_position = 0
+    for token in tokens:
+        token_position = lowered_text.find(token.lower(), search_position)
+        if token_position < 0:
+            token_offsets.append(search_position)
+            continue
+        token_offsets.append(token_position)
+        search_position = token_position + len(token)
+    return token_offsets
+
+
+def extract_window_core_text(
+    window_tokens: list[str],
+    punctuated_text: str,
+    core_offset: int,
+    core_length: int,
+) -> str:
+    """
+    从窗口的标点输出中截取输出区间对应的文本：从第一个输出词开始，
+    到下一个窗口第一个词之前为止，因此词后面的标点归属于该词所在的窗口
+    """
+    token_offsets = locate_tokens_in_punctuated_text(window_tokens, punctuated_text)
+    core_text_start = token_offsets[core_offset] if core_offset else 0
+    core_end_index = core_offset + core_length
+    if core_end_index < len(window_tokens):
+        core_text_end = token_offsets[core_end_index]
+    else:
+        core_text_end = len(punctuated_text)
+    return punctuated_text[core_text_start:core_text_end]
+
+
 def generate_text_with_punctuation(
-    recognition_data: dict, task_directory: Path, logger_callback=print
+    recognition_data: dict,
+    task_directory: Path,
+    logger_callback=print,
+    progress_callback=None,
 ) -> Path:
-    """第四步：生成带标点的文本文件（保存在任务目录中）"""
+    """第四步：生成带标点的文本文件（保存在任务目录中），按窗口分批处理并逐步写入"""
     text_output_dir = task_directory / "04_text_output"
     text_output_dir.mkdir(exist_ok=True)
     txt_file_path = text_output_dir / "text_with_punctuation.txt"
     
+    logger = eventlog.as_logger(logger_callback)
     completion_flag = text_output_dir / "donefile"
     if completion_flag.exists():
-        logger_callback("检测到已生成的文本文件缓存，跳过标点恢复")
+        logger.info("检测到已生成的文本文件缓存，跳过标点恢复")
         return txt_file_path
     
     punc_model = get_initialized_punc_model(logger_callback=logger_callback)
-    logger_callback("开始标点恢复推理...")
     start_timestamp = time.time()
-    text_with_punctuation = punc_model.generate(input=recognition_data["text"])[0]["text"]
-    logger_callback(f"标点恢复完成，耗时: {time.time() - start_timestamp:.2f}s")
+    tokens = recognition_data["text"].split()
+    punctuation_windows = plan_punctuation_windows(len(tokens))
+    logger.info("开始标点恢复推理，共 %d 个窗口...", len(punctuation_windows))
+    if progress_callback is not None:
+        progress_callback(0.0)
+    with open(txt_file_path, "w", encoding="utf-8") as txt_file:
+        for batch_start in range(0, len(punctuation_windows), PUNC_BATCH_WINDOWS):
+            window_batch = punctuation_windows[
+                batch_start : batch_start + PUNC_BATCH_WINDOWS
+            ]
+            # 与 SRT 阶段并行时可能共用同一标点模型实例，按批加锁；
+            # ct-punc 每次只接受一条输入，批内的窗口逐个推理
+            with model.get_inference_lock(punc_model):
+                batch_outputs = [
+                    punc_model.generate(
+                        input=" ".join(tokens[context_start:context_end])
+                    )[0]
+                    for context_start, _, _, context_end in window_batch
+                ]
+            for (context_start, core_start, core_end, context_end), output in zip(
+                window_batch, batch_outputs
+            ):
+                txt_file.write(
+                    extract_window_core_text(
+                        tokens[context_start:context_end],
+                        output["text"],
+                        core_start - context_start,
+                        core_end - core_start,
+                    )
+                )
+            # 每批写完后立即落盘，长文本可以边处理边查看
+            txt_file.flush()
+            if progress_callback is not None:
+                progress_callback(
+                    (batch_start + len(window_batch)) / len(punctuation_windows)
+                )
+    logger.info("标点恢复完成，耗时: %.2fs", time.time() - start_timestamp)
     
-    txt_file_path.write_text(text_with_punctuation, encoding="utf-8")
     completion_flag.touch()
     return txt_file_path
 
@@ -251,49 +1816,55 @@ def generate_srt_file(
     srt_output_dir.mkdir(exist_ok=True)
     srt_file_path = srt_output_dir / "subtitles.srt"
 
+    logger = eventlog.as_logger(logger_callback)
     completion_flag = srt_output_dir / "donefile"
     if completion_flag.exists():
-        logger_callback("检测到已生成的SRT文件缓存，跳过SRT生成")
+        logger.info("检测到已生成的SRT文件缓存，跳过SRT生成")
         return srt_file_path
 
-    logger_callback("正在生成带有时间轴的SRT字幕文件...")
+    logger.info("正在生成带有时间轴的SRT字幕文件...")
 
     # 确定推理设备
-    device = "cpu" if FORCE_CPU_INFERENCE else "cuda"
-
-    # 音频文件路径（用于强制对齐）
-    audio_path = task_directory / "02_audio" / "audio.wav"
-    if not audio_path.exists():
-        logger_callback(f"错误：音频文件不存在 {audio_path}")
-        raise FileNotFoundError(f"音频文件缺失: {audio_path}")
+    device = get_compute_device()
 
     SRTGeneratorClass = import_srt_generator_class()
-    srt_engine = SRTGeneratorClass(use_cpu=FORCE_CPU_INFERENCE)
+    srt_engine = SRTGeneratorClass(
+        use_cpu=FORCE_CPU_INFERENCE, punctuation_model_spec=get_punc_model_spec()
+    )
 
     # 检查是否需要补全时间戳
     if not recognition_data.get("timestamp"):
-        logger_callback("识别结果缺少时间戳，正在进行强制对齐以生成时间戳...")
-        word_timestamps = to_word_timestamp_list(
+        # 音频文件路径（用于强制对齐）
+        audio_path = task_directory / "02_audio" / "audio.wav"
+        if not audio_path.exists():
+            logger.error("音频文件不存在 %s", audio_path)
+            raise FileNotFoundError(f"音频文件缺失: {audio_path}")
+        logger.info("识别结果缺少时间戳，正在进行强制对齐以生成时间戳...")
+        word_timestamps = to_word_timestamps(
             str(audio_path), recognition_data, device=device
         )
         if word_timestamps is None:
-            logger_callback("错误：无法生成时间戳，SRT文件生成失败")
+            logger.error("无法生成时间戳，SRT文件生成失败")
             raise RuntimeError("时间戳生成失败")
-
-        # 转换为 SRTGenerator 期望的格式（将 'end' 改为 'finish'）
-        word_list_for_srt = [
-            {"text": w["text"], "start": w["start"], "finish": w["end"]}
-            for w in word_timestamps
-        ]
+        # 范围任务的音频从范围起点开始，对齐结果需平移回原始媒体的时间轴
+        timestamp_offset_ms = recognition_data.get("timestamp_offset_ms", 0)
+        word_timestamps.starts += timestamp_offset_ms
+        word_timestamps.ends += timestamp_offset_ms
 
         # 直接使用单词级时间戳生成 SRT
         srt_engine.generate_srt_from_word_timestamps(
-            word_list_for_srt, output_file_path=srt_file_path
+            word_timestamps,
+            output_file_path=srt_file_path,
+            base_silence_threshold_ms=SRT_BASE_SILENCE_THRESHOLD_MS,
+            length_penalty_factor=SRT_LENGTH_PENALTY_FACTOR,
         )
     else:
         # 已有时间戳，使用原始识别结果生成
         srt_engine.generate_srt_from_recognition_result(
-            [recognition_data["raw_inference_output"]], output_file_path=srt_file_path
+            [recognition_data["raw_inference_output"]],
+            output_file_path=srt_file_path,
+            base_silence_threshold_ms=SRT_BASE_SILENCE_THRESHOLD_MS,
+            length_penalty_factor=SRT_LENGTH_PENALTY_FACTOR,
         )
 
     completion_flag.touch()
@@ -307,10 +1878,14 @@ def copy_to_final_output(
     logger_callback=print
 ) -> list[Path]:
     """第五步：复制到最终输出目录"""
+    logger = eventlog.as_logger(logger_callback)
     original_timestamp = int(raw_info.get("timestamp", 0))
     formatted_date = datetime.fromtimestamp(original_timestamp)
     uploader_name = raw_info.get("uploader", "unknown")
     content_title = raw_info.get("title", "video")
+    if raw_info.get("time_range"):
+        # 范围任务的输出不覆盖完整任务的输出
+        content_title += f"-{timerange.TimeRange(*raw_info['time_range']).label()}"
     
     final_files = []
     
@@ -324,7 +1899,7 @@ def copy_to_final_output(
             target_txt_path = FINAL_OUTPUT_DIRECTORY / safe_txt_filename
             shutil.copy2(source_txt, target_txt_path)
             final_files.append(target_txt_path)
-            logger_callback(f"文本文件已复制到: {target_txt_path.name}")
+            logger.info("文本文件已复制到: %s", target_txt_path.name)
     
     if output_format_choice in ["srt", "both"]:
         source_srt = task_dir / "04_srt_output" / "subtitles.srt"
@@ -336,47 +1911,445 @@ def copy_to_final_output(
             target_srt_path = FINAL_OUTPUT_DIRECTORY / safe_srt_filename
             shutil.copy2(source_srt, target_srt_path)
             final_files.append(target_srt_path)
-            logger_callback(f"SRT文件已复制到: {target_srt_path.name}")
+            logger.info("SRT文件已复制到: %s", target_srt_path.name)
     
     return final_files
 
 
-def run_full_transcription_pipeline(
-    input_source: str, output_format_choice: str = "both", logger_callback=print
+def update_search_index(
+    task_directory: Path, resource_info: dict, logger_callback=print
 ):
-    verify_ffmpeg_installation()
-    
-    task_working_dir = generate_task_unique_directory(input_source)
-    
-    raw_file_path, resource_info = acquire_input_resource(
-        input_source, task_working_dir, logger_callback=logger_callback
-    )
-    
-    standard_audio_path = task_working_dir / "02_audio" / "audio.wav"
-    extract_standard_audio_wav(
-        raw_file_path, standard_audio_path, logger_callback=logger_callback
-    )
-    
-    json_result_path = task_working_dir / "03_result" / "result.json"
-    recognition_output = perform_speech_recognition(
-        standard_audio_path, json_result_path, logger_callback=logger_callback
-    )
-    
-    if output_format_choice in ["text", "both"]:
-        generate_text_with_punctuation(
-            recognition_output, task_working_dir, logger_callback=logger_callback
+    """将本任务的识别结果加入全文检索索引，索引不可用时只记录警告"""
+    try:
+        search.index_job(
+            task_directory,
+            resource_info,
+            base_silence_threshold_ms=SRT_BASE_SILENCE_THRESHOLD_MS,
+            length_penalty_factor=SRT_LENGTH_PENALTY_FACTOR,
+            logger_callback=logger_callback,
         )
-    
+    except (sqlite3.Error, OSError) as error:
+        eventlog.as_logger(logger_callback).warning("搜索索引更新失败: %s", error)
+
+
+def get_output_stages(output_format_choice: str) -> list[str]:
+    """识别之后的输出阶段，二者都只依赖识别结果，可以并行"""
+    output_stages = []
+    if output_format_choice in ["text", "both"]:
+        output_stages.append("text")
     if output_format_choice in ["srt", "both"]:
-        generate_srt_file(
-            recognition_output, task_working_dir, logger_callback=logger_callback
+        output_stages.append("srt")
+    return output_stages
+
+
+def get_pipeline_stages(
+    output_format_choice: str, cut_from_full_result: bool = False
+) -> list[str]:
+    """cut_from_full_result 为 True 时识别结果直接从完整任务截取，没有前面的阶段"""
+    input_stages = [] if cut_from_full_result else ["download", "transcode", "vad"]
+    return [
+        *input_stages,
+        "recognize",
+        *get_output_stages(output_format_choice),
+        "copy",
+    ]
+
+
+def compute_pipeline_fingerprint(output_format_choice: str) -> str:
+    """各阶段参数的摘要，写入任务完成标记；参数变化后已完成的任务需要重新处理"""
+    stage_parameters = {
+        stage_name: get_stage_parameters(stage_name)
+        for stage_name in get_pipeline_stages(output_format_choice)
+    }
+    return hashlib.sha256(
+        json.dumps(stage_parameters, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def create_progress_tracker(
+    output_format_choice: str,
+    progress_callback=None,
+    cut_from_full_result: bool = False,
+) -> ProgressTracker:
+    return ProgressTracker(
+        get_pipeline_stages(output_format_choice, cut_from_full_result),
+        RTFHistory(default_history_path(TEMPORARY_JOBS_DIRECTORY)),
+        get_compute_device(),
+        progress_callback=progress_callback,
+    )
+
+
+class TranscriptionJob:
+    """
+    一次转录任务的各个阶段，同步与异步流程共用。同步流程依次调用各阶段方法；
+    异步流程的下载与转码使用 *_async 方法，以异步子进程运行而不占用线程，
+    其余阶段放到线程中执行。每个阶段都在同一线程内完成进入、计算与提交，
+    性能分析可以按阶段在执行该阶段的线程中采样。
+    """
+
+    def __init__(
+        self,
+        input_source: str,
+        output_format_choice: str = "both",
+        logger_callback=print,
+        stage_callback=None,
+        progress_callback=None,
+        time_range=None,
+    ):
+        self.input_source = input_source
+        self.output_format_choice = output_format_choice
+        self.logger_callback = logger_callback
+        self.logger = eventlog.as_logger(logger_callback)
+        self.stage_callback = stage_callback
+        self.progress_callback = progress_callback
+        self.time_range = time_range
+        self.output_stages = get_output_stages(output_format_choice)
+        self.full_task_dir: Path | None = None
+        self.task_working_dir: Path | None = None
+        self.cut_from_full_result = False
+        self.progress_tracker: ProgressTracker | None = None
+        self.stage_cache: StageCache | None = None
+        self.pipeline_profiler: PipelineProfiler | None = None
+        self.raw_file_path: Path | None = None
+        self.resource_info: dict | None = None
+        self.segment_data: dict | None = None
+        self.recognition_output: dict | None = None
+
+    def prepare(self):
+        """定位任务目录、创建阶段缓存并预加载模型；链接规范化可能需要联网探测"""
+        verify_ffmpeg_installation()
+        # 只在进程中第一个任务开始前生效，之后并行的阶段不再改写线程数
+        autotune.apply_thread_settings(get_compute_device())
+        self.full_task_dir = generate_task_unique_directory(
+            self.input_source, logger_callback=self.logger_callback
         )
-    
-    final_produced_files = copy_to_final_output(
-        resource_info, task_working_dir, output_format_choice, logger_callback=logger_callback
+        self.task_working_dir = self.full_task_dir
+        stage_parameter_overrides = None
+        if self.time_range is not None:
+            self.logger.info("[时间范围] 只处理 %s", self.time_range.label())
+            stage_parameter_overrides = get_range_cut_parameters(
+                self.full_task_dir, self.time_range
+            )
+            self.task_working_dir = get_range_task_directory(
+                self.full_task_dir, self.time_range
+            )
+            self.task_working_dir.mkdir(parents=True, exist_ok=True)
+        self.cut_from_full_result = stage_parameter_overrides is not None
+        self.progress_tracker = create_progress_tracker(
+            self.output_format_choice,
+            progress_callback=self.progress_callback,
+            cut_from_full_result=self.cut_from_full_result,
+        )
+        self.stage_cache = create_stage_cache(
+            self.task_working_dir, stage_parameter_overrides
+        )
+        if PROFILE_PIPELINE:
+            self.pipeline_profiler = PipelineProfiler(self.task_working_dir / "profile")
+        else:
+            preload_pipeline_models(
+                self.stage_cache,
+                self.output_format_choice,
+                logger_callback=self.logger_callback,
+                cut_from_full_result=self.cut_from_full_result,
+            )
+
+    @property
+    def standard_audio_path(self) -> Path:
+        return self.task_working_dir / "02_audio" / "audio.wav"
+
+    @property
+    def json_result_path(self) -> Path:
+        return self.task_working_dir / "03_result" / "result.json"
+
+    def run_stage(self, stage_name: str, stage_function):
+        """进入阶段、执行 stage_function 并提交指纹，返回 stage_function 的结果"""
+        if self.pipeline_profiler is not None:
+            self.pipeline_profiler.enter_stage(stage_name)
+        try:
+            self.begin_stage(stage_name)
+            stage_result = stage_function()
+            self.stage_cache.commit(stage_name)
+        finally:
+            if self.pipeline_profiler is not None:
+                self.pipeline_profiler.close_stage()
+        return stage_result
+
+    async def run_stage_async(self, stage_name: str, stage_coroutine_function):
+        """run_stage 的异步版本：stage_coroutine_function 返回协程，进入与提交在线程中执行"""
+        if self.pipeline_profiler is not None:
+            self.pipeline_profiler.enter_stage(stage_name)
+        try:
+            await asyncio.to_thread(self.begin_stage, stage_name)
+            stage_result = await stage_coroutine_function()
+            await asyncio.to_thread(self.stage_cache.commit, stage_name)
+        finally:
+            if self.pipeline_profiler is not None:
+                self.pipeline_profiler.close_stage()
+        return stage_result
+
+    def begin_stage(self, stage_name: str):
+        self.progress_tracker.enter_stage(stage_name)
+        self.stage_cache.prepare(stage_name, logger_callback=self.logger_callback)
+        if self.stage_callback is not None:
+            self.stage_callback(stage_name)
+
+    def cut_recognition_result(self) -> bool:
+        """从完整任务的识别结果中截取范围，范围内没有语音时返回 False"""
+        _, full_resource_info = load_cached_input_resource(self.full_task_dir)
+        self.resource_info = build_range_resource_metadata(
+            full_resource_info, self.time_range, media_trimmed=False
+        )
+        self.recognition_output = self.run_stage(
+            "recognize",
+            lambda: cut_recognition_result_from_full_job(
+                self.full_task_dir,
+                self.json_result_path,
+                self.time_range,
+                logger_callback=self.logger_callback,
+            ),
+        )
+        if not self.recognition_output["text"]:
+            self.logger.info("[任务状态] 该范围内没有识别到语音")
+            return False
+        range_end_ms = (
+            self.time_range.end_ms or self.recognition_output["timestamp"][-1][1]
+        )
+        self.progress_tracker.set_audio_duration(
+            (range_end_ms - self.time_range.start_ms) / 1000
+        )
+        return True
+
+    def download(self):
+        self.raw_file_path, self.resource_info = self.run_stage(
+            "download",
+            lambda: acquire_input_resource(
+                self.input_source,
+                self.task_working_dir,
+                logger_callback=self.logger_callback,
+                progress_callback=self.progress_tracker.update,
+                time_range=self.time_range,
+                full_task_directory=self.full_task_dir,
+            ),
+        )
+
+    async def download_async(self):
+        self.raw_file_path, self.resource_info = await self.run_stage_async(
+            "download",
+            lambda: acquire_input_resource_async(
+                self.input_source,
+                self.task_working_dir,
+                logger_callback=self.logger_callback,
+                progress_callback=self.progress_tracker.update,
+                time_range=self.time_range,
+                full_task_directory=self.full_task_dir,
+            ),
+        )
+
+    def transcode(self):
+        def extract_audio():
+            if self.time_range is None:
+                extract_standard_audio_wav(
+                    self.raw_file_path,
+                    self.standard_audio_path,
+                    logger_callback=self.logger_callback,
+                    progress_callback=self.progress_tracker.update,
+                )
+            else:
+                extract_range_audio_wav(
+                    self.raw_file_path,
+                    self.standard_audio_path,
+                    self.resource_info,
+                    self.full_task_dir,
+                    self.time_range,
+                    logger_callback=self.logger_callback,
+                    progress_callback=self.progress_tracker.update,
+                )
+
+        self.run_stage("transcode", extract_audio)
+        self.update_audio_duration()
+
+    async def transcode_async(self):
+        def extract_audio():
+            if self.time_range is None:
+                return extract_standard_audio_wav_async(
+                    self.raw_file_path,
+                    self.standard_audio_path,
+                    logger_callback=self.logger_callback,
+                    progress_callback=self.progress_tracker.update,
+                )
+            return extract_range_audio_wav_async(
+                self.raw_file_path,
+                self.standard_audio_path,
+                self.resource_info,
+                self.full_task_dir,
+                self.time_range,
+                logger_callback=self.logger_callback,
+                progress_callback=self.progress_tracker.update,
+            )
+
+        await self.run_stage_async("transcode", extract_audio)
+        await asyncio.to_thread(self.update_audio_duration)
+
+    def update_audio_duration(self):
+        self.progress_tracker.set_audio_duration(
+            get_wav_duration_ms(self.standard_audio_path) / 1000
+        )
+
+    def detect_speech(self) -> bool:
+        """语音占比过低时返回 False，跳过识别"""
+        self.segment_data = self.run_stage(
+            "vad",
+            lambda: detect_speech_segments(
+                self.standard_audio_path,
+                self.task_working_dir,
+                logger_callback=self.logger_callback,
+            ),
+        )
+        return has_enough_speech(
+            self.segment_data, logger_callback=self.logger_callback
+        )
+
+    def recognize(self):
+        self.recognition_output = self.run_stage(
+            "recognize",
+            lambda: perform_speech_recognition(
+                self.standard_audio_path,
+                self.json_result_path,
+                logger_callback=self.logger_callback,
+                progress_callback=self.progress_tracker.update,
+                speech_segments=self.segment_data["segments"],
+                timestamp_offset_ms=self.time_range.start_ms if self.time_range else 0,
+            ),
+        )
+
+    def generate_output(self, stage_name: str, progress_callback):
+        if stage_name == "text":
+            generate_text_with_punctuation(
+                self.recognition_output,
+                self.task_working_dir,
+                logger_callback=self.logger_callback,
+                progress_callback=progress_callback,
+            )
+        elif stage_name == "srt":
+            generate_srt_file(
+                self.recognition_output,
+                self.task_working_dir,
+                logger_callback=self.logger_callback,
+            )
+
+    def runs_output_stages_in_parallel(self) -> bool:
+        """文本与字幕都只依赖识别结果，可以并行；性能分析按阶段依次采样，开启时顺序执行"""
+        return self.pipeline_profiler is None and len(self.output_stages) > 1
+
+    def enter_parallel_stages(self):
+        self.progress_tracker.enter_parallel_stages(self.output_stages)
+        for stage_name in self.output_stages:
+            self.stage_cache.prepare(stage_name, logger_callback=self.logger_callback)
+            if self.stage_callback is not None:
+                self.stage_callback(stage_name)
+
+    def run_parallel_output_stage(self, stage_name: str):
+        """enter_parallel_stages 之后，每个输出阶段在各自的线程中调用"""
+        self.generate_output(
+            stage_name, self.progress_tracker.stage_updater(stage_name)
+        )
+        self.stage_cache.commit(stage_name)
+        self.progress_tracker.complete_stage(stage_name)
+
+    def run_output_stage(self, stage_name: str):
+        self.run_stage(
+            stage_name,
+            lambda: self.generate_output(stage_name, self.progress_tracker.update),
+        )
+
+    def run_output_stages(self):
+        """全部输出阶段结束后才返回，任一阶段失败时抛出其异常"""
+        if not self.runs_output_stages_in_parallel():
+            for stage_name in self.output_stages:
+                self.run_output_stage(stage_name)
+            return
+        self.enter_parallel_stages()
+        with ThreadPoolExecutor(
+            max_workers=len(self.output_stages), thread_name_prefix="output-stage"
+        ) as executor:
+            stage_futures = [
+                executor.submit(self.run_parallel_output_stage, stage_name)
+                for stage_name in self.output_stages
+            ]
+        for stage_future in stage_futures:
+            stage_future.result()
+
+    def copy_outputs(self) -> list[Path]:
+        def copy_and_index():
+            final_produced_files = copy_to_final_output(
+                self.resource_info,
+                self.task_working_dir,
+                self.output_format_choice,
+                logger_callback=self.logger_callback,
+            )
+            if self.time_range is None:
+                # 范围任务的内容已包含在完整任务中，只索引完整任务
+                update_search_index(
+                    self.task_working_dir,
+                    self.resource_info,
+                    logger_callback=self.logger_callback,
+                )
+            return final_produced_files
+
+        return self.run_stage("copy", copy_and_index)
+
+    def finish_profiling(self, failed: bool = False):
+        """失败时也要调用，停止 cProfile 与 tracemalloc 并写出已完成阶段的结果"""
+        if self.pipeline_profiler is not None:
+            self.pipeline_profiler.finish(
+                logger_callback=self.logger_callback, failed=failed
+            )
+
+
+def run_full_transcription_pipeline(
+    input_source: str,
+    output_format_choice: str = "both",
+    logger_callback=print,
+    stage_callback=None,
+    progress_callback=None,
+    time_range=None,
+):
+    """
+    stage_callback(stage) 在进入每个阶段时调用；
+    progress_callback(ProgressUpdate) 接收阶段进度、整体进度与预计剩余时间。
+    time_range (timerange.TimeRange) 不为 None 时只转录该范围，时间戳仍以原始媒体为准；
+    完整任务已有识别结果时直接从中截取，不做推理。
+    """
+    transcription_job = TranscriptionJob(
+        input_source,
+        output_format_choice,
+        logger_callback=logger_callback,
+        stage_callback=stage_callback,
+        progress_callback=progress_callback,
+        time_range=time_range,
     )
-    
-    logger_callback("[任务状态] 所有流程均已成功执行完毕")
+    transcription_job.prepare()
+    try:
+        if transcription_job.cut_from_full_result:
+            has_speech = transcription_job.cut_recognition_result()
+        else:
+            transcription_job.download()
+            transcription_job.transcode()
+            has_speech = transcription_job.detect_speech()
+            if has_speech:
+                transcription_job.recognize()
+        if has_speech:
+            transcription_job.run_output_stages()
+            final_produced_files = transcription_job.copy_outputs()
+            transcription_job.progress_tracker.finish()
+    except BaseException:
+        transcription_job.finish_profiling(failed=True)
+        raise
+    transcription_job.finish_profiling()
+    if not has_speech:
+        return []
+
+    transcription_job.logger.info("[任务状态] 所有流程均已成功执行完毕")
     return final_produced_files
 
 
@@ -392,10 +2365,50 @@ if __name__ == "__main__":
     cli_parser.add_argument(
         "--format", choices=["text", "srt", "both"], default="both", help="设置输出格式"
     )
+    cli_parser.add_argument(
+        "--model-memory-mb",
+        type=int,
+        default=None,
+        help="已加载模型的内存预算 (MB)，超出时按最近最少使用淘汰",
+    )
+    cli_parser.add_argument(
+        "--min-speech-ratio",
+        type=float,
+        default=MIN_SPEECH_RATIO,
+        help="语音占比低于该值时跳过识别 (0 表示从不跳过)",
+    )
+    cli_parser.add_argument(
+        "--start", help="只转录从该时间开始的部分，如 30:00 或 1:30:00"
+    )
+    cli_parser.add_argument("--end", help="只转录到该时间为止的部分")
+    cli_parser.add_argument(
+        "--dry-run", action="store_true", help="只列出会重新计算的阶段，不执行"
+    )
+    cli_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="逐阶段记录 cProfile、内存与显存峰值到任务目录的 profile/ 下",
+    )
     cli_args = cli_parser.parse_args()
     FORCE_CPU_INFERENCE = cli_args.cpu
+    PROFILE_PIPELINE = cli_args.profile
+    try:
+        time_range = timerange.parse_time_range(cli_args.start, cli_args.end)
+    except ValueError as error:
+        cli_parser.error(str(error))
+    if cli_args.dry_run:
+        print_stage_plan(cli_args.input_path, cli_args.format, time_range)
+        sys.exit(0)
+    if cli_args.model_memory_mb is not None:
+        model.set_memory_budget(cli_args.model_memory_mb * 1024 * 1024)
+    MIN_SPEECH_RATIO = cli_args.min_speech_ratio
     try:
-        results = run_full_transcription_pipeline(cli_args.input_path, cli_args.format)
+        results = run_full_transcription_pipeline(
+            cli_args.input_path,
+            cli_args.format,
+            progress_callback=ConsoleProgressPrinter(),
+            time_range=time_range,
+        )
         for path in results:
             print(f"生成文件: {path}")
     except Exception as error:
@@ -0,0 +1,374 @@
+"""
+基于 SQLite 的持久化任务队列：记录每个链接的状态、尝试次数、
+到达的阶段、各阶段耗时与错误信息，支持指数退避重试与崩溃后恢复
+
+队列数据库应放在每台机器的本地磁盘上（默认 logs/queue.sqlite3），多台机器之间
+通过任务目录中的租约协调。WAL 模式依赖共享内存，不能用于 NFS 等网络文件系统，
+数据库必须放在共享目录时改用回滚日志（journal_mode=DELETE），由文件锁串行化写入。
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# 下载失败后的重试策略：第 n 次失败后等待 RETRY_BASE_DELAY_SECONDS * 2^(n-1) 秒
+RETRY_BASE_DELAY_SECONDS = 30.0
+RETRY_MAX_DELAY_SECONDS = 3600.0
+MAX_ATTEMPTS = 5
+# 其他进程持有写锁时的等待时间
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+JOB_STATES = ("pending", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    stage TEXT,
+    error TEXT,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    elapsed REAL,
+    stage_timings TEXT NOT NULL DEFAULT '{}',
+    worker_host TEXT,
+    worker_pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_state_next ON jobs (state, next_attempt_at);
+"""
+# 旧版本创建的数据库缺少的列
+_ADDED_COLUMNS = (("worker_host", "TEXT"), ("worker_pid", "INTEGER"))
+
+
+@dataclass
+class Job:
+    id: int
+    url: str
+    state: str
+    attempts: int
+    stage: Optional[str]
+    error: Optional[str]
+    next_attempt_at: float
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    elapsed: Optional[float]
+    stage_timings: dict
+    # 领取任务的进程，用于判断 running 的任务是否已被中断
+    worker_host: Optional[str] = None
+    worker_pid: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        job_fields = dict(row)
+        job_fields["stage_timings"] = json.loads(job_fields["stage_timings"])
+        return cls(**job_fields)
+
+
+def compute_retry_delay(attempts: int) -> float:
+    return min(RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_DELAY_SECONDS)
+
+
+def is_local_process_alive(pid: int) -> Optional[bool]:
+    """本机进程是否仍在运行；无法判断时返回 None"""
+    if sys.platform == "win32":
+        # Windows 上的 os.kill 会直接结束进程，不能用信号 0 探测
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_claim_abandoned(
+    worker_host: Optional[str],
+    worker_pid: Optional[int],
+    started_at: Optional[float],
+    stale_after_seconds: Optional[float],
+) -> bool:
+    """
+    running 的任务是否已被中断：旧版本领取（未记录进程）的任务视为已中断；
+    本机进程领取的任务以进程是否退出为准；其他机器领取或无法判断进程状态时，
+    开始超过 stale_after_seconds 秒才算中断
+    """
+    if worker_host is None:
+        return True
+    if worker_host == socket.gethostname() and worker_pid is not None:
+        process_alive = is_local_process_alive(worker_pid)
+        if process_alive is not None:
+            return not process_alive
+    if stale_after_seconds is None:
+        return False
+    return (started_at or 0) < time.time() - stale_after_seconds
+
+
+class JobQueue:
+    def __init__(self, database_path: Path, on_shared_filesystem: bool = False):
+        """on_shared_filesystem 为 True 时不使用 WAL，见模块说明"""
+        self.database_path = Path(database_path)
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.database_path,
+            isolation_level=None,
+            timeout=SQLITE_BUSY_TIMEOUT_SECONDS,
+        )
+        self.connection.row_factory = sqlite3.Row
+        journal_mode = "DELETE" if on_shared_filesystem else "WAL"
+        self.connection.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.connection.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self.worker_host = socket.gethostname()
+        self.worker_pid = os.getpid()
+        self.restricted_to_claim_order = False
+
+    def _add_missing_columns(self):
+        existing_columns = {
+            row["name"] for row in self.connection.execute("PRAGMA table_info(jobs)")
+        }
+        for column_name, column_type in _ADDED_COLUMNS:
+            if column_name in existing_columns:
+                continue
+            try:
+                self.connection.execute(
+                    f"ALTER TABLE jobs ADD COLUMN {column_name} {column_type}"
+                )
+            except sqlite3.OperationalError as e:
+                # 另一个进程刚好先添加了该列
+                if "duplicate column" not in str(e):
+                    raise
+
+    def close(self):
+        self.connection.close()
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.connection)
+
+    def add_urls(self, urls: list[str]) -> int:
+        """加入新链接，已存在的链接保持原状态，返回新增数量"""
+        now = time.time()
+        with self._transaction():
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (url, created_at) VALUES (?, ?)",
+                [(url, now) for url in urls],
+            )
+            return self.connection.total_changes - before
+
+    def recover_interrupted(self, stale_after_seconds: Optional[float] = None) -> int:
+        """
+        将已中断（见 is_claim_abandoned）的 running 任务放回队列，返回恢复的数量。
+        stale_after_seconds 为 None 时只恢复本机上已退出的进程领取的任务
+        """
+        with self._transaction():
+            running_rows = self.connection.execute(
+                "SELECT id, worker_host, worker_pid, started_at FROM jobs "
+                "WHERE state = 'running'"
+            ).fetchall()
+            abandoned_ids = [
+                (row["id"],)
+                for row in running_rows
+                if is_claim_abandoned(
+                    row["worker_host"],
+                    row["worker_pid"],
+                    row["started_at"],
+                    stale_after_seconds,
+                )
+            ]
+            self.connection.executemany(
+                "UPDATE jobs SET state = 'pending', next_attempt_at = 0, "
+                "worker_host = NULL, worker_pid = NULL WHERE id = ?",
+                abandoned_ids,
+            )
+        return len(abandoned_ids)
+
+    def restrict_claims(self, urls: list[str]):
+        """
+        之后只领取这些链接的任务，并按列表顺序领取（如本分片在前、其他分片在后）。
+        顺序保存在本连接的临时表中，不影响共用同一数据库的其他进程。
+        """
+        self.connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS claim_order "
+            "(url TEXT PRIMARY KEY, position INTEGER NOT NULL)"
+        )
+        with self._transaction():
+            self.connection.execute("DELETE FROM temp.claim_order")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO temp.claim_order (url, position) VALUES (?, ?)",
+                [(url, position) for position, url in enumerate(urls)],
+            )
+        self.restricted_to_claim_order = True
+
+    def claim_next(self) -> Optional[Job]:
+        """取出一个已到重试时间的待处理任务并标记为 running"""
+        now = time.time()
+        with self._transaction():
+            if self.restricted_to_claim_order:
+                query = (
+                    "SELECT id FROM jobs JOIN temp.claim_order USING (url) "
+                    "WHERE state = 'pending' AND next_attempt_at <= ? "
+                    "ORDER BY claim_order.position LIMIT 1"
+                )
+            else:
+                query = (
+                    "SELECT id FROM jobs WHERE state = 'pending' "
+                    "AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1"
+                )
+            row = self.connection.execute(query, (now,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, "
+                "stage = NULL, error = NULL, started_at = ?, finished_at = NULL, "
+                "elapsed = NULL, stage_timings = '{}', worker_host = ?, "
+                "worker_pid = ? WHERE id = ?",
+                (now, self.worker_host, self.worker_pid, row["id"]),
+            )
+            return self.get_job(row["id"])
+
+    def seconds_until_next_retry(self) -> Optional[float]:
+        """距离最早一个待重试任务的秒数，没有待处理任务时返回 None"""
+        query = "SELECT MIN(next_attempt_at) FROM jobs "
+        if self.restricted_to_claim_order:
+            query += "JOIN temp.claim_order USING (url) "
+        row = self.connection.execute(query + "WHERE state = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0.0)
+
+    def get_job(self, job_id: int) -> Job:
+        row = self.connection.execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return Job.from_row(row)
+
+    def record_stage(self, job_id: int, stage: str, stage_timings: dict):
+        self.connection.execute(
+            "UPDATE jobs SET stage = ?, stage_timings = ? WHERE id = ?",
+            (stage, json.dumps(stage_timings), job_id),
+        )
+
+    def mark_done(self, job_id: int, stage_timings: dict):
+        now = time.time()
+        self.connection.execute(
+            "UPDATE jobs SET state = 'done', finished_at = ?, elapsed = ? - started_at, "
+            "stage_timings = ? WHERE id = ?",
+            (now, now, json.dumps(stage_timings), job_id),
+        )
+
+    def defer(self, job_id: int, delay_seconds: float):
+        """任务暂时无法处理（如被其他进程领取）：放回队列且不计入尝试次数"""
+        self.connection.execute(
+            "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), "
+            "next_attempt_at = ?, started_at = NULL, worker_host = NULL, "
+            "worker_pid = NULL WHERE id = ?",
+            (time.time() + delay_seconds, job_id),
+        )
+
+    def mark_done_elsewhere(self, job_id: int):
+        """任务已由其他进程完成，不记录耗时，避免影响剩余时间估计"""
+        self.connection.execute(
+            "UPDATE jobs SET state = 'done', attempts = MAX(attempts - 1, 0), "
+            "stage = NULL, finished_at = ?, elapsed = NULL WHERE id = ?",
+            (time.time(), job_id),
+        )
+
+    def mark_failed(
+        self, job_id: int, error: str, stage_timings: dict, retryable: bool
+    ) -> Job:
+        """记录失败；可重试且未超过次数上限时按指数退避重新排队"""
+        now = time.time()
+        job = self.get_job(job_id)
+        if retryable and job.attempts < MAX_ATTEMPTS:
+            next_state = "pending"
+            next_attempt_at = now + compute_retry_delay(job.attempts)
+        else:
+            next_state = "failed"
+            next_attempt_at = 0
+        self.connection.execute(
+            "UPDATE jobs SET state = ?, error = ?, next_attempt_at = ?, finished_at = ?, "
+            "elapsed = ? - started_at, stage_timings = ? WHERE id = ?",
+            (
+                next_state,
+                error,
+                next_attempt_at,
+                now,
+                now,
+                json.dumps(stage_timings),
+                job_id,
+            ),
+        )
+        return self.get_job(job_id)
+
+    def requeue(
+        self, states: tuple[str, ...] = ("failed",), urls: Optional[list[str]] = None
+    ) -> list[str]:
+        """将指定状态（或指定链接）的任务重新置为待处理并清零尝试次数，返回这些任务的链接"""
+        query = (
+            "UPDATE jobs SET state = 'pending', attempts = 0, next_attempt_at = 0, "
+            "error = NULL "
+        )
+        if urls:
+            placeholders = ", ".join("?" for _ in urls)
+            query += f"WHERE url IN ({placeholders})"
+            parameters = list(urls)
+        else:
+            placeholders = ", ".join("?" for _ in states)
+            query += f"WHERE state IN ({placeholders})"
+            parameters = list(states)
+        query += " RETURNING url"
+        with self._transaction():
+            return [row["url"] for row in self.connection.execute(query, parameters)]
+
+    def count_by_state(self) -> dict[str, int]:
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for row in self.connection.execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+        ):
+            counts[row[0]] = row[1]
+        return counts
+
+    def average_elapsed(self) -> Optional[float]:
+        """已完成任务的平均耗时（秒），用于估算整个批次的剩余时间"""
+        row = self.connection.execute(
+            "SELECT AVG(elapsed) FROM jobs WHERE state = 'done' AND elapsed IS NOT NULL"
+        ).fetchone()
+        return row[0]
+
+    def list_jobs(self, state: Optional[str] = None) -> list[Job]:
+        if state is None:
+            rows = self.connection.execute("SELECT * FROM jobs ORDER BY id")
+        else:
+            rows = self.connection.execute(
+                "SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)
+            )
+        return [Job.from_row(row) for row in rows]
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE 事务，避免多个进程同时取到同一个任务"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.connection.execute("COMMIT")
+        else:
+            self.connection.execute("ROLLBACK")
+        return False
@@ -0,0 +1,246 @@
+"""
+基于文件的任务租约：多台机器共享 jobs/ 目录（如 NFS）时，保证每个任务只被一个进程处理。
+
+租约文件 lease.json 放在任务目录中，用 O_EXCL 创建；持有者定期更新其修改时间作为心跳，
+超过有效期未更新的租约视为持有者已崩溃，可被其他进程接管。
+任务成功后写入 completed.json 并记录各阶段参数的指纹，其他进程看到指纹一致时直接跳过；
+参数变化或任务被重新排队（删除完成标记）后会重新处理。
+各机器的时钟需要大致同步（如 NTP），有效期应远大于时钟误差。
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import eventlog
+
+LEASE_FILENAME = "lease.json"
+COMPLETED_MARKER_FILENAME = "completed.json"
+DEFAULT_LEASE_TTL_SECONDS = 120.0
+# 有效期内至少续约这么多次，偶尔一次写入失败不会丢失租约
+HEARTBEATS_PER_TTL = 4
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def parse_shard(shard_text: str) -> tuple[int, int]:
+    """解析 "i/N"（i 从 1 开始），返回 (i, N)"""
+    try:
+        shard_index_text, shard_count_text = shard_text.split("/")
+        shard_index, shard_count = int(shard_index_text), int(shard_count_text)
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N: {shard_text}") from None
+    if not 1 <= shard_index <= shard_count:
+        raise ValueError(f"分片序号应在 1 到 {shard_count} 之间: {shard_text}")
+    return shard_index, shard_count
+
+
+def order_items_for_shard(
+    items: list[str], shard_index: int, shard_count: int, steal: bool
+) -> list[str]:
+    """
+    按行号轮流分片。steal 为 False 时只返回本分片；
+    为 True 时本分片在前，其余分片在后，本分片处理完后接着处理其他进程尚未领取的任务。
+    """
+    own_items = [
+        item
+        for position, item in enumerate(items)
+        if position % shard_count == shard_index - 1
+    ]
+    if not steal:
+        return own_items
+    return own_items + [
+        item
+        for position, item in enumerate(items)
+        if position % shard_count != shard_index - 1
+    ]
+
+
+def read_json_file(file_path: Path) -> Optional[dict]:
+    try:
+        with open(file_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def is_completed(task_directory: Path, fingerprint: Optional[str] = None) -> bool:
+    """fingerprint 不为 None 时，完成标记中的指纹不一致视为未完成"""
+    marker = read_json_file(Path(task_directory) / COMPLETED_MARKER_FILENAME)
+    if marker is None:
+        return False
+    return fingerprint is None or marker.get("fingerprint") == fingerprint
+
+
+def clear_completed(task_directory: Path) -> bool:
+    """删除完成标记，使任务可以被重新处理；标记存在时返回 True"""
+    try:
+        (Path(task_directory) / COMPLETED_MARKER_FILENAME).unlink()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class JobLease:
+    """
+    一个任务目录上的租约。acquire 成功后后台线程持续心跳，
+    release 时停止心跳并删除租约文件，任务成功时同时写入带指纹的完成标记。
+    """
+
+    def __init__(
+        self,
+        task_directory: Path,
+        worker_id: Optional[str] = None,
+        ttl_seconds: float = DEFAULT_LEASE_TTL_SECONDS,
+        logger_callback=print,
+        completion_fingerprint: Optional[str] = None,
+    ):
+        self.task_directory = Path(task_directory)
+        self.lease_path = self.task_directory / LEASE_FILENAME
+        self.worker_id = worker_id or get_worker_id()
+        self.ttl_seconds = ttl_seconds
+        self.logger = eventlog.as_logger(logger_callback)
+        self.completion_fingerprint = completion_fingerprint
+        # 每次获取租约生成新的 ID，接管或丢失租约时据此判断文件是否仍属于自己
+        self.lease_id: Optional[str] = None
+        self.lost = threading.Event()
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def read_holder(self) -> Optional[dict]:
+        return read_json_file(self.lease_path)
+
+    def seconds_until_expiry(self) -> Optional[float]:
+        """当前租约的剩余有效时间，没有租约时返回 None"""
+        try:
+            last_heartbeat_at = self.lease_path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        holder = self.read_holder() or {}
+        ttl_seconds = holder.get("ttl_seconds", self.ttl_seconds)
+        return last_heartbeat_at + ttl_seconds - time.time()
+
+    def _try_create(self) -> bool:
+        lease_id = uuid.uuid4().hex
+        try:
+            lease_fd = os.open(
+                self.lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644
+            )
+        except FileExistsError:
+            return False
+        with os.fdopen(lease_fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "lease_id": lease_id,
+                    "worker": self.worker_id,
+                    "acquired_at": time.time(),
+                    "ttl_seconds": self.ttl_seconds,
+                },
+                f,
+            )
+        self.lease_id = lease_id
+        return True
+
+    def _try_take_over_expired(self) -> bool:
+        """
+        将过期租约改名移走后重新创建。改名是原子操作，多个进程同时接管时只有一个成功；
+        若改名前租约恰好已被别人接管并刷新，则把它放回原处。
+        """
+        expired_holder = self.read_holder()
+        remaining_seconds = self.seconds_until_expiry()
+        if remaining_seconds is None or remaining_seconds > 0:
+            return False
+        stale_path = self.lease_path.with_name(
+            f"{LEASE_FILENAME}.stale-{uuid.uuid4().hex}"
+        )
+        try:
+            os.rename(self.lease_path, stale_path)
+        except FileNotFoundError:
+            return False
+        moved_holder = read_json_file(stale_path)
+        if expired_holder is not None and moved_holder != expired_holder:
+            try:
+                os.link(stale_path, self.lease_path)
+            except FileExistsError:
+                pass
+            stale_path.unlink(missing_ok=True)
+            return False
+        stale_path.unlink(missing_ok=True)
+        if expired_holder is not None:
+            self.logger.info(
+                "[租约] 接管过期任务 %s (原持有者 %s)",
+                self.task_directory.name,
+                expired_holder.get("worker"),
+            )
+        return self._try_create()
+
+    def is_completed(self) -> bool:
+        return is_completed(self.task_directory, self.completion_fingerprint)
+
+    def acquire(self) -> bool:
+        """获取租约并开始心跳；任务已完成或租约被其他进程持有时返回 False"""
+        self.task_directory.mkdir(parents=True, exist_ok=True)
+        if self.is_completed():
+            return False
+        if not (self._try_create() or self._try_take_over_expired()):
+            return False
+        # 获取租约期间其他进程可能刚好完成
+        if self.is_completed():
+            self.release()
+            return False
+        self.lost.clear()
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name="lease-heartbeat", daemon=True
+        )
+        self._heartbeat_thread.start()
+        return True
+
+    def is_held(self) -> bool:
+        holder = self.read_holder()
+        return holder is not None and holder.get("lease_id") == self.lease_id
+
+    def _heartbeat_loop(self):
+        heartbeat_interval = self.ttl_seconds / HEARTBEATS_PER_TTL
+        while not self._stop_heartbeat.wait(heartbeat_interval):
+            if not self.is_held():
+                self.lost.set()
+                self.logger.warning(
+                    "[租约] 任务 %s 的租约已被其他进程接管", self.task_directory.name
+                )
+                return
+            try:
+                os.utime(self.lease_path)
+            except OSError as e:
+                # 共享目录短暂不可用时继续尝试，超过有效期才会被接管
+                self.logger.warning("[租约] 续约失败: %s", e)
+
+    def release(self, completed: bool = False):
+        self._stop_heartbeat.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        if completed:
+            temporary_path = self.task_directory / (
+                COMPLETED_MARKER_FILENAME + f".{self.worker_id}.tmp"
+            )
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "worker": self.worker_id,
+                        "completed_at": time.time(),
+                        "fingerprint": self.completion_fingerprint,
+                    },
+                    f,
+                )
+            temporary_path.replace(self.task_directory / COMPLETED_MARKER_FILENAME)
+        if self.is_held():
+            self.lease_path.unlink(missing_ok=True)
+        self.lease_id = None
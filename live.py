@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+实时转写：使用流式 Paraformer 逐块识别仍在增长的音频，边听边输出字幕
+
+输入为 16kHz 单声道 16bit PCM（也可以是带 WAV 头的同格式文件），来源可以是：
+    python live.py -                   标准输入，例如 ffmpeg ... -f s16le - | python live.py -
+    python live.py /tmp/stream.fifo    命名管道
+    python live.py recording.wav       仍在写入的文件，长时间无新数据后结束
+
+延迟约为一个识别块加上模型前瞻的时长，可通过 --chunk-ms 调整。
+直播结束后可用 --reconcile 对录下的完整音频再做一次离线识别，覆盖实时结果。
+"""
+
+import argparse
+import os
+import shutil
+import stat
+import struct
+import sys
+import time
+import wave
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import eventlog
+import init
+import model
+from srt import SRTGenerator
+
+STREAMING_SPEECH_MODEL_ID = "paraformer-zh-streaming"
+# 流式 Paraformer 以 60ms 为一帧，识别块大小须为其整数倍
+STREAMING_FRAME_MS = 60
+DEFAULT_CHUNK_MS = 600
+ENCODER_CHUNK_LOOK_BACK = 4
+DECODER_CHUNK_LOOK_BACK = 1
+# 连续这么久没有识别出新文字时，结束当前字幕条
+ENDPOINT_SILENCE_MS = 800
+# 单条字幕的最长时长，超过后强制结束，保证最终结果的延迟有上限
+MAX_CUE_MS = 8000
+# 读取增长中的文件时的轮询间隔与无新数据的超时时间（秒）
+GROWING_FILE_POLL_SECONDS = 0.2
+GROWING_FILE_IDLE_TIMEOUT_SECONDS = 10.0
+
+PCM_SAMPLE_WIDTH = 2
+
+
+@dataclass
+class LiveCue:
+    index: int
+    text: str
+    start: int
+    finish: int
+    final: bool
+
+
+def get_streaming_model_spec() -> model.ModelSpec:
+    compute_device = init.get_compute_device()
+    return model.ModelSpec(
+        STREAMING_SPEECH_MODEL_ID,
+        lambda AutoModel: AutoModel(
+            model=STREAMING_SPEECH_MODEL_ID,
+            device=compute_device,
+        ),
+        device=compute_device,
+    )
+
+
+def build_streaming_chunk_size(chunk_ms: int) -> list[int]:
+    """将识别块时长换算为流式 Paraformer 的 [0, 块帧数, 前瞻帧数]"""
+    chunk_frames = max(1, round(chunk_ms / STREAMING_FRAME_MS))
+    return [0, chunk_frames, max(1, chunk_frames // 2)]
+
+
+def skip_wav_header(read_bytes: Callable[[int], bytes]) -> bytes:
+    """
+    若数据以 RIFF 头开始，跳过至 data 块并返回其后已读到的字节；
+    否则原样返回已读到的前几个字节（视为裸 PCM）
+    """
+    leading_bytes = read_bytes(12)
+    if not leading_bytes.startswith(b"RIFF"):
+        return leading_bytes
+    while True:
+        chunk_header = read_bytes(8)
+        if len(chunk_header) < 8:
+            return b""
+        chunk_id, chunk_length = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"data":
+            return b""
+        read_bytes(chunk_length + chunk_length % 2)
+
+
+def read_exactly(stream, byte_count: int, wait_for_growth: bool) -> bytes:
+    """
+    读取 byte_count 字节。管道在结束时返回不足的字节；
+    增长中的文件会等待新数据，超过空闲超时后才返回不足的字节
+    """
+    received = bytearray()
+    idle_since = time.time()
+    while len(received) < byte_count:
+        data = stream.read(byte_count - len(received))
+        if data:
+            received += data
+            idle_since = time.time()
+            continue
+        if not wait_for_growth:
+            break
+        if time.time() - idle_since >= GROWING_FILE_IDLE_TIMEOUT_SECONDS:
+            break
+        time.sleep(GROWING_FILE_POLL_SECONDS)
+    return bytes(received)
+
+
+def iter_pcm_chunks(source: str, chunk_bytes: int) -> Iterator[bytes]:
+    """从标准输入、命名管道或增长中的文件按块读取 PCM，最后一块可能不足"""
+    if source == "-":
+        stream = sys.stdin.buffer
+        wait_for_growth = False
+        owns_stream = False
+    else:
+        wait_for_growth = not stat.S_ISFIFO(os.stat(source).st_mode)
+        stream = open(source, "rb", buffering=0)
+        owns_stream = True
+
+    try:
+        pending = skip_wav_header(
+            lambda byte_count: read_exactly(stream, byte_count, wait_for_growth)
+        )
+        while True:
+            chunk = pending + read_exactly(
+                stream, chunk_bytes - len(pending), wait_for_growth
+            )
+            pending = b""
+            if len(chunk) < chunk_bytes:
+                if chunk:
+                    yield chunk
+                return
+            yield chunk
+    finally:
+        if owns_stream:
+            stream.close()
+
+
+class LiveCueSegmenter:
+    """把每块新增的文字累积成字幕条，按静音时长或最长时长结束一条字幕"""
+
+    def __init__(
+        self,
+        endpoint_silence_ms: Optional[int] = None,
+        max_cue_ms: Optional[int] = None,
+    ):
+        self.endpoint_silence_ms = endpoint_silence_ms or ENDPOINT_SILENCE_MS
+        self.max_cue_ms = max_cue_ms or MAX_CUE_MS
+        self.next_index = 1
+        self.text_pieces: list[str] = []
+        self.cue_start = 0
+        self.cue_finish = 0
+
+    def _current_cue(self, final: bool) -> LiveCue:
+        return LiveCue(
+            self.next_index,
+            " ".join(self.text_pieces),
+            self.cue_start,
+            self.cue_finish,
+            final,
+        )
+
+    def _finalize(self) -> LiveCue:
+        cue = self._current_cue(final=True)
+        self.next_index += 1
+        self.text_pieces = []
+        return cue
+
+    def feed(self, text: str, chunk_start: int, chunk_finish: int) -> list[LiveCue]:
+        """送入一个识别块的新增文字，返回需要更新的字幕条（部分或最终）"""
+        text = text.strip()
+        emitted_cues = []
+        if text:
+            if not self.text_pieces:
+                self.cue_start = chunk_start
+            self.text_pieces.append(text)
+            self.cue_finish = chunk_finish
+            if chunk_finish - self.cue_start >= self.max_cue_ms:
+                emitted_cues.append(self._finalize())
+            else:
+                emitted_cues.append(self._current_cue(final=False))
+        elif (
+            self.text_pieces
+            and chunk_finish - self.cue_finish >= self.endpoint_silence_ms
+        ):
+            emitted_cues.append(self._finalize())
+        return emitted_cues
+
+    def flush(self) -> Optional[LiveCue]:
+        if not self.text_pieces:
+            return None
+        return self._finalize()
+
+
+class LiveOutputWriter:
+    """
+    实时写入 txt/srt：已结束的字幕条只追加一次，
+    尚未结束的字幕条写在文件末尾，每次更新时覆盖
+    """
+
+    def __init__(self, txt_path: Optional[Path], srt_path: Optional[Path]):
+        self.srt_formatter = SRTGenerator(use_cpu=True)
+        self.output_files = {}
+        for output_kind, output_path in (("txt", txt_path), ("srt", srt_path)):
+            if output_path is not None:
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                self.output_files[output_kind] = open(
+                    output_path, "w+", encoding="utf-8"
+                )
+        self.finalized_offsets = dict.fromkeys(self.output_files, 0)
+
+    def _format_cue(self, output_kind: str, cue: LiveCue) -> str:
+        if output_kind == "txt":
+            return cue.text + "\n"
+        start = self.srt_formatter.convert_milliseconds_to_srt_time_format(cue.start)
+        finish = self.srt_formatter.convert_milliseconds_to_srt_time_format(
+            cue.finish
+        )
+        return f"{cue.index}\n{start} --> {finish}\n{cue.text}\n\n"
+
+    def write_cue(self, cue: LiveCue):
+        for output_kind, output_file in self.output_files.items():
+            output_file.seek(self.finalized_offsets[output_kind])
+            output_file.write(self._format_cue(output_kind, cue))
+            output_file.truncate()
+            output_file.flush()
+            if cue.final:
+                self.finalized_offsets[output_kind] = output_file.tell()
+
+    def close(self):
+        for output_file in self.output_files.values():
+            output_file.close()
+
+
+def create_live_task_directory() -> Path:
+    task_directory = (
+        init.TEMPORARY_JOBS_DIRECTORY / f"live-{datetime.now():%Y%m%d%H%M%S}"
+    )
+    (task_directory / "02_audio").mkdir(parents=True, exist_ok=True)
+    return task_directory
+
+
+def build_live_output_paths(
+    source: str, output_format_choice: str
+) -> tuple[Optional[Path], Optional[Path]]:
+    source_name = "stdin" if source == "-" else Path(source).stem
+    safe_filename = "".join(
+        c if c.isalnum() or c in " -_." else "_"
+        for c in f"{datetime.now():%y%m%d%H%M}-live-{source_name}"
+    )
+    txt_path = srt_path = None
+    if output_format_choice in ["text", "both"]:
+        txt_path = init.FINAL_OUTPUT_DIRECTORY / f"{safe_filename}.txt"
+    if output_format_choice in ["srt", "both"]:
+        srt_path = init.FINAL_OUTPUT_DIRECTORY / f"{safe_filename}.srt"
+    return txt_path, srt_path
+
+
+def punctuate_cue_text(text: str, logger_callback=print) -> str:
+    punc_model = model.request_model(*init.get_punc_model_spec())
+    try:
+        return punc_model.generate(input=text)[0]["text"]
+    except Exception as error:
+        eventlog.as_logger(logger_callback).warning("实时标点恢复失败: %s", error)
+        return text
+
+
+def reconcile_with_offline_pass(
+    task_directory: Path,
+    txt_path: Optional[Path],
+    srt_path: Optional[Path],
+    logger_callback=print,
+):
+    """对录下的完整音频做一次离线识别，用其结果覆盖实时输出"""
+    logger = eventlog.as_logger(logger_callback)
+    logger.info("[实时转写] 开始离线识别以校正实时结果...")
+    audio_path = task_directory / "02_audio" / "audio.wav"
+    segment_data = init.detect_speech_segments(
+        audio_path, task_directory, logger_callback=logger_callback
+    )
+    if not init.has_enough_speech(segment_data, logger_callback=logger_callback):
+        return
+    recognition_output = init.perform_speech_recognition(
+        audio_path,
+        task_directory / "03_result" / "result.json",
+        logger_callback=logger_callback,
+        speech_segments=segment_data["segments"],
+    )
+    if txt_path is not None:
+        shutil.copyfile(
+            init.generate_text_with_punctuation(
+                recognition_output, task_directory, logger_callback=logger_callback
+            ),
+            txt_path,
+        )
+    if srt_path is not None:
+        shutil.copyfile(
+            init.generate_srt_file(
+                recognition_output, task_directory, logger_callback=logger_callback
+            ),
+            srt_path,
+        )
+    logger.info("[实时转写] 已用离线识别结果覆盖实时输出")
+
+
+def run_live_transcription(
+    source: str,
+    output_format_choice: str = "both",
+    chunk_ms: int = DEFAULT_CHUNK_MS,
+    cue_callback: Optional[Callable[[LiveCue], None]] = None,
+    logger_callback=print,
+    enable_punctuation: bool = True,
+    reconcile: bool = False,
+) -> list[Path]:
+    """
+    实时转写 source（"-" 表示标准输入）。每个识别块结束后，
+    cue_callback 收到正在进行的字幕条 (final=False) 或已结束的字幕条 (final=True)。
+    实时结果的时间轴以识别块为粒度，--reconcile 时会被离线结果替换。
+    """
+    chunk_size = build_streaming_chunk_size(chunk_ms)
+    chunk_duration_ms = chunk_size[1] * STREAMING_FRAME_MS
+    chunk_samples = chunk_duration_ms * init.AUDIO_SAMPLING_RATE // 1000
+    logger = eventlog.as_logger(logger_callback)
+    logger.info(
+        "[实时转写] 识别块 %dms，预计延迟约 %dms",
+        chunk_duration_ms,
+        chunk_duration_ms + chunk_size[2] * STREAMING_FRAME_MS,
+    )
+
+    if enable_punctuation:
+        model.preload([init.get_punc_model_spec()])
+    streaming_model = model.request_model(*get_streaming_model_spec())
+
+    import numpy as np
+
+    task_directory = create_live_task_directory()
+    txt_path, srt_path = build_live_output_paths(source, output_format_choice)
+    output_writer = LiveOutputWriter(txt_path, srt_path)
+    cue_segmenter = LiveCueSegmenter()
+    model_cache = {}
+    received_ms = 0
+
+    def emit(cue: LiveCue):
+        if cue.final and enable_punctuation:
+            cue.text = punctuate_cue_text(cue.text, logger_callback=logger_callback)
+        output_writer.write_cue(cue)
+        if cue_callback is not None:
+            cue_callback(cue)
+
+    def recognize_chunk(speech_chunk, is_final: bool) -> str:
+        result = streaming_model.generate(
+            input=speech_chunk,
+            cache=model_cache,
+            is_final=is_final,
+            chunk_size=chunk_size,
+            encoder_chunk_look_back=ENCODER_CHUNK_LOOK_BACK,
+            decoder_chunk_look_back=DECODER_CHUNK_LOOK_BACK,
+        )
+        return result[0]["text"] if result else ""
+
+    # 录下完整音频，供结束后的离线校正使用；wave 每次写入都会更新文件头
+    with wave.open(str(task_directory / "02_audio" / "audio.wav"), "wb") as recording:
+        recording.setnchannels(1)
+        recording.setsampwidth(PCM_SAMPLE_WIDTH)
+        recording.setframerate(init.AUDIO_SAMPLING_RATE)
+        try:
+            for pcm_chunk in iter_pcm_chunks(source, chunk_samples * PCM_SAMPLE_WIDTH):
+                pcm_chunk = pcm_chunk[
+                    : len(pcm_chunk) - len(pcm_chunk) % PCM_SAMPLE_WIDTH
+                ]
+                recording.writeframes(pcm_chunk)
+                speech_chunk = np.frombuffer(pcm_chunk, dtype=np.int16).astype(
+                    np.float32
+                ) / 32768.0
+                chunk_start = received_ms
+                received_ms += len(speech_chunk) * 1000 // init.AUDIO_SAMPLING_RATE
+                for cue in cue_segmenter.feed(
+                    recognize_chunk(speech_chunk, is_final=False),
+                    chunk_start,
+                    received_ms,
+                ):
+                    emit(cue)
+
+            # 输入结束：送入一块静音并标记 is_final，取出模型中剩余的文字
+            for cue in cue_segmenter.feed(
+                recognize_chunk(np.zeros(chunk_samples, dtype=np.float32), True),
+                received_ms,
+                received_ms,
+            ):
+                emit(cue)
+            final_cue = cue_segmenter.flush()
+            if final_cue is not None:
+                emit(final_cue)
+        finally:
+            output_writer.close()
+
+    logger.info("[实时转写] 输入结束，共接收 %.1fs 音频", received_ms / 1000)
+    if reconcile and received_ms > 0:
+        # 离线识别需要另外三个模型，先释放流式模型占用的显存
+        streaming_model_spec = get_streaming_model_spec()
+        model.unload_model(streaming_model_spec.model_id, streaming_model_spec.device)
+        reconcile_with_offline_pass(
+            task_directory, txt_path, srt_path, logger_callback=logger_callback
+        )
+    return [path for path in (txt_path, srt_path) if path is not None]
+
+
+def print_live_cue(cue: LiveCue):
+    marker = "✔" if cue.final else "…"
+    print(f"{marker} [{cue.start / 1000:7.1f}s] {cue.text}")
+
+
+if __name__ == "__main__":
+    cli_parser = argparse.ArgumentParser(description="实时语音转文字")
+    cli_parser.add_argument(
+        "source", help="PCM 来源：- 表示标准输入，或命名管道、仍在写入的文件路径"
+    )
+    cli_parser.add_argument("--cpu", action="store_true", help="强制使用 CPU 进行推理")
+    cli_parser.add_argument(
+        "--format", choices=["text", "srt", "both"], default="both", help="设置输出格式"
+    )
+    cli_parser.add_argument(
+        "--chunk-ms",
+        type=int,
+        default=DEFAULT_CHUNK_MS,
+        help="识别块时长 (毫秒，60 的整数倍)，越小延迟越低",
+    )
+    cli_parser.add_argument(
+        "--endpoint-silence-ms",
+        type=int,
+        default=ENDPOINT_SILENCE_MS,
+        help="无新文字超过该时长时结束当前字幕条",
+    )
+    cli_parser.add_argument(
+        "--max-cue-ms", type=int, default=MAX_CUE_MS, help="单条字幕的最长时长"
+    )
+    cli_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=GROWING_FILE_IDLE_TIMEOUT_SECONDS,
+        help="读取增长中的文件时，无新数据超过该秒数即视为结束",
+    )
+    cli_parser.add_argument(
+        "--no-punc", action="store_true", help="不对实时字幕做标点恢复"
+    )
+    cli_parser.add_argument(
+        "--reconcile", action="store_true", help="结束后用离线识别结果覆盖实时输出"
+    )
+    cli_args = cli_parser.parse_args()
+    init.FORCE_CPU_INFERENCE = cli_args.cpu
+    ENDPOINT_SILENCE_MS = cli_args.endpoint_silence_ms
+    MAX_CUE_MS = cli_args.max_cue_ms
+    GROWING_FILE_IDLE_TIMEOUT_SECONDS = cli_args.idle_timeout
+    try:
+        results = run_live_transcription(
+            cli_args.source,
+            cli_args.format,
+            chunk_ms=cli_args.chunk_ms,
+            cue_callback=print_live_cue,
+            logger_callback=lambda msg: print(msg, file=sys.stderr),
+            enable_punctuation=not cli_args.no_punc,
+            reconcile=cli_args.reconcile,
+        )
+        for path in results:
+            print(f"生成文件: {path}", file=sys.stderr)
+    except Exception as error:
+        print(f"[致命错误] 实时转写被中断: {error}", file=sys.stderr)
+        sys.exit(1)
@@ -1,11 +1,224 @@
-_model_cache = {}
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional
+
+import snapshot
+
+# 模型缓存：键为 (model_id, device, options)，按最近使用顺序排列
+_model_cache = OrderedDict()
+_model_sizes = {}
+# 正在加载中的模型：同一键的并发请求共享同一个 Future
+_pending_loads = {}
+_cache_lock = threading.RLock()
+# 每个模型实例一把推理锁：并行的阶段可能共用同一实例，generate 不保证线程安全
+_inference_locks = weakref.WeakKeyDictionary()
+
+# 后台预加载使用的线程数
+PRELOAD_WORKERS = 2
+_preload_executor = None
+
+# 已加载模型的内存预算（字节），None 表示不限制
+MEMORY_BUDGET_BYTES = None
+
+# 为 True 时从 snapshot.py 的模型快照恢复模型，没有快照时在首次加载后于后台创建
+USE_MODEL_SNAPSHOTS = True
+_snapshot_executor = None
+
+# 模型加载过程中的提示（如快照失败）的输出位置，可设为 eventlog 的 Logger
+LOGGER_CALLBACK = print
+
+# 可能持有 torch 模块的 AutoModel 属性
+_SUBMODEL_ATTRIBUTES = ("model", "vad_model", "punc_model", "spk_model")
+
+
+class ModelSpec(NamedTuple):
+    """描述一次模型请求，供 preload 使用"""
+
+    model_id: str
+    init_func: Callable
+    device: Optional[str] = None
+    options: Optional[dict] = None
+
 
 def get_model():
     from funasr import AutoModel
     return AutoModel
 
-def request_model(model_id, init_func):
-    if model_id not in _model_cache:
+
+def make_model_key(model_id, device=None, options=None):
+    """生成缓存键，options 中的值需可哈希"""
+    frozen_options = tuple(sorted((options or {}).items()))
+    return (model_id, device, frozen_options)
+
+
+def estimate_model_bytes(instance) -> int:
+    """统计模型实例中所有参数与缓冲区占用的字节数"""
+    total_bytes = 0
+    seen_modules = set()
+    for attribute_name in _SUBMODEL_ATTRIBUTES:
+        module = getattr(instance, attribute_name, None)
+        if module is None or id(module) in seen_modules:
+            continue
+        if not (hasattr(module, "parameters") and hasattr(module, "buffers")):
+            continue
+        seen_modules.add(id(module))
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total_bytes += tensor.numel() * tensor.element_size()
+    return total_bytes
+
+
+def set_memory_budget(budget_bytes):
+    """设置内存预算并立即按需淘汰模型"""
+    global MEMORY_BUDGET_BYTES
+    with _cache_lock:
+        MEMORY_BUDGET_BYTES = budget_bytes
+        _evict_to_budget()
+
+
+def _release_device_memory():
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _evict_to_budget(keep_key=None):
+    if MEMORY_BUDGET_BYTES is None:
+        return
+    evicted = False
+    for cache_key in list(_model_cache):
+        if sum(_model_sizes.values()) <= MEMORY_BUDGET_BYTES:
+            break
+        if cache_key == keep_key:
+            continue
+        del _model_cache[cache_key]
+        del _model_sizes[cache_key]
+        evicted = True
+    if evicted:
+        _release_device_memory()
+
+
+def request_model(model_id, init_func, device=None, options=None):
+    """获取模型实例；同一键的并发请求只会触发一次加载"""
+    cache_key = make_model_key(model_id, device, options)
+    with _cache_lock:
+        if cache_key in _model_cache:
+            _model_cache.move_to_end(cache_key)
+            return _model_cache[cache_key]
+        pending_load = _pending_loads.get(cache_key)
+        is_loader = pending_load is None
+        if is_loader:
+            pending_load = Future()
+            _pending_loads[cache_key] = pending_load
+
+    if not is_loader:
+        return pending_load.result()
+
+    try:
         automodel_class = get_model()
-        _model_cache[model_id] = init_func(automodel_class)
-    return _model_cache[model_id]
+        instance = None
+        if USE_MODEL_SNAPSHOTS:
+            instance = snapshot.restore_snapshot(
+                cache_key, init_func, automodel_class, logger_callback=LOGGER_CALLBACK
+            )
+        if instance is None:
+            instance = init_func(automodel_class)
+            if USE_MODEL_SNAPSHOTS:
+                _schedule_snapshot(cache_key, instance)
+        instance_bytes = estimate_model_bytes(instance)
+    except BaseException as load_error:
+        with _cache_lock:
+            del _pending_loads[cache_key]
+        pending_load.set_exception(load_error)
+        raise
+
+    with _cache_lock:
+        _model_cache[cache_key] = instance
+        _model_sizes[cache_key] = instance_bytes
+        _evict_to_budget(keep_key=cache_key)
+        del _pending_loads[cache_key]
+    pending_load.set_result(instance)
+    return instance
+
+
+def _schedule_snapshot(cache_key, instance):
+    """快照需要复制模型目录并写出全部权重，放到后台单线程中，不阻塞首个任务"""
+    global _snapshot_executor
+    with _cache_lock:
+        if _snapshot_executor is None:
+            _snapshot_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="model-snapshot"
+            )
+    return _snapshot_executor.submit(
+        snapshot.save_snapshot,
+        cache_key,
+        instance,
+        logger_callback=LOGGER_CALLBACK,
+        inference_lock=get_inference_lock(instance),
+    )
+
+
+def get_inference_lock(instance) -> threading.Lock:
+    """取得模型实例的推理锁，调用 generate 时持有，避免并行阶段同时使用同一实例"""
+    with _cache_lock:
+        inference_lock = _inference_locks.get(instance)
+        if inference_lock is None:
+            inference_lock = threading.Lock()
+            _inference_locks[instance] = inference_lock
+        return inference_lock
+
+
+def preload(model_specs) -> list[Future]:
+    """在后台线程中加载模型，立即返回与 model_specs 一一对应的 Future"""
+    global _preload_executor
+    with _cache_lock:
+        if _preload_executor is None:
+            _preload_executor = ThreadPoolExecutor(
+                max_workers=PRELOAD_WORKERS, thread_name_prefix="model-preload"
+            )
+    return [
+        _preload_executor.submit(request_model, *ModelSpec(*spec))
+        for spec in model_specs
+    ]
+
+
+def unload_model(model_id, device=None, options=None) -> bool:
+    """显式卸载指定模型，返回是否确实卸载"""
+    cache_key = make_model_key(model_id, device, options)
+    with _cache_lock:
+        if cache_key not in _model_cache:
+            return False
+        del _model_cache[cache_key]
+        del _model_sizes[cache_key]
+    _release_device_memory()
+    return True
+
+
+def unload_all_models():
+    with _cache_lock:
+        _model_cache.clear()
+        _model_sizes.clear()
+    _release_device_memory()
+
+
+def get_memory_usage() -> dict:
+    """返回各已加载模型的内存占用，按最近最少使用顺序排列"""
+    with _cache_lock:
+        return {
+            "budget_bytes": MEMORY_BUDGET_BYTES,
+            "total_bytes": sum(_model_sizes.values()),
+            "loading": len(_pending_loads),
+            "models": [
+                {
+                    "model_id": model_id,
+                    "device": device,
+                    "options": dict(options),
+                    "bytes": _model_sizes[(model_id, device, options)],
+                }
+                for model_id, device, options in _model_cache
+            ],
+        }
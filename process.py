@@ -1,30 +1,113 @@
-from typing import List, TypedDict, Optional
+from typing import List, Optional, TypedDict
+
+import numpy as np
+
 import model
 
-class WordTimestamp(TypedDict):
-    text: str
-    start: int
-    end: int
 
-def align_text_timestamps(
-    text: str, timestamps: List[List[int]]
-) -> List[WordTimestamp]:
-    """将文本单词与时间戳对齐，返回单词级时间戳列表"""
-    words = text.split(" ")
-
-    # 处理长度不匹配的情况
-    if len(words) != len(timestamps):
-        if len(timestamps) == 1:
-            timestamps = [timestamps[0]] * len(words)
-        else:
-            min_length = min(len(words), len(timestamps))
-            words = words[:min_length]
-            timestamps = timestamps[:min_length]
-
-    result = []
-    for word, (start, end) in zip(words, timestamps):
-        result.append({"text": word, "start": start, "end": end})
-    return result
+def text_to_codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+class WordTimestamps:
+    """
+    单词级时间戳。所有单词以空格连接存放在同一个字符串中，第 i 个单词为
+    text_buffer[text_offsets[i]:text_offsets[i + 1] - 1]；起止时间（毫秒）为 int32 数组。
+    长音频的几十万个单词只占几个连续数组，不再为每个单词构建字典。
+    """
+
+    __slots__ = ("text_buffer", "text_offsets", "starts", "ends")
+
+    def __init__(self, text_buffer: str, text_offsets: np.ndarray, starts, ends):
+        self.text_buffer = text_buffer
+        self.text_offsets = np.asarray(text_offsets, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+
+    @classmethod
+    def from_text(cls, text: str, timestamps) -> "WordTimestamps":
+        """按空格拆分 text 并与时间戳一一对应，数量不一致时取较短者"""
+        space_positions = np.flatnonzero(text_to_codepoints(text) == ord(" "))
+        text_offsets = np.concatenate(([0], space_positions + 1, [len(text) + 1]))
+        timestamp_array = np.asarray(timestamps, dtype=np.int32).reshape(-1, 2)
+        word_count = min(len(text_offsets) - 1, len(timestamp_array))
+        text_offsets = text_offsets[: word_count + 1]
+        return cls(
+            text[: text_offsets[-1] - 1] if word_count else "",
+            text_offsets,
+            timestamp_array[:word_count, 0],
+            timestamp_array[:word_count, 1],
+        )
+
+    @classmethod
+    def from_words(cls, words: List[str], starts, ends) -> "WordTimestamps":
+        word_lengths = np.fromiter(
+            (len(word) + 1 for word in words), dtype=np.int64, count=len(words)
+        )
+        text_offsets = np.concatenate(([0], np.cumsum(word_lengths)))
+        return cls(" ".join(words), text_offsets, starts, ends)
+
+    @classmethod
+    def from_recognition_result(cls, recognition_result: dict) -> "WordTimestamps":
+        """从识别结果的 text / timestamp 构建，缺少时间戳时为空"""
+        return cls.from_text(
+            recognition_result.get("text", ""),
+            recognition_result.get("timestamp") or [],
+        )
+
+    @classmethod
+    def concatenate(cls, parts: List["WordTimestamps"]) -> "WordTimestamps":
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.from_words([], [], [])
+        offset_parts = [parts[0].text_offsets[:-1]]
+        buffer_length = len(parts[0].text_buffer) + 1
+        for part in parts[1:]:
+            offset_parts.append(part.text_offsets[:-1] + buffer_length)
+            buffer_length += len(part.text_buffer) + 1
+        offset_parts.append([buffer_length])
+        return cls(
+            " ".join(part.text_buffer for part in parts),
+            np.concatenate(offset_parts),
+            np.concatenate([part.starts for part in parts]),
+            np.concatenate([part.ends for part in parts]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def word_text(self, word_index: int) -> str:
+        return self.text_buffer[
+            self.text_offsets[word_index] : self.text_offsets[word_index + 1] - 1
+        ]
+
+    def join_text(self, first_word: int, end_word: int) -> str:
+        """以空格连接 [first_word, end_word) 范围内的单词，直接截取缓冲区"""
+        if first_word >= end_word:
+            return ""
+        return self.text_buffer[
+            self.text_offsets[first_word] : self.text_offsets[end_word] - 1
+        ]
+
+    def texts(self) -> List[str]:
+        return self.text_buffer.split(" ") if len(self) else []
+
+    def weighted_lengths(self) -> np.ndarray:
+        """每个单词的加权长度：ASCII 字符计 1，其余字符计 2"""
+        character_weights = 1 + (text_to_codepoints(self.text_buffer) >= 128)
+        weight_prefix = np.concatenate(([0], np.cumsum(character_weights)))
+        return (
+            weight_prefix[self.text_offsets[1:] - 1]
+            - weight_prefix[self.text_offsets[:-1]]
+        )
+
+
+def align_text_timestamps(text: str, timestamps: List[List[int]]) -> WordTimestamps:
+    """将文本单词与时间戳对齐，返回单词级时间戳"""
+    # 只有一个时间戳时所有单词共用它，否则数量不一致时取较短者
+    if len(timestamps) == 1:
+        timestamps = [timestamps[0]] * (text.count(" ") + 1)
+    return WordTimestamps.from_text(text, timestamps)
 
 def timestamp_prediction(audio_path: str, text: str, device: Optional[str] = None):
     """使用强制对齐模型预测单词时间戳"""
@@ -34,15 +117,17 @@ def timestamp_prediction(audio_path: str, text: str, device: Optional[str] = Non
             model="fa-zh",
             device=device
         ),
+        device=device,
     )
-    res = model_.generate(input=(audio_path, text), data_type=("sound", "text"))
+    with model.get_inference_lock(model_):
+        res = model_.generate(input=(audio_path, text), data_type=("sound", "text"))
     return res[0]["text"], res[0]["timestamp"]
 
-def to_word_timestamp_list(
+def to_word_timestamps(
     audio_path: str, result: Optional[dict], device: Optional[str] = None
-) -> Optional[List[WordTimestamp]]:
+) -> Optional[WordTimestamps]:
     """
-    从识别结果中提取或生成单词级时间戳列表。
+    从识别结果中提取或生成单词级时间戳。
     如果 result 中已有 timestamp，则直接对齐；否则调用强制对齐模型补全。
     """
     if not result:
@@ -57,3 +142,25 @@ def to_word_timestamp_list(
         if text and timestamp:
             return align_text_timestamps(text, timestamp)
     return None
+
+
+class WordTimestamp(TypedDict):
+    """旧接口 to_word_timestamp_list 返回的单词结构"""
+    text: str
+    start: int
+    end: int
+
+
+def to_word_timestamp_list(
+    audio_path: str, result: Optional[dict], device: Optional[str] = None
+) -> Optional[List[WordTimestamp]]:
+    """兼容旧接口：每个单词一个字典，新代码应使用 to_word_timestamps"""
+    word_timestamps = to_word_timestamps(audio_path, result, device=device)
+    if word_timestamps is None:
+        return None
+    return [
+        {"text": word_text, "start": int(start), "end": int(end)}
+        for word_text, start, end in zip(
+            word_timestamps.texts(), word_timestamps.starts, word_timestamps.ends
+        )
+    ]
@@ -0,0 +1,211 @@
+"""
+性能分析：逐阶段记录 cProfile 统计、Python 内存峰值 (tracemalloc)、
+进程 RSS 峰值、子进程 (ffmpeg / yt-dlp) CPU 时间与 torch 显存峰值。
+
+每个阶段的 .prof 文件可直接用 snakeviz、flameprof、gprof2dot 等工具查看。
+"""
+
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import eventlog
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SUMMARY_COLUMNS = (
+    ("stage", "阶段", "{}"),
+    ("wall_seconds", "耗时s", "{:.2f}"),
+    ("cpu_seconds", "CPU s", "{:.2f}"),
+    ("child_cpu_seconds", "子进程CPU s", "{:.2f}"),
+    ("python_peak_mb", "Py峰值MB", "{:.1f}"),
+    ("rss_peak_mb", "RSS峰值MB", "{:.1f}"),
+    ("cuda_peak_mb", "显存峰值MB", "{:.1f}"),
+)
+
+
+def get_rss_peak_mb() -> Optional[float]:
+    """进程启动以来的 RSS 峰值，无法获取时返回 None"""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    if sys.platform == "darwin":
+        return peak_rss / 1024 / 1024
+    return peak_rss / 1024
+
+
+def get_child_cpu_seconds() -> Optional[float]:
+    """已结束的子进程累计 CPU 时间"""
+    if resource is None:
+        return None
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return child_usage.ru_utime + child_usage.ru_stime
+
+
+def get_loaded_cuda_module():
+    """仅在 torch 已被导入且 CUDA 可用时返回 torch.cuda，避免为分析而导入 torch"""
+    torch_module = sys.modules.get("torch")
+    if torch_module is None:
+        return None
+    try:
+        if torch_module.cuda.is_available():
+            return torch_module.cuda
+    except Exception:
+        pass
+    return None
+
+
+class PipelineProfiler:
+    """
+    与 ProgressTracker 相同，在每次进入阶段时调用 enter_stage，结束时调用 finish；
+    任务失败时也必须调用 finish(failed=True)，否则 cProfile 与 tracemalloc 会一直开着。
+    cProfile 只统计调用 enter_stage 的线程，阶段在其他线程中执行时，
+    需在同一线程内调用 enter_stage 与 close_stage；若已有其他分析器在运行
+    （例如外层用 cProfile 启动了整个程序），跳过 cProfile，其余指标照常记录。
+    """
+
+    def __init__(self, output_directory: Path):
+        self.output_directory = (
+            Path(output_directory) / f"{datetime.now():%Y%m%d-%H%M%S}"
+        )
+        self.current_stage: Optional[str] = None
+        self.stage_results: list[dict] = []
+        self._stage_profile: Optional[cProfile.Profile] = None
+        self._stage_started_at = 0.0
+        self._stage_cpu_started_at = 0.0
+        self._stage_child_cpu_started_at: Optional[float] = None
+        # 外部已经在追踪内存时不主动停止，避免影响调用者
+        self._owns_tracemalloc = False
+
+    def enter_stage(self, stage: str):
+        self.close_stage()
+        self.current_stage = stage
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        tracemalloc.reset_peak()
+        cuda_module = get_loaded_cuda_module()
+        if cuda_module is not None:
+            cuda_module.reset_peak_memory_stats()
+        self._stage_child_cpu_started_at = get_child_cpu_seconds()
+        self._stage_cpu_started_at = time.process_time()
+        self._stage_started_at = time.perf_counter()
+        self._stage_profile = None
+        # 其他分析器已占用分析钩子时不抢占：3.11 会静默替换，3.12 起会抛出 ValueError
+        if sys.getprofile() is None:
+            self._stage_profile = cProfile.Profile()
+            try:
+                self._stage_profile.enable()
+            except ValueError:
+                self._stage_profile = None
+
+    def close_stage(self):
+        """结束当前阶段的采样；也可以不调用，进入下一阶段或 finish 时会自动结束"""
+        stage = self.current_stage
+        if stage is None:
+            return
+        profile_path = None
+        if self._stage_profile is not None:
+            self._stage_profile.disable()
+            self.output_directory.mkdir(parents=True, exist_ok=True)
+            profile_path = self.output_directory / f"{stage}.prof"
+            self._stage_profile.dump_stats(profile_path)
+            self._stage_profile = None
+
+        stage_result = {
+            "stage": stage,
+            "wall_seconds": time.perf_counter() - self._stage_started_at,
+            "cpu_seconds": time.process_time() - self._stage_cpu_started_at,
+            "child_cpu_seconds": None,
+            "python_peak_mb": tracemalloc.get_traced_memory()[1] / 1024 / 1024,
+            "rss_peak_mb": get_rss_peak_mb(),
+            "cuda_peak_mb": None,
+            "cuda_reserved_peak_mb": None,
+            "profile_file": profile_path.name if profile_path else None,
+        }
+        child_cpu_seconds = get_child_cpu_seconds()
+        if child_cpu_seconds is not None:
+            stage_result["child_cpu_seconds"] = (
+                child_cpu_seconds - self._stage_child_cpu_started_at
+            )
+        cuda_module = get_loaded_cuda_module()
+        if cuda_module is not None:
+            stage_result["cuda_peak_mb"] = (
+                cuda_module.max_memory_allocated() / 1024 / 1024
+            )
+            stage_result["cuda_reserved_peak_mb"] = (
+                cuda_module.max_memory_reserved() / 1024 / 1024
+            )
+        self.stage_results.append(stage_result)
+        self.current_stage = None
+
+    def finish(self, logger_callback=print, failed: bool = False) -> Path:
+        """
+        结束最后一个阶段，写出 summary.json 与 summary.txt，返回输出目录。
+        failed 为 True 时最后一个阶段标记为失败，已完成阶段的结果照常写出。
+        """
+        try:
+            self.close_stage()
+        finally:
+            # 即使写出 .prof 失败也要停止追踪，不能影响之后的任务
+            if self._stage_profile is not None:
+                self._stage_profile.disable()
+                self._stage_profile = None
+            self.current_stage = None
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+        if failed and self.stage_results:
+            self.stage_results[-1]["failed"] = True
+        self.output_directory.mkdir(parents=True, exist_ok=True)
+        with open(
+            self.output_directory / "summary.json", "w", encoding="utf-8"
+        ) as f:
+            json.dump(self.stage_results, f, ensure_ascii=False, indent=2)
+        summary_table = format_summary_table(self.stage_results)
+        (self.output_directory / "summary.txt").write_text(
+            summary_table + "\n", encoding="utf-8"
+        )
+        logger = eventlog.as_logger(logger_callback)
+        if failed:
+            logger.info(
+                "[性能分析] 任务失败，已完成部分的结果已保存到 %s", self.output_directory
+            )
+        else:
+            logger.info("[性能分析] 结果已保存到 %s", self.output_directory)
+        for table_line in summary_table.splitlines():
+            logger.info("%s", table_line)
+        return self.output_directory
+
+
+def format_summary_table(stage_results: list[dict]) -> str:
+    table_rows = [[title for _, title, _ in SUMMARY_COLUMNS]]
+    for stage_result in stage_results:
+        table_rows.append(
+            [
+                "-"
+                if stage_result[key] is None
+                else template.format(stage_result[key])
+                for key, _, template in SUMMARY_COLUMNS
+            ]
+        )
+    column_widths = [
+        max(len(table_row[column]) for table_row in table_rows)
+        for column in range(len(SUMMARY_COLUMNS))
+    ]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if column == 0 else cell.rjust(width)
+            for column, (cell, width) in enumerate(zip(table_row, column_widths))
+        )
+        for table_row in table_rows
+    )
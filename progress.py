@@ -0,0 +1,304 @@
+"""
+进度与剩余时间估计：各阶段上报 0~1 的进度，结合音频时长与本机历史
+实时率 (RTF，阶段耗时 / 音频时长) 估算整体进度与预计剩余时间
+"""
+
+import contextlib
+import json
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 每个阶段保留的历史 RTF 数量
+RTF_HISTORY_SIZE = 20
+# 两次进度回调之间的最小间隔（秒），阶段切换不受限制
+PROGRESS_REPORT_INTERVAL_SECONDS = 0.5
+
+STAGE_DISPLAY_NAMES = {
+    "download": "下载",
+    "transcode": "转码",
+    "vad": "语音检测",
+    "recognize": "识别",
+    "text": "标点",
+    "srt": "字幕",
+    "copy": "输出",
+}
+
+
+class ProgressUpdate(NamedTuple):
+    stage: str
+    stage_fraction: float
+    overall_fraction: float
+    eta_seconds: Optional[float]
+
+
+def default_history_path(jobs_directory: Path) -> Path:
+    return jobs_directory / f"rtf_history_{platform.node() or 'local'}.json"
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "未知"
+    seconds = int(round(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}时{minutes:02d}分"
+    if minutes:
+        return f"{minutes}分{seconds:02d}秒"
+    return f"{seconds}秒"
+
+
+def format_progress_update(update: ProgressUpdate) -> str:
+    stage_name = STAGE_DISPLAY_NAMES.get(update.stage, update.stage)
+    return (
+        f"[进度] {stage_name} {update.stage_fraction:.0%} | "
+        f"总体 {update.overall_fraction:.0%} | "
+        f"预计剩余 {format_duration(update.eta_seconds)}"
+    )
+
+
+class RTFHistory:
+    """
+    本机各阶段的历史实时率，按 "阶段:设备" 分别保存。
+    同一台机器上的多个进程共用历史文件，记录时加文件锁并合并其他进程写入的样本
+    """
+
+    def __init__(self, history_path: Path):
+        self.history_path = Path(history_path)
+        self._lock = threading.Lock()
+        self.samples = self.read_samples()
+
+    def read_samples(self) -> dict:
+        try:
+            with open(self.history_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    @contextlib.contextmanager
+    def _lock_history_file(self):
+        """跨进程互斥；没有 fcntl 的平台上不加锁，最多丢失并发写入的样本"""
+        if fcntl is None:
+            yield
+            return
+        lock_path = self.history_path.with_name(self.history_path.name + ".lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def median_rtf(self, history_key: str) -> Optional[float]:
+        stage_samples = self.samples.get(history_key)
+        if not stage_samples:
+            return None
+        return statistics.median(stage_samples)
+
+    def record(self, measured_rtf: dict[str, float]):
+        if not measured_rtf:
+            return
+        self.history_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._lock_history_file():
+            # 其他进程可能在本进程读取之后写入了新样本，在文件的最新内容上追加
+            samples = self.read_samples()
+            for history_key, rtf_value in measured_rtf.items():
+                stage_samples = samples.setdefault(history_key, [])
+                stage_samples.append(round(rtf_value, 5))
+                del stage_samples[:-RTF_HISTORY_SIZE]
+            temporary_fd, temporary_name = tempfile.mkstemp(
+                prefix=self.history_path.name + ".",
+                suffix=".tmp",
+                dir=self.history_path.parent,
+            )
+            try:
+                with os.fdopen(temporary_fd, "w", encoding="utf-8") as f:
+                    json.dump(samples, f, indent=2)
+                os.replace(temporary_name, self.history_path)
+            except BaseException:
+                Path(temporary_name).unlink(missing_ok=True)
+                raise
+            self.samples = samples
+
+
+class ProgressTracker:
+    """
+    汇总一个任务各阶段的进度。stages 为本任务将经过的阶段，
+    progress_callback 接收 ProgressUpdate。
+    通常依次 enter_stage；互不依赖的阶段可用 enter_parallel_stages 同时进入，
+    各自通过 stage_updater 上报进度、complete_stage 结束。
+    """
+
+    def __init__(
+        self,
+        stages: list[str],
+        history: RTFHistory,
+        device: str,
+        progress_callback: Optional[Callable[[ProgressUpdate], None]] = None,
+    ):
+        self.stages = list(stages)
+        self.history = history
+        self.device = device
+        self.progress_callback = progress_callback
+        self.audio_duration_seconds: Optional[float] = None
+        # 正在进行的阶段，顺序执行时只有一个
+        self.active_stages: list[str] = []
+        self.stage_fractions = dict.fromkeys(self.stages, 0.0)
+        self.stage_started_at: dict[str, float] = {}
+        self.stage_elapsed: dict[str, float] = {}
+        # 只有真正执行（而非读取缓存）的阶段才计入历史 RTF
+        self.stages_with_work: set[str] = set()
+        self._last_report_time = 0.0
+        self._lock = threading.Lock()
+
+    def _history_key(self, stage: str) -> str:
+        return f"{stage}:{self.device}"
+
+    @property
+    def current_stage(self) -> Optional[str]:
+        return self.active_stages[0] if self.active_stages else None
+
+    def set_audio_duration(self, duration_seconds: float):
+        self.audio_duration_seconds = duration_seconds
+
+    def enter_stage(self, stage: str):
+        self.enter_parallel_stages([stage])
+
+    def enter_parallel_stages(self, stages: list[str]):
+        """结束正在进行的阶段，同时进入 stages 中的所有阶段"""
+        with self._lock:
+            self._close_active_stages()
+            self.active_stages = list(stages)
+            for stage in stages:
+                self.stage_started_at[stage] = time.time()
+        self._report(force=True)
+
+    def update(self, fraction: float):
+        """当前阶段的进度回调，fraction 取值 0~1"""
+        stage = self.current_stage
+        if stage is None:
+            return
+        self.update_stage(stage, fraction)
+
+    def update_stage(self, stage: str, fraction: float):
+        with self._lock:
+            if fraction < 1.0:
+                self.stages_with_work.add(stage)
+            self.stage_fractions[stage] = min(max(fraction, 0.0), 1.0)
+        self._report(force=fraction >= 1.0)
+
+    def stage_updater(self, stage: str) -> Callable[[float], None]:
+        """并行阶段各自的进度回调"""
+        return lambda fraction: self.update_stage(stage, fraction)
+
+    def complete_stage(self, stage: str):
+        """并行阶段之一完成，其余阶段继续进行"""
+        with self._lock:
+            if stage in self.active_stages:
+                self._close_stage(stage)
+                self.active_stages.remove(stage)
+        self._report(force=True)
+
+    def finish(self):
+        """任务成功结束：关闭最后一个阶段并把本次的 RTF 写入历史"""
+        with self._lock:
+            self._close_active_stages()
+        if self.audio_duration_seconds:
+            self.history.record(
+                {
+                    self._history_key(stage): self.stage_elapsed[stage]
+                    / self.audio_duration_seconds
+                    for stage in self.stages_with_work
+                    if stage in self.stage_elapsed
+                }
+            )
+
+    def _close_stage(self, stage: str):
+        self.stage_fractions[stage] = 1.0
+        self.stage_elapsed[stage] = time.time() - self.stage_started_at[stage]
+
+    def _close_active_stages(self):
+        for stage in self.active_stages:
+            self._close_stage(stage)
+        self.active_stages = []
+
+    def _expected_stage_seconds(self, stage: str) -> Optional[float]:
+        if stage in self.stage_elapsed:
+            return self.stage_elapsed[stage]
+        if self.audio_duration_seconds:
+            median_rtf = self.history.median_rtf(self._history_key(stage))
+            if median_rtf is not None:
+                return median_rtf * self.audio_duration_seconds
+        if stage in self.active_stages:
+            # 没有历史数据时，按当前阶段已用时间与进度外推
+            fraction = self.stage_fractions[stage]
+            if fraction >= 0.05:
+                return (time.time() - self.stage_started_at[stage]) / fraction
+        return None
+
+    def snapshot(self) -> ProgressUpdate:
+        with self._lock:
+            overall_fraction = sum(self.stage_fractions.values()) / len(self.stages)
+            eta_seconds = None
+            if self.audio_duration_seconds:
+                # 缺少历史数据的阶段（通常是耗时很短的阶段）按 0 计
+                expected_seconds = {
+                    stage: self._expected_stage_seconds(stage) or 0.0
+                    for stage in self.stages
+                }
+                expected_total = sum(expected_seconds.values())
+                if expected_total > 0:
+                    completed = sum(
+                        expected_seconds[stage] * self.stage_fractions[stage]
+                        for stage in self.stages
+                    )
+                    overall_fraction = completed / expected_total
+                    eta_seconds = expected_total - completed
+            stage = self.current_stage or self.stages[-1]
+            return ProgressUpdate(
+                stage,
+                self.stage_fractions.get(stage, 1.0),
+                min(overall_fraction, 1.0),
+                eta_seconds,
+            )
+
+    def _report(self, force: bool = False):
+        if self.progress_callback is None:
+            return
+        now = time.time()
+        if (
+            not force
+            and now - self._last_report_time < PROGRESS_REPORT_INTERVAL_SECONDS
+        ):
+            return
+        self._last_report_time = now
+        self.progress_callback(self.snapshot())
+
+
+class ConsoleProgressPrinter:
+    """命令行下的进度输出，限制输出频率避免刷屏"""
+
+    def __init__(self, print_interval_seconds: float = 10.0, printer=print):
+        self.print_interval_seconds = print_interval_seconds
+        self.printer = printer
+        self._last_stage = None
+        self._last_print_time = 0.0
+
+    def __call__(self, update: ProgressUpdate):
+        now = time.time()
+        if (
+            update.stage == self._last_stage
+            and now - self._last_print_time < self.print_interval_seconds
+        ):
+            return
+        self._last_stage = update.stage
+        self._last_print_time = now
+        self.printer(format_progress_update(update))
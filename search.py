@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+全文检索：将各任务 03_result 中带时间戳的识别结果按字幕条写入 SQLite FTS5 索引，
+检索结果精确到命中词在音频中的毫秒位置。
+
+    python search.py search "关键词" [--limit 20]
+    python search.py index               重新扫描 jobs/ 下的所有任务
+
+索引保存在本机的 index/search.sqlite3，不放进可能位于 NFS 上的共享 jobs/：
+WAL 模式依赖共享内存，网络文件系统上会损坏数据库。SQLite 同一时刻只允许一个写入者，
+本机的多个进程通过忙等待超时依次写入；多台机器各自维护自己的索引，
+需要完整索引时在该机器上运行 index 命令重新扫描共享的 jobs/。
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import eventlog
+import segment
+from process import WordTimestamps
+from stages import FINGERPRINT_FILENAME
+
+DEFAULT_JOBS_DIRECTORY = Path("jobs")
+SEARCH_INDEX_PATH = Path("index") / "search.sqlite3"
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+# 识别结果中的中文逐字以空格分隔，英文按单词分隔，unicode61 分词器按空格与标点切分即可
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    job_id TEXT PRIMARY KEY,
+    input_source TEXT,
+    title TEXT,
+    uploader TEXT,
+    upload_timestamp REAL,
+    result_digest TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    start_ms REAL NOT NULL,
+    end_ms REAL NOT NULL,
+    word_timestamps TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cues_job ON cues (job_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS cue_text USING fts5(text, tokenize = 'unicode61');
+"""
+
+# 查询拆分：连续的字母数字为一个词，其余非空白、非标点字符逐字成词
+_QUERY_TOKEN_PATTERN = re.compile(r"[0-9A-Za-z']+|[^\s\W]", re.UNICODE)
+
+
+class SearchHit(NamedTuple):
+    job_id: str
+    title: str
+    uploader: str
+    input_source: str
+    cue_start_ms: float
+    cue_end_ms: float
+    text: str
+    # 每个命中短语的 (开始毫秒, 结束毫秒)
+    match_spans: list[tuple[float, float]]
+
+
+def open_search_index(index_path: Optional[Path] = None) -> sqlite3.Connection:
+    """index_path 须位于本地磁盘，同一索引只能由一台机器写入，见模块说明"""
+    index_path = Path(index_path or SEARCH_INDEX_PATH)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(index_path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def tokenize_query_phrase(phrase: str) -> list[str]:
+    return [token.lower() for token in _QUERY_TOKEN_PATTERN.findall(phrase)]
+
+
+def build_match_expression(query: str) -> tuple[str, list[list[str]]]:
+    """空格分隔的多个短语之间为 AND 关系，每个短语内的字词需连续出现"""
+    phrases = [
+        phrase_tokens
+        for phrase_tokens in map(tokenize_query_phrase, query.split())
+        if phrase_tokens
+    ]
+    match_expression = " AND ".join(
+        '"' + " ".join(phrase_tokens).replace('"', '""') + '"'
+        for phrase_tokens in phrases
+    )
+    return match_expression, phrases
+
+
+def read_result_digest(task_directory: Path) -> Optional[str]:
+    """识别结果的摘要：优先使用阶段指纹中的输出摘要，否则用文件大小与修改时间"""
+    result_directory = task_directory / "03_result"
+    if not (result_directory / "donefile").exists():
+        return None
+    try:
+        with open(result_directory / FINGERPRINT_FILENAME, encoding="utf-8") as f:
+            return json.load(f)["output_digest"]
+    except (OSError, json.JSONDecodeError, KeyError):
+        result_stat = (result_directory / "result.json").stat()
+        return f"{result_stat.st_size}-{result_stat.st_mtime_ns}"
+
+
+def read_resource_info(task_directory: Path) -> dict:
+    try:
+        with open(
+            task_directory / "01_download" / "raw.info.json", encoding="utf-8"
+        ) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def index_job(
+    task_directory: Path,
+    resource_info: Optional[dict] = None,
+    base_silence_threshold_ms: float = 1000,
+    length_penalty_factor: float = 0.05,
+    connection: Optional[sqlite3.Connection] = None,
+    logger_callback=print,
+) -> bool:
+    """
+    将一个任务的识别结果按与 SRT 相同的参数切分为字幕条并写入索引，
+    识别结果未变化时跳过。返回是否写入了索引。
+    """
+    task_directory = Path(task_directory)
+    result_digest = read_result_digest(task_directory)
+    if result_digest is None:
+        return False
+    owns_connection = connection is None
+    if owns_connection:
+        connection = open_search_index()
+    try:
+        job_id = task_directory.name
+        indexed_row = connection.execute(
+            "SELECT result_digest FROM documents WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if indexed_row is not None and indexed_row[0] == result_digest:
+            return False
+
+        result_path = task_directory / "03_result" / "result.json"
+        with open(result_path, encoding="utf-8") as f:
+            words = WordTimestamps.from_recognition_result(json.load(f))
+        if not len(words):
+            eventlog.as_logger(logger_callback).info(
+                "[搜索索引] 识别结果缺少时间戳，跳过索引"
+            )
+            return False
+        cue_starts = segment.find_cue_boundaries(
+            words, base_silence_threshold_ms, length_penalty_factor
+        ).tolist()
+        cue_ends = cue_starts[1:] + [len(words)]
+        word_starts = words.starts.tolist()
+        word_finishes = words.ends.tolist()
+        resource_info = resource_info or read_resource_info(task_directory)
+
+        with connection:
+            remove_job(connection, job_id)
+            for cue_start, cue_end in zip(cue_starts, cue_ends):
+                cue_id = connection.execute(
+                    "INSERT INTO cues (job_id, start_ms, end_ms, word_timestamps) "
+                    "VALUES (?, ?, ?, ?)",
+                    (
+                        job_id,
+                        word_starts[cue_start],
+                        word_finishes[cue_end - 1],
+                        json.dumps(
+                            list(
+                                zip(
+                                    word_starts[cue_start:cue_end],
+                                    word_finishes[cue_start:cue_end],
+                                )
+                            )
+                        ),
+                    ),
+                ).lastrowid
+                connection.execute(
+                    "INSERT INTO cue_text (rowid, text) VALUES (?, ?)",
+                    (cue_id, words.join_text(cue_start, cue_end)),
+                )
+            connection.execute(
+                "INSERT INTO documents (job_id, input_source, title, uploader, "
+                "upload_timestamp, result_digest, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    resource_info.get("original_url"),
+                    resource_info.get("title"),
+                    resource_info.get("uploader"),
+                    resource_info.get("timestamp"),
+                    result_digest,
+                    time.time(),
+                ),
+            )
+        eventlog.as_logger(logger_callback).info(
+            "[搜索索引] 已索引 %d 条字幕", len(cue_starts)
+        )
+        return True
+    finally:
+        if owns_connection:
+            connection.close()
+
+
+def remove_job(connection: sqlite3.Connection, job_id: str):
+    connection.execute(
+        "DELETE FROM cue_text "
+        "WHERE rowid IN (SELECT id FROM cues WHERE job_id = ?)",
+        (job_id,),
+    )
+    connection.execute("DELETE FROM cues WHERE job_id = ?", (job_id,))
+    connection.execute("DELETE FROM documents WHERE job_id = ?", (job_id,))
+
+
+def rebuild_index(jobs_directory: Path) -> tuple[int, int]:
+    """扫描所有任务：更新有变化的任务，删除已不存在的任务。返回 (更新数, 删除数)"""
+    connection = open_search_index()
+    try:
+        updated_count = 0
+        existing_job_ids = set()
+        for result_path in segment.find_cached_recognition_results(jobs_directory):
+            task_directory = result_path.parent.parent
+            existing_job_ids.add(task_directory.name)
+            if index_job(
+                task_directory,
+                connection=connection,
+                logger_callback=lambda msg: None,
+            ):
+                updated_count += 1
+        removed_job_ids = [
+            row[0]
+            for row in connection.execute("SELECT job_id FROM documents")
+            if row[0] not in existing_job_ids
+        ]
+        with connection:
+            for job_id in removed_job_ids:
+                remove_job(connection, job_id)
+        return updated_count, len(removed_job_ids)
+    finally:
+        connection.close()
+
+
+def locate_phrases(
+    cue_text: str, word_timestamps: list, phrases: list[list[str]]
+) -> list[tuple[float, float]]:
+    """在字幕条的词序列中找出每个短语出现的位置，换算为毫秒区间"""
+    cue_tokens = [token.lower() for token in cue_text.split(" ")]
+    match_spans = []
+    for phrase_tokens in phrases:
+        phrase_length = len(phrase_tokens)
+        for token_index in range(len(cue_tokens) - phrase_length + 1):
+            if cue_tokens[token_index : token_index + phrase_length] == phrase_tokens:
+                match_spans.append(
+                    (
+                        word_timestamps[token_index][0],
+                        word_timestamps[token_index + phrase_length - 1][1],
+                    )
+                )
+    return sorted(match_spans)
+
+
+def search(query: str, limit: int = 20) -> list[SearchHit]:
+    match_expression, phrases = build_match_expression(query)
+    if not phrases:
+        return []
+    connection = open_search_index()
+    try:
+        rows = connection.execute(
+            "SELECT cues.job_id, documents.title, documents.uploader, "
+            "documents.input_source, cues.start_ms, cues.end_ms, cue_text.text, "
+            "cues.word_timestamps "
+            "FROM cue_text "
+            "JOIN cues ON cues.id = cue_text.rowid "
+            "JOIN documents ON documents.job_id = cues.job_id "
+            "WHERE cue_text MATCH ? ORDER BY bm25(cue_text) LIMIT ?",
+            (match_expression, limit),
+        ).fetchall()
+    finally:
+        connection.close()
+    return [
+        SearchHit(
+            job_id,
+            title or "",
+            uploader or "",
+            input_source or "",
+            start_ms,
+            end_ms,
+            cue_text,
+            locate_phrases(cue_text, json.loads(word_timestamps), phrases),
+        )
+        for (
+            job_id,
+            title,
+            uploader,
+            input_source,
+            start_ms,
+            end_ms,
+            cue_text,
+            word_timestamps,
+        ) in rows
+    ]
+
+
+def format_offset(milliseconds: float) -> str:
+    total_seconds = int(milliseconds // 1000)
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{int(milliseconds % 1000):03d}"
+
+
+def search_command(cli_args):
+    hits = search(" ".join(cli_args.query), limit=cli_args.limit)
+    if cli_args.json:
+        print(
+            json.dumps(
+                [hit._asdict() for hit in hits], ensure_ascii=False, indent=2
+            )
+        )
+        return
+    if not hits:
+        print("没有找到匹配的内容")
+        return
+    for hit in hits:
+        print(f"{hit.uploader} - {hit.title} [{hit.job_id}]")
+        print(f"  {hit.input_source}")
+        match_spans = hit.match_spans or [(hit.cue_start_ms, hit.cue_end_ms)]
+        for span_start, span_end in match_spans:
+            print(
+                f"  {format_offset(span_start)} "
+                f"({span_start:.0f}ms - {span_end:.0f}ms)"
+            )
+        print(f"  {hit.text}")
+
+
+def index_command(cli_args):
+    updated_count, removed_count = rebuild_index(cli_args.jobs_dir)
+    print(f"索引已更新: {updated_count} 个任务，移除 {removed_count} 个已删除的任务")
+
+
+def main():
+    cli_parser = argparse.ArgumentParser(description="在所有转写结果中检索")
+    subparsers = cli_parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="检索关键词")
+    search_parser.add_argument(
+        "query", nargs="+", help="关键词，多个关键词之间为 AND 关系"
+    )
+    search_parser.add_argument("--limit", type=int, default=20, help="最多返回条数")
+    search_parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    search_parser.set_defaults(handler=search_command)
+
+    index_parser = subparsers.add_parser("index", help="扫描任务目录并更新索引")
+    index_parser.add_argument(
+        "--jobs-dir",
+        type=Path,
+        default=DEFAULT_JOBS_DIRECTORY,
+        help="任务目录",
+    )
+    index_parser.set_defaults(handler=index_command)
+
+    cli_args = cli_parser.parse_args()
+    try:
+        cli_args.handler(cli_args)
+    except sqlite3.OperationalError as error:
+        print(f"错误: 搜索索引不可用 ({error})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+基于 NumPy 的字幕切分：直接作用于 process.WordTimestamps 的数组，
+间隔与累计加权长度批量计算，便于对大量任务做参数扫描。
+
+    python segment.py sweep --base 600 800 1000 --penalty 0.02 0.05 0.08
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from process import WordTimestamps
+
+# 动态阈值的下限（毫秒），与 SRTGenerator 一致
+MIN_SILENCE_THRESHOLD_MS = 100
+
+DEFAULT_JOBS_DIRECTORY = Path("jobs")
+
+
+def find_cue_boundaries(
+    words: WordTimestamps,
+    base_silence_threshold_ms: float = 1000,
+    length_penalty_factor: float = 0.05,
+    weighted_lengths: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    返回每条字幕第一个单词的下标。
+    单词 j 前的间隔不小于 max(基础阈值 - 当前字幕加权长度 × 系数 × 1000, 100) 时另起一条，
+    当前字幕加权长度包含单词之间的空格。
+
+    间隔小于阈值下限的位置无论参数如何都不会切分，先用数组一次性排除；
+    剩余的候选位置按原公式逐个判断，保证浮点结果与逐词实现完全相同。
+    """
+    word_count = len(words)
+    if word_count == 0:
+        return np.empty(0, dtype=np.int64)
+    silence_gaps = words.starts[1:] - words.ends[:-1]
+    candidate_positions = (
+        np.flatnonzero(silence_gaps >= MIN_SILENCE_THRESHOLD_MS) + 1
+    )
+    # 从单词 s 到单词 j 之前（含空格）的加权长度 = offsets[j] - offsets[s] - 1
+    length_offsets = np.zeros(word_count, dtype=np.int64)
+    if weighted_lengths is None:
+        weighted_lengths = words.weighted_lengths()
+    np.cumsum(weighted_lengths[:-1] + 1, out=length_offsets[1:])
+
+    candidate_gaps = silence_gaps[candidate_positions - 1].tolist()
+    candidate_offsets = length_offsets[candidate_positions].tolist()
+    cue_starts = [0]
+    cue_start_offset = 0
+    for position, silence_gap, length_offset in zip(
+        candidate_positions.tolist(), candidate_gaps, candidate_offsets
+    ):
+        sentence_length = length_offset - cue_start_offset - 1
+        dynamic_threshold = max(
+            base_silence_threshold_ms
+            - sentence_length * length_penalty_factor * 1000,
+            MIN_SILENCE_THRESHOLD_MS,
+        )
+        if silence_gap >= dynamic_threshold:
+            cue_starts.append(position)
+            cue_start_offset = length_offset
+    return np.asarray(cue_starts, dtype=np.int64)
+
+
+def merge_words_into_cues(
+    words: WordTimestamps,
+    base_silence_threshold_ms: float = 1000,
+    length_penalty_factor: float = 0.05,
+) -> list[dict]:
+    """按切分点合并为 {"text", "start", "finish"} 列表（不做标点恢复）"""
+    cue_starts = find_cue_boundaries(
+        words, base_silence_threshold_ms, length_penalty_factor
+    )
+    cue_ends = np.append(cue_starts[1:], len(words))
+    return [
+        {
+            "text": words.join_text(cue_start, cue_end),
+            "start": words.starts[cue_start].item(),
+            "finish": words.ends[cue_end - 1].item(),
+        }
+        for cue_start, cue_end in zip(cue_starts.tolist(), cue_ends.tolist())
+    ]
+
+
+def summarize_cues(
+    words: WordTimestamps, cue_starts: np.ndarray, weighted_lengths: np.ndarray
+) -> dict:
+    """一次切分结果的统计：字幕条数、时长与加权长度分布"""
+    cue_ends = np.append(cue_starts[1:], len(words))
+    cue_durations = words.ends[cue_ends - 1] - words.starts[cue_starts]
+    length_prefix = np.concatenate(([0], np.cumsum(weighted_lengths)))
+    cue_lengths = (length_prefix[cue_ends] - length_prefix[cue_starts]) + (
+        cue_ends - cue_starts - 1
+    )
+    return {"durations_ms": cue_durations, "weighted_lengths": cue_lengths}
+
+
+def find_cached_recognition_results(jobs_directory: Path) -> list[Path]:
+    return sorted(
+        result_path
+        for result_path in jobs_directory.glob("*/03_result/result.json")
+        if (result_path.parent / "donefile").exists()
+    )
+
+
+def load_cached_word_timestamps(jobs_directory: Path) -> list[WordTimestamps]:
+    job_words = []
+    for result_path in find_cached_recognition_results(jobs_directory):
+        with open(result_path, encoding="utf-8") as f:
+            words = WordTimestamps.from_recognition_result(json.load(f))
+        if len(words):
+            job_words.append(words)
+    return job_words
+
+
+def sweep_parameters(
+    job_words: list[WordTimestamps],
+    base_thresholds: list[float],
+    penalty_factors: list[float],
+) -> list[dict]:
+    """对参数网格中的每组参数切分所有任务，返回汇总统计"""
+    job_weighted_lengths = [words.weighted_lengths() for words in job_words]
+    sweep_rows = []
+    for base_silence_threshold_ms in base_thresholds:
+        for length_penalty_factor in penalty_factors:
+            durations = []
+            lengths = []
+            for words, weighted_lengths in zip(job_words, job_weighted_lengths):
+                cue_summary = summarize_cues(
+                    words,
+                    find_cue_boundaries(
+                        words,
+                        base_silence_threshold_ms,
+                        length_penalty_factor,
+                        weighted_lengths,
+                    ),
+                    weighted_lengths,
+                )
+                durations.append(cue_summary["durations_ms"])
+                lengths.append(cue_summary["weighted_lengths"])
+            durations = np.concatenate(durations) / 1000
+            lengths = np.concatenate(lengths)
+            duration_percentiles = np.percentile(durations, [10, 50, 90])
+            length_percentiles = np.percentile(lengths, [10, 50, 90])
+            sweep_rows.append(
+                {
+                    "base_silence_threshold_ms": base_silence_threshold_ms,
+                    "length_penalty_factor": length_penalty_factor,
+                    "cue_count": int(len(durations)),
+                    "duration_p10": float(duration_percentiles[0]),
+                    "duration_p50": float(duration_percentiles[1]),
+                    "duration_p90": float(duration_percentiles[2]),
+                    "duration_max": float(durations.max()),
+                    "length_p10": float(length_percentiles[0]),
+                    "length_p50": float(length_percentiles[1]),
+                    "length_p90": float(length_percentiles[2]),
+                    "length_max": int(lengths.max()),
+                }
+            )
+    return sweep_rows
+
+
+def print_sweep_table(sweep_rows: list[dict]):
+    print(
+        f"{'阈值ms':>8} {'系数':>6} {'条数':>7} "
+        f"{'时长p10':>8} {'p50':>6} {'p90':>6} {'max':>7} "
+        f"{'长度p10':>8} {'p50':>6} {'p90':>6} {'max':>5}"
+    )
+    for row in sweep_rows:
+        print(
+            f"{row['base_silence_threshold_ms']:>8g} {row['length_penalty_factor']:>6g} "
+            f"{row['cue_count']:>7} "
+            f"{row['duration_p10']:>8.1f} {row['duration_p50']:>6.1f} "
+            f"{row['duration_p90']:>6.1f} {row['duration_max']:>7.1f} "
+            f"{row['length_p10']:>8.0f} {row['length_p50']:>6.0f} "
+            f"{row['length_p90']:>6.0f} {row['length_max']:>5}"
+        )
+
+
+def sweep_command(cli_args):
+    job_words = load_cached_word_timestamps(cli_args.jobs_dir)
+    if not job_words:
+        print(f"错误: {cli_args.jobs_dir} 中没有带时间戳的识别结果缓存")
+        sys.exit(1)
+    word_count = sum(len(words) for words in job_words)
+    print(f"共 {len(job_words)} 个任务，{word_count} 个单词")
+    sweep_rows = sweep_parameters(job_words, cli_args.base, cli_args.penalty)
+    if cli_args.json:
+        print(json.dumps(sweep_rows, ensure_ascii=False, indent=2))
+    else:
+        print_sweep_table(sweep_rows)
+
+
+def main():
+    cli_parser = argparse.ArgumentParser(description="字幕切分工具")
+    subparsers = cli_parser.add_subparsers(dest="command", required=True)
+
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="在已缓存的识别结果上扫描切分参数，输出字幕条数与时长、长度分布"
+    )
+    sweep_parser.add_argument(
+        "--jobs-dir", type=Path, default=DEFAULT_JOBS_DIRECTORY, help="任务目录"
+    )
+    sweep_parser.add_argument(
+        "--base",
+        type=float,
+        nargs="+",
+        default=[600, 800, 1000, 1200, 1500],
+        help="基础静音阈值 (毫秒)",
+    )
+    sweep_parser.add_argument(
+        "--penalty",
+        type=float,
+        nargs="+",
+        default=[0.02, 0.05, 0.08],
+        help="长度惩罚系数",
+    )
+    sweep_parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    sweep_parser.set_defaults(handler=sweep_command)
+
+    cli_args = cli_parser.parse_args()
+    cli_args.handler(cli_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+模型快照：首次加载模型后，把各子模型已解析的模型目录（配置、词表等，不含权重）
+复制到快照目录，并把权重保存为 safetensors。快照目录的配置中去掉了检查点，
+之后直接用本地目录构建不加载检查点的 AutoModel，跳过模型库的解析与更新检查；
+权重以内存映射读取后直接替换模块参数（assign=True），不再反序列化 model.pt。
+
+快照与 funasr、torch 版本绑定，版本变化或恢复失败时自动回退到常规加载并重建快照。
+快照的创建由 model.py 放到后台线程中进行，不会推迟首次加载后的推理。
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+import eventlog
+
+MODEL_SNAPSHOT_DIRECTORY = Path("model_snapshots")
+MANIFEST_FILENAME = "manifest.json"
+
+# AutoModel 中子模型属性与其配置属性、构造参数名的对应关系
+_SUBMODEL_LAYOUT = (
+    ("model", "kwargs", "model"),
+    ("vad_model", "vad_kwargs", "vad_model"),
+    ("punc_model", "punc_kwargs", "punc_model"),
+    ("spk_model", "spk_kwargs", "spk_model"),
+)
+# 原始权重文件，快照中以 safetensors 代替
+_CHECKPOINT_PATTERNS = ("*.pt", "*.pth", "*.bin", "*.ckpt")
+# 模型目录中指向检查点的配置文件；funasr 按其中 file_path_metas 的 init_param 加载权重
+_CONFIGURATION_FILENAME = "configuration.json"
+
+
+def get_runtime_versions() -> dict:
+    import funasr
+    import torch
+
+    return {"funasr": funasr.__version__, "torch": torch.__version__}
+
+
+def get_snapshot_directory(cache_key: tuple) -> Path:
+    model_id = cache_key[0]
+    safe_model_id = "".join(
+        character if character.isalnum() or character in "-_." else "_"
+        for character in model_id
+    )
+    key_digest = hashlib.md5(repr(cache_key).encode()).hexdigest()[:12]
+    return MODEL_SNAPSHOT_DIRECTORY / f"{safe_model_id}-{key_digest}"
+
+
+def read_manifest(snapshot_directory: Path) -> Optional[dict]:
+    try:
+        with open(snapshot_directory / MANIFEST_FILENAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def get_module_device(module) -> str:
+    for parameter in module.parameters():
+        return str(parameter.device)
+    return "cpu"
+
+
+def remove_checkpoint_from_configuration(submodel_directory: Path):
+    """去掉复制后配置中的检查点，使 funasr 只按配置构建模块、不再寻找 model.pt"""
+    configuration_path = submodel_directory / _CONFIGURATION_FILENAME
+    if not configuration_path.exists():
+        raise FileNotFoundError(f"模型目录中没有 {_CONFIGURATION_FILENAME}")
+    with open(configuration_path, encoding="utf-8") as f:
+        configuration = json.load(f)
+    configuration.get("file_path_metas", {}).pop("init_param", None)
+    with open(configuration_path, "w", encoding="utf-8") as f:
+        json.dump(configuration, f, ensure_ascii=False, indent=2)
+
+
+def load_module_weights(module, weights_path: Path):
+    """
+    按模块所在设备读取 safetensors 权重（CPU 上为内存映射），并直接替换模块参数，
+    不再复制一份。save_model 对共享存储的参数只保存一个名称，其余名称指向同一张量
+    """
+    from safetensors.torch import load_file
+
+    state_dict = load_file(str(weights_path), device=get_module_device(module))
+    shared_names = {}
+    for name, tensor in module.state_dict().items():
+        if tensor.numel():
+            storage_key = (
+                tensor.untyped_storage().data_ptr(),
+                tensor.storage_offset(),
+                tuple(tensor.shape),
+            )
+            shared_names.setdefault(storage_key, []).append(name)
+    for names in shared_names.values():
+        saved_name = next((name for name in names if name in state_dict), None)
+        if saved_name is not None:
+            for name in names:
+                state_dict.setdefault(name, state_dict[saved_name])
+    module.load_state_dict(state_dict, assign=True)
+
+
+def save_snapshot(
+    cache_key: tuple,
+    instance,
+    logger_callback=print,
+    inference_lock=None,
+) -> Optional[Path]:
+    """
+    为刚加载完成的 AutoModel 实例创建快照；缺少依赖或无法解析模型目录时返回 None。
+    inference_lock 为实例的推理锁，读取权重期间持有，避免与推理同时访问模块
+    """
+    try:
+        from safetensors.torch import save_model
+    except ImportError:
+        return None
+    snapshot_directory = get_snapshot_directory(cache_key)
+    # 同一进程中也可能有多个线程同时为同一模型创建快照
+    temporary_directory = snapshot_directory.with_name(
+        f"{snapshot_directory.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    )
+    if inference_lock is None:
+        inference_lock = contextlib.nullcontext()
+    submodels = {}
+    try:
+        for module_attribute, kwargs_attribute, argument_name in _SUBMODEL_LAYOUT:
+            module = getattr(instance, module_attribute, None)
+            model_kwargs = getattr(instance, kwargs_attribute, None) or {}
+            model_path = model_kwargs.get("model_path")
+            if module is None or not hasattr(module, "state_dict"):
+                continue
+            if model_path is None or not Path(model_path).is_dir():
+                raise FileNotFoundError(f"无法定位 {module_attribute} 的模型目录")
+            submodel_directory = temporary_directory / argument_name
+            shutil.copytree(
+                model_path,
+                submodel_directory,
+                ignore=shutil.ignore_patterns(*_CHECKPOINT_PATTERNS, ".git*"),
+            )
+            remove_checkpoint_from_configuration(submodel_directory)
+            weights_filename = f"{argument_name}.safetensors"
+            with inference_lock:
+                save_model(module, str(temporary_directory / weights_filename))
+            submodels[argument_name] = {
+                "module_attribute": module_attribute,
+                "directory": argument_name,
+                "weights": weights_filename,
+            }
+        if not submodels:
+            raise FileNotFoundError("实例中没有可保存的子模型")
+        with open(
+            temporary_directory / MANIFEST_FILENAME, "w", encoding="utf-8"
+        ) as f:
+            json.dump(
+                {
+                    "model_id": cache_key[0],
+                    "versions": get_runtime_versions(),
+                    "submodels": submodels,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        try:
+            temporary_directory.rename(snapshot_directory)
+        except OSError:
+            # 其他进程已先一步创建了同一快照
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+    except Exception as e:
+        # 快照只是加速手段，创建失败不影响本次已完成的加载
+        eventlog.as_logger(logger_callback).warning(
+            "[模型快照] 创建 %s 的快照失败: %s", cache_key[0], e
+        )
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        return None
+    return snapshot_directory
+
+
+def make_restoring_factory(automodel_class, snapshot_directory: Path, manifest: dict):
+    """
+    返回与 AutoModel 参数相同的构造函数：把各子模型名替换为快照中的本地目录，
+    构建不含检查点的模块后用 safetensors 权重替换其参数。ModelSpec 的 init_func 无需任何改动。
+    """
+    submodels = manifest["submodels"]
+
+    def restore(**automodel_kwargs):
+        for argument_name, submodel in submodels.items():
+            if automodel_kwargs.get(argument_name) is not None:
+                automodel_kwargs[argument_name] = str(
+                    snapshot_directory / submodel["directory"]
+                )
+        automodel_kwargs["disable_update"] = True
+        instance = automodel_class(**automodel_kwargs)
+        for submodel in submodels.values():
+            load_module_weights(
+                getattr(instance, submodel["module_attribute"]),
+                snapshot_directory / submodel["weights"],
+            )
+        return instance
+
+    return restore
+
+
+def restore_snapshot(
+    cache_key: tuple, init_func: Callable, automodel_class, logger_callback=print
+) -> Optional[object]:
+    """从快照恢复模型实例；没有可用快照或恢复失败时返回 None"""
+    snapshot_directory = get_snapshot_directory(cache_key)
+    manifest = read_manifest(snapshot_directory)
+    if manifest is None:
+        return None
+    try:
+        if manifest.get("versions") != get_runtime_versions():
+            shutil.rmtree(snapshot_directory, ignore_errors=True)
+            return None
+        return init_func(
+            make_restoring_factory(automodel_class, snapshot_directory, manifest)
+        )
+    except Exception as e:
+        eventlog.as_logger(logger_callback).warning(
+            "[模型快照] 从快照恢复 %s 失败，改为常规加载: %s", cache_key[0], e
+        )
+        shutil.rmtree(snapshot_directory, ignore_errors=True)
+        return None
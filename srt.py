@@ -3,11 +3,27 @@ import hashlib
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 import model
+import segment
+from process import WordTimestamps
 
 
 class SRTGenerator:
-    def __init__(self, use_cpu: bool = False):
+    def __init__(
+        self,
+        use_cpu: bool = False,
+        punctuation_model_spec: Optional[model.ModelSpec] = None,
+    ):
+        """
+        punctuation_model_spec 用于与调用方共用同一个标点模型实例
+        （如 init.get_punc_model_spec()），为 None 时使用默认参数的 ct-punc
+        """
         self.use_cpu = use_cpu
+        self.compute_device = "cpu" if use_cpu else "cuda"
+        self.punctuation_model_spec = punctuation_model_spec or model.ModelSpec(
+            "ct-punc",
+            lambda AutoModel: AutoModel(model="ct-punc", device=self.compute_device),
+            device=self.compute_device,
+        )
         self._punctuation_model = None
 
     def initialize_punctuation_model(self) -> Optional[Any]:
@@ -15,10 +31,7 @@ class SRTGenerator:
             try:
                 # 使用 model.py 的接口获取标点模型
                 self._punctuation_model = model.request_model(
-                    "ct-punc",
-                    lambda AutoModel: AutoModel(
-                        model="ct-punc", device="cpu" if self.use_cpu else None
-                    ),
+                    *self.punctuation_model_spec
                 )
             except Exception:
                 self._punctuation_model = None
@@ -38,69 +51,66 @@ class SRTGenerator:
         if punctuation_model is None:
             return original_sentence
         try:
-            punctuation_result = punctuation_model.generate(input=original_sentence)
+            with model.get_inference_lock(punctuation_model):
+                punctuation_result = punctuation_model.generate(
+                    input=original_sentence
+                )
             if punctuation_result and len(punctuation_result) > 0:
                 return punctuation_result[0]["text"]
         except Exception:
             pass
         return original_sentence
 
+    def convert_to_word_timestamps(
+        self, word_timestamps: Union[WordTimestamps, List[Dict[str, Any]]]
+    ) -> WordTimestamps:
+        if isinstance(word_timestamps, WordTimestamps):
+            return word_timestamps
+        # 兼容 {"text", "start", "finish"} 字典列表
+        for word in word_timestamps:
+            if not all(key in word for key in ["text", "start", "finish"]):
+                raise ValueError(
+                    "Invalid word timestamp format. Required keys: text, start, finish"
+                )
+        return WordTimestamps.from_words(
+            [word["text"] for word in word_timestamps],
+            [word["start"] for word in word_timestamps],
+            [word["finish"] for word in word_timestamps],
+        )
+
     def merge_words_into_sentences_with_dynamic_threshold(
         self,
-        word_sequence: List[Dict[str, Any]],
+        word_sequence: Union[WordTimestamps, List[Dict[str, Any]]],
         base_silence_threshold_ms: int = 1000,
         length_penalty_factor: float = 0.05,
         enable_punctuation_restoration: bool = True,
     ) -> List[Dict[str, Any]]:
-        if not word_sequence:
+        word_sequence = self.convert_to_word_timestamps(word_sequence)
+        if not len(word_sequence):
             return []
 
-        merged_sentences: List[Dict[str, Any]] = []
-        current_sentence: Dict[str, Any] = {
-            "text": word_sequence[0]["text"],
-            "start": word_sequence[0]["start"],
-            "finish": word_sequence[0]["finish"],
-        }
-
-        for word_index in range(1, len(word_sequence)):
-            current_word: Dict[str, Any] = word_sequence[word_index]
-            previous_word: Dict[str, Any] = word_sequence[word_index - 1]
-
-            silence_gap_duration: float = (
-                current_word["start"] - previous_word["finish"]
-            )
-
-            current_sentence_weighted_length: int = self.calculate_text_weighted_length(
-                current_sentence["text"]
-            )
-            dynamic_silence_threshold: float = base_silence_threshold_ms - (
-                current_sentence_weighted_length * length_penalty_factor * 1000
-            )
-            dynamic_silence_threshold = max(dynamic_silence_threshold, 100)
-
-            if silence_gap_duration >= dynamic_silence_threshold:
-                if enable_punctuation_restoration:
-                    punctuated_sentence_text: str = self.apply_punctuation_restoration(
-                        current_sentence["text"]
-                    )
-                    current_sentence["text"] = punctuated_sentence_text
-                merged_sentences.append(current_sentence)
-
-                current_sentence = {
-                    "text": current_word["text"],
-                    "start": current_word["start"],
-                    "finish": current_word["finish"],
-                }
-            else:
-                current_sentence["text"] += " " + current_word["text"]
-                current_sentence["finish"] = current_word["finish"]
+        # 切分点由 segment.py 按数组批量计算，结果与逐词比较动态阈值相同
+        cue_starts: List[int] = segment.find_cue_boundaries(
+            word_sequence,
+            base_silence_threshold_ms,
+            length_penalty_factor,
+        ).tolist()
+        cue_ends: List[int] = cue_starts[1:] + [len(word_sequence)]
+        word_starts: List[int] = word_sequence.starts.tolist()
+        word_ends: List[int] = word_sequence.ends.tolist()
 
-        if enable_punctuation_restoration:
-            final_punctuated_text: str = self.apply_punctuation_restoration(
-                current_sentence["text"]
-            )
-            current_sentence["text"] = final_punctuated_text
-        merged_sentences.append(current_sentence)
+        merged_sentences: List[Dict[str, Any]] = []
+        for cue_start, cue_end in zip(cue_starts, cue_ends):
+            current_sentence: Dict[str, Any] = {
+                "text": word_sequence.join_text(cue_start, cue_end),
+                "start": word_starts[cue_start],
+                "finish": word_ends[cue_end - 1],
+            }
+            if enable_punctuation_restoration:
+                current_sentence["text"] = self.apply_punctuation_restoration(
+                    current_sentence["text"]
+                )
+            merged_sentences.append(current_sentence)
 
         return merged_sentences
 
@@ -140,21 +150,16 @@ class SRTGenerator:
 
     def generate_srt_from_word_timestamps(
         self,
-        word_timestamps: List[Dict[str, Any]],
+        word_timestamps: Union[WordTimestamps, List[Dict[str, Any]]],
         output_file_path: Union[str, Path] = "output.srt",
         base_silence_threshold_ms: int = 1000,
         length_penalty_factor: float = 0.05,
         enable_punctuation_restoration: bool = True,
     ) -> Dict[str, Any]:
-        if not word_timestamps:
+        word_timestamps = self.convert_to_word_timestamps(word_timestamps)
+        if not len(word_timestamps):
             raise ValueError("Word timestamps list is empty")
 
-        for word in word_timestamps:
-            if not all(key in word for key in ["text", "start", "finish"]):
-                raise ValueError(
-                    "Invalid word timestamp format. Required keys: text, start, finish"
-                )
-
         merged_sentences = self.merge_words_into_sentences_with_dynamic_threshold(
             word_timestamps,
             base_silence_threshold_ms=base_silence_threshold_ms,
@@ -180,25 +185,17 @@ class SRTGenerator:
         length_penalty_factor: float = 0.05,
         enable_punctuation_restoration: bool = True,
     ) -> Dict[str, Any]:
-        word_timestamps = []
-
-        for recognition_item in recognition_result:
-            if "text" in recognition_item and "timestamp" in recognition_item:
-                segmented_words: List[str] = recognition_item["text"].split(" ")
-                word_timestamps_list: List[List[float]] = recognition_item["timestamp"]
-                minimum_length: int = min(
-                    len(segmented_words), len(word_timestamps_list)
+        word_timestamps = WordTimestamps.concatenate(
+            [
+                WordTimestamps.from_text(
+                    recognition_item["text"], recognition_item["timestamp"]
                 )
-                for word_index in range(minimum_length):
-                    word_timestamps.append(
-                        {
-                            "text": segmented_words[word_index],
-                            "start": word_timestamps_list[word_index][0],
-                            "finish": word_timestamps_list[word_index][1],
-                        }
-                    )
-
-        if not word_timestamps:
+                for recognition_item in recognition_result
+                if "text" in recognition_item and "timestamp" in recognition_item
+            ]
+        )
+
+        if not len(word_timestamps):
             raise ValueError("No valid word timestamps found in recognition result")
 
         return self.generate_srt_from_word_timestamps(
@@ -0,0 +1,212 @@
+"""
+带指纹的阶段缓存：每个阶段目录中的 fingerprint.json 记录该阶段的参数、
+所依赖上游阶段的输出摘要以及本阶段的输出摘要。参数或上游输出变化时，
+只有受影响的阶段（及其下游）会重新计算。
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable, Optional
+
+import eventlog
+
+FINGERPRINT_FILENAME = "fingerprint.json"
+COMPLETION_FLAG_FILENAME = "donefile"
+
+STAGE_DIRECTORIES = {
+    "download": "01_download",
+    "transcode": "02_audio",
+    "vad": "02_vad",
+    "recognize": "03_result",
+    "text": "04_text_output",
+    "srt": "04_srt_output",
+}
+
+# 各阶段直接依赖的上游阶段
+STAGE_DEPENDENCIES = {
+    "download": (),
+    "transcode": ("download",),
+    "vad": ("transcode",),
+    "recognize": ("transcode", "vad"),
+    "text": ("recognize",),
+    # 缺少时间戳时需要用音频做强制对齐
+    "srt": ("transcode", "recognize"),
+}
+
+# 这些阶段的输出与参数无关：只要 donefile 存在即视为有效，旧版缓存也直接沿用
+PARAMETERLESS_STAGES = ("download",)
+# 这些阶段的输出是体积很大的原始媒体与标准音频，按任务目录（对应资源键）与文件大小、
+# 修改时间计算摘要，不读取文件内容
+STAT_DIGEST_STAGES = ("download", "transcode")
+
+
+def compute_file_digest(file_path: Path) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def compute_directory_digest(stage_directory: Path) -> str:
+    """阶段目录中所有输出文件（不含标记文件）的摘要"""
+    directory_hash = hashlib.sha256()
+    for file_path in sorted(stage_directory.iterdir()):
+        if file_path.name in (FINGERPRINT_FILENAME, COMPLETION_FLAG_FILENAME):
+            continue
+        if not file_path.is_file():
+            continue
+        directory_hash.update(file_path.name.encode())
+        directory_hash.update(compute_file_digest(file_path).encode())
+    return directory_hash.hexdigest()
+
+
+def compute_directory_stat_digest(stage_directory: Path) -> str:
+    """按任务目录名与各输出文件的名称、大小、修改时间计算摘要"""
+    directory_hash = hashlib.sha256(stage_directory.parent.name.encode())
+    for file_path in sorted(stage_directory.iterdir()):
+        if file_path.name in (FINGERPRINT_FILENAME, COMPLETION_FLAG_FILENAME):
+            continue
+        if not file_path.is_file():
+            continue
+        file_stat = file_path.stat()
+        directory_hash.update(
+            f"{file_path.name}:{file_stat.st_size}:{file_stat.st_mtime_ns}".encode()
+        )
+    return directory_hash.hexdigest()
+
+
+class StageCache:
+    """
+    管理一个任务目录下各阶段的指纹。stage_parameters(stage) 返回影响该阶段
+    输出的参数（需可 JSON 序列化），如模型 ID、采样率、字幕切分阈值等。
+    """
+
+    def __init__(
+        self, task_directory: Path, stage_parameters: Callable[[str], dict]
+    ):
+        self.task_directory = Path(task_directory)
+        self.stage_parameters = stage_parameters
+
+    def stage_directory(self, stage: str) -> Path:
+        return self.task_directory / STAGE_DIRECTORIES[stage]
+
+    def read_record(self, stage: str) -> Optional[dict]:
+        try:
+            with open(
+                self.stage_directory(stage) / FINGERPRINT_FILENAME, encoding="utf-8"
+            ) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def upstream_digests(self, stage: str) -> dict:
+        upstream_digests = {}
+        for upstream_stage in STAGE_DEPENDENCIES[stage]:
+            upstream_record = self.read_record(upstream_stage)
+            upstream_digests[upstream_stage] = (
+                upstream_record["output_digest"] if upstream_record else None
+            )
+        return upstream_digests
+
+    def compute_fingerprint(self, stage: str) -> str:
+        fingerprint_source = json.dumps(
+            {
+                "stage": stage,
+                "parameters": self.stage_parameters(stage),
+                "upstream": self.upstream_digests(stage),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(fingerprint_source.encode()).hexdigest()
+
+    def get_stale_reason(
+        self, stage: str, rerun_stages: tuple[str, ...] = ()
+    ) -> Optional[str]:
+        """
+        返回该阶段需要重新计算的原因，缓存有效时返回 None。
+        rerun_stages 为已确定将重新计算的阶段，仅用于预演。
+        """
+        if stage not in STAGE_DIRECTORIES:
+            return None
+        stage_directory = self.stage_directory(stage)
+        if not (stage_directory / COMPLETION_FLAG_FILENAME).exists():
+            return "无缓存"
+        if stage in PARAMETERLESS_STAGES:
+            return None
+        record = self.read_record(stage)
+        if record is None:
+            return "旧版缓存缺少指纹"
+        changed_parameters = sorted(
+            name
+            for name, value in self.stage_parameters(stage).items()
+            if record["parameters"].get(name) != value
+        )
+        if changed_parameters:
+            return f"参数变化: {', '.join(changed_parameters)}"
+        rerun_upstream = [
+            upstream_stage
+            for upstream_stage in STAGE_DEPENDENCIES[stage]
+            if upstream_stage in rerun_stages
+        ]
+        if rerun_upstream:
+            return f"上游将重新计算: {', '.join(rerun_upstream)}"
+        if record["fingerprint"] != self.compute_fingerprint(stage):
+            return "上游输出变化"
+        return None
+
+    def prepare(self, stage: str, logger_callback=print) -> bool:
+        """
+        进入阶段前调用：缓存失效时删除 donefile，使阶段函数重新计算。
+        返回缓存是否有效。
+        """
+        stale_reason = self.get_stale_reason(stage)
+        if stale_reason is None:
+            if stage in STAGE_DIRECTORIES and self.read_record(stage) is None:
+                self.commit(stage)
+            return True
+        stage_directory = self.stage_directory(stage)
+        if (stage_directory / COMPLETION_FLAG_FILENAME).exists():
+            eventlog.as_logger(logger_callback).info(
+                "[缓存失效] %s: %s", stage, stale_reason
+            )
+        (stage_directory / COMPLETION_FLAG_FILENAME).unlink(missing_ok=True)
+        (stage_directory / FINGERPRINT_FILENAME).unlink(missing_ok=True)
+        return False
+
+    def commit(self, stage: str):
+        """阶段成功完成后调用：记录指纹与输出摘要"""
+        if stage not in STAGE_DIRECTORIES:
+            return
+        fingerprint = self.compute_fingerprint(stage)
+        record = self.read_record(stage)
+        if record is not None and (
+            record["fingerprint"] == fingerprint or stage in PARAMETERLESS_STAGES
+        ):
+            return
+        stage_directory = self.stage_directory(stage)
+        record = {
+            "fingerprint": fingerprint,
+            "parameters": self.stage_parameters(stage),
+            "upstream": self.upstream_digests(stage),
+            "output_digest": (
+                compute_directory_stat_digest(stage_directory)
+                if stage in STAT_DIGEST_STAGES
+                else compute_directory_digest(stage_directory)
+            ),
+        }
+        temporary_path = stage_directory / (FINGERPRINT_FILENAME + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        temporary_path.replace(stage_directory / FINGERPRINT_FILENAME)
+
+    def plan(self, stages: list[str]) -> dict[str, Optional[str]]:
+        """预演：按顺序返回各阶段需要重新计算的原因，None 表示可直接使用缓存"""
+        stale_reasons = {}
+        for stage in stages:
+            rerun_stages = tuple(
+                planned_stage
+                for planned_stage, reason in stale_reasons.items()
+                if reason is not None
+            )
+            stale_reasons[stage] = self.get_stale_reason(stage, rerun_stages)
+        return stale_reasons
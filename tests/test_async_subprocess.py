@@ -0,0 +1,96 @@
+import asyncio
+import os
+import stat
+import sys
+import textwrap
+
+import init
+
+
+def write_fake_yt_dlp(bin_directory, pid_file):
+    """打印一行进度后长时间挂起的 yt-dlp，启动时把自己的 pid 写入 pid_file"""
+    script_path = bin_directory / "yt-dlp"
+    script_path.write_text(
+        textwrap.dedent(
+            f"""\
+            #!{sys.executable}
+            import os, time
+            with open({str(pid_file)!r}, "w") as f:
+                f.write(str(os.getpid()))
+            print("[progress] 10 100 NA", flush=True)
+            time.sleep(60)
+            """
+        )
+    )
+    script_path.chmod(script_path.stat().st_mode | stat.S_IXUSR)
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_cancelled_download_terminates_yt_dlp(tmp_path, monkeypatch):
+    bin_directory = tmp_path / "bin"
+    bin_directory.mkdir()
+    pid_file = tmp_path / "yt-dlp.pid"
+    write_fake_yt_dlp(bin_directory, pid_file)
+    monkeypatch.setenv("PATH", f"{bin_directory}{os.pathsep}{os.environ['PATH']}")
+    task_directory = tmp_path / "task"
+    task_directory.mkdir()
+
+    async def download_then_cancel():
+        progress_seen = asyncio.Event()
+        progress_values = []
+
+        def progress_callback(fraction):
+            progress_values.append(fraction)
+            if fraction > 0:
+                progress_seen.set()
+
+        download_task = asyncio.create_task(
+            init.acquire_input_resource_async(
+                "https://example.com/watch?v=1",
+                task_directory,
+                logger_callback=lambda message: None,
+                progress_callback=progress_callback,
+            )
+        )
+        await asyncio.wait_for(progress_seen.wait(), timeout=10)
+        download_task.cancel()
+        await asyncio.gather(download_task, return_exceptions=True)
+        return progress_values
+
+    progress_values = asyncio.run(download_then_cancel())
+
+    assert progress_values == [0.0, 0.1]
+    assert not is_process_alive(int(pid_file.read_text()))
+
+
+def test_async_line_parser_matches_sync_version():
+    command = [
+        sys.executable,
+        "-c",
+        "print('[progress] 5 10 NA'); print('plain line'); raise SystemExit(3)",
+    ]
+    progress_values = []
+    logged_lines = []
+
+    returncode, command_output = asyncio.run(
+        init.run_command_with_line_parser_async(
+            command,
+            init.parse_yt_dlp_progress_line,
+            progress_callback=progress_values.append,
+            output_logger=logged_lines.append,
+        )
+    )
+
+    assert (returncode, command_output) == init.run_command_with_line_parser(
+        command, init.parse_yt_dlp_progress_line
+    )
+    assert returncode == 3
+    assert progress_values == [0.5]
+    assert logged_lines == ["plain line"]
@@ -0,0 +1,93 @@
+import pytest
+
+import canonical
+from canonical import ResourceKeyIndex
+
+
+@pytest.mark.parametrize(
+    "url, resource_key",
+    [
+        ("https://www.bilibili.com/video/BV1xx411c7mD", "bilibili-BV1xx411c7mD"),
+        (
+            "https://m.bilibili.com/video/bv1xx411c7mD/?spm_id_from=333&p=1",
+            "bilibili-BV1xx411c7mD",
+        ),
+        (
+            "https://www.bilibili.com/video/BV1xx411c7mD?p=3",
+            "bilibili-BV1xx411c7mD-p3",
+        ),
+        ("https://www.bilibili.com/video/AV170001", "bilibili-av170001"),
+        ("  https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s ", "youtube-dQw4w9WgXcQ"),
+        ("https://youtu.be/dQw4w9WgXcQ?si=share", "youtube-dQw4w9WgXcQ"),
+        ("https://m.youtube.com/shorts/dQw4w9WgXcQ", "youtube-dQw4w9WgXcQ"),
+        ("https://music.youtube.com/watch?v=dQw4w9WgXcQ", "youtube-dQw4w9WgXcQ"),
+    ],
+)
+def test_same_video_links_share_resource_key(url, resource_key):
+    assert canonical.canonicalize_url(url) == resource_key
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.bilibili.com/bangumi/play/ep1234",
+        "https://www.youtube.com/watch?v=too-short",
+        "https://www.youtube.com/channel/UC1234567890",
+        "https://b23.tv/abcdef",
+        "https://example.com/video/BV1xx411c7mD",
+        "/data/videos/lecture.mp4",
+    ],
+)
+def test_unrecognized_links_have_no_offline_key(url):
+    assert canonical.canonicalize_url(url) is None
+
+
+def test_safe_filename_keeps_replaced_keys_distinct():
+    assert canonical.make_safe_filename("youtube-dQw4w9WgXcQ") == "youtube-dQw4w9WgXcQ"
+    assert canonical.make_safe_filename("a/b") != canonical.make_safe_filename("a_b")
+    assert "/" not in canonical.make_safe_filename("a/b")
+
+
+def test_first_registration_wins(tmp_path):
+    key_index = ResourceKeyIndex(tmp_path)
+
+    assert key_index.register("youtube-dQw4w9WgXcQ", "task-a") == "task-a"
+    assert key_index.register("youtube-dQw4w9WgXcQ", "task-b") == "task-a"
+    # 目录尚未创建时不视为已有任务
+    assert key_index.lookup("youtube-dQw4w9WgXcQ") is None
+    (tmp_path / "task-a").mkdir()
+    assert key_index.lookup("youtube-dQw4w9WgXcQ") == "task-a"
+
+
+def test_offline_resolve_does_not_touch_network_or_files(tmp_path, monkeypatch):
+    def fail_follow_short_link(url):
+        raise AssertionError("离线模式不应联网")
+
+    monkeypatch.setattr(canonical, "follow_short_link", fail_follow_short_link)
+    key_index = ResourceKeyIndex(tmp_path)
+
+    assert key_index.resolve("https://b23.tv/abcdef", offline=True) is None
+    assert key_index.resolve("lecture.mp4") is None
+    assert (
+        key_index.resolve("https://youtu.be/dQw4w9WgXcQ", offline=True)
+        == "youtube-dQw4w9WgXcQ"
+    )
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_short_link_result_is_cached(tmp_path, monkeypatch):
+    followed_urls = []
+
+    def fake_follow_short_link(url):
+        followed_urls.append(url)
+        return "https://www.bilibili.com/video/BV1xx411c7mD?p=2"
+
+    monkeypatch.setattr(canonical, "follow_short_link", fake_follow_short_link)
+    key_index = ResourceKeyIndex(tmp_path)
+
+    assert key_index.resolve("https://b23.tv/abcdef") == "bilibili-BV1xx411c7mD-p2"
+    assert (
+        key_index.resolve("https://b23.tv/abcdef", offline=True)
+        == "bilibili-BV1xx411c7mD-p2"
+    )
+    assert followed_urls == ["https://b23.tv/abcdef"]
@@ -0,0 +1,37 @@
+import eventlog
+
+
+class ListSink(eventlog.LogSink):
+    def __init__(self, min_level: int = eventlog.DEBUG):
+        super().__init__(min_level)
+        self.lines = []
+
+    def write_batch(self, events):
+        self.lines.extend(event.format_message() for event in events)
+
+
+def test_suppressed_subprocess_output_is_summarised_on_close():
+    sink = ListSink()
+    event_log = eventlog.EventLog([sink])
+    job_logger = event_log.get_logger("pipeline", job=1)
+    output_logger = job_logger.with_source("ffmpeg", rate_per_second=0.001, burst=2)
+
+    for line_number in range(5):
+        output_logger.debug("line %d", line_number)
+    event_log.close()
+
+    assert sink.lines == ["line 0", "line 1", "[已省略 3 条 ffmpeg 输出]"]
+
+
+def test_same_source_of_a_job_shares_one_rate_limit():
+    sink = ListSink()
+    event_log = eventlog.EventLog([sink])
+    job_logger = event_log.get_logger("pipeline", job=1)
+
+    for run_number in range(3):
+        job_logger.with_source("yt-dlp", rate_per_second=0.001, burst=2).debug(
+            "run %d", run_number
+        )
+    event_log.close()
+
+    assert sink.lines == ["run 0", "run 1", "[已省略 1 条 yt-dlp 输出]"]
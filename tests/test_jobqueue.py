@@ -0,0 +1,135 @@
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+import jobqueue
+from jobqueue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    job_queue = JobQueue(tmp_path / "queue.sqlite3")
+    yield job_queue
+    job_queue.close()
+
+
+def test_add_urls_ignores_duplicates(queue):
+    assert queue.add_urls(["a", "b"]) == 2
+    assert queue.add_urls(["b", "c"]) == 1
+    assert queue.count_by_state()["pending"] == 3
+
+
+def test_claim_next_marks_running_and_records_worker(queue):
+    queue.add_urls(["a", "b"])
+
+    job = queue.claim_next()
+
+    assert (job.url, job.state, job.attempts) == ("a", "running", 1)
+    assert (job.worker_host, job.worker_pid) == (queue.worker_host, queue.worker_pid)
+    assert queue.claim_next().url == "b"
+    assert queue.claim_next() is None
+
+
+def test_restricted_claims_follow_given_order(queue):
+    queue.add_urls(["a", "b", "c"])
+    queue.restrict_claims(["c", "a"])
+
+    assert [queue.claim_next().url, queue.claim_next().url] == ["c", "a"]
+    assert queue.claim_next() is None
+
+
+def test_defer_does_not_count_as_attempt(queue):
+    queue.add_urls(["a"])
+    job = queue.claim_next()
+
+    queue.defer(job.id, 60)
+
+    deferred_job = queue.get_job(job.id)
+    assert (deferred_job.state, deferred_job.attempts) == ("pending", 0)
+    assert deferred_job.worker_pid is None
+    assert queue.claim_next() is None
+    assert 55 < queue.seconds_until_next_retry() <= 60
+
+
+def test_mark_failed_backs_off_exponentially_until_max_attempts(queue):
+    queue.add_urls(["a"])
+    retry_delays = []
+    for _ in range(jobqueue.MAX_ATTEMPTS):
+        job = queue.claim_next()
+        failed_at = time.time()
+        job = queue.mark_failed(job.id, "下载失败", {}, retryable=True)
+        if job.state == "pending":
+            retry_delays.append(round(job.next_attempt_at - failed_at))
+            # 跳过等待，直接进入下一次尝试
+            queue.connection.execute(
+                "UPDATE jobs SET next_attempt_at = 0 WHERE id = ?", (job.id,)
+            )
+
+    assert retry_delays == [30, 60, 120, 240]
+    assert (job.state, job.attempts) == ("failed", jobqueue.MAX_ATTEMPTS)
+
+
+def test_non_retryable_failure_is_final(queue):
+    queue.add_urls(["a"])
+    job = queue.mark_failed(queue.claim_next().id, "格式错误", {}, retryable=False)
+    assert job.state == "failed"
+
+
+def set_claim_owner(queue, url, worker_host, worker_pid, started_at):
+    queue.connection.execute(
+        "UPDATE jobs SET state = 'running', worker_host = ?, worker_pid = ?, "
+        "started_at = ? WHERE url = ?",
+        (worker_host, worker_pid, started_at, url),
+    )
+
+
+def get_exited_pid() -> int:
+    exited_process = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited_process.wait()
+    return exited_process.pid
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="需要用信号 0 探测进程")
+def test_recover_interrupted_only_resets_abandoned_claims(queue):
+    queue.add_urls(["alive", "dead", "remote-old", "remote-new", "legacy"])
+    now = time.time()
+    set_claim_owner(queue, "alive", queue.worker_host, queue.worker_pid, now - 3600)
+    set_claim_owner(queue, "dead", queue.worker_host, get_exited_pid(), now)
+    set_claim_owner(queue, "remote-old", "other-host", 1, now - 3600)
+    set_claim_owner(queue, "remote-new", "other-host", 1, now)
+    set_claim_owner(queue, "legacy", None, None, now)
+
+    assert queue.recover_interrupted() == 2
+    assert queue.recover_interrupted(stale_after_seconds=120) == 1
+
+    states = {job.url: job.state for job in queue.list_jobs()}
+    assert states == {
+        "alive": "running",
+        "dead": "pending",
+        "remote-old": "pending",
+        "remote-new": "running",
+        "legacy": "pending",
+    }
+
+
+def test_existing_database_gains_worker_columns(tmp_path):
+    database_path = tmp_path / "queue.sqlite3"
+    connection = sqlite3.connect(database_path)
+    connection.executescript(
+        jobqueue._SCHEMA.replace(",\n    worker_host TEXT,\n    worker_pid INTEGER", "")
+    )
+    connection.execute(
+        "INSERT INTO jobs (url, state, created_at) VALUES ('a', 'running', 0)"
+    )
+    connection.commit()
+    connection.close()
+
+    job_queue = JobQueue(database_path)
+    try:
+        assert job_queue.recover_interrupted() == 1
+        assert job_queue.claim_next().worker_pid == job_queue.worker_pid
+    finally:
+        job_queue.close()
@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+import leases
+from leases import JobLease
+
+
+def test_parse_shard():
+    assert leases.parse_shard("1/3") == (1, 3)
+    assert leases.parse_shard("3/3") == (3, 3)
+
+
+@pytest.mark.parametrize("shard_text", ["0/3", "4/3", "a/b", "1", "1/2/3", ""])
+def test_parse_shard_rejects_invalid_text(shard_text):
+    with pytest.raises(ValueError):
+        leases.parse_shard(shard_text)
+
+
+def test_shards_split_items_round_robin():
+    items = ["a", "b", "c", "d", "e", "f", "g"]
+
+    own_items = [
+        leases.order_items_for_shard(items, shard_index, 3, steal=False)
+        for shard_index in (1, 2, 3)
+    ]
+
+    assert own_items == [["a", "d", "g"], ["b", "e"], ["c", "f"]]
+
+
+def test_stealing_shard_lists_own_items_first():
+    items = ["a", "b", "c", "d", "e", "f", "g"]
+
+    assert leases.order_items_for_shard(items, 2, 3, steal=True) == [
+        "b", "e", "a", "c", "d", "f", "g"
+    ]
+
+
+def test_second_worker_cannot_acquire_held_lease(tmp_path):
+    first_lease = JobLease(tmp_path / "task", worker_id="first")
+    second_lease = JobLease(tmp_path / "task", worker_id="second")
+
+    assert first_lease.acquire()
+    try:
+        assert not second_lease.acquire()
+    finally:
+        first_lease.release()
+    assert second_lease.acquire()
+    second_lease.release()
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    stale_lease = JobLease(tmp_path / "task", worker_id="crashed", ttl_seconds=10)
+    stale_lease.task_directory.mkdir()
+    assert stale_lease._try_create()
+    expired_at = time.time() - 60
+    os.utime(stale_lease.lease_path, (expired_at, expired_at))
+
+    new_lease = JobLease(tmp_path / "task", worker_id="new")
+    assert new_lease.acquire()
+    try:
+        assert new_lease.read_holder()["worker"] == "new"
+        assert not stale_lease.is_held()
+    finally:
+        new_lease.release()
+
+
+def test_completed_marker_skips_only_matching_fingerprint(tmp_path):
+    lease = JobLease(tmp_path / "task", completion_fingerprint="v1")
+    assert lease.acquire()
+    lease.release(completed=True)
+
+    assert not lease.lease_path.exists()
+    assert not JobLease(tmp_path / "task", completion_fingerprint="v1").acquire()
+    changed_lease = JobLease(tmp_path / "task", completion_fingerprint="v2")
+    assert changed_lease.acquire()
+    changed_lease.release()
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+import model
+
+
+class FakeTensor:
+    def __init__(self, byte_count: int):
+        self.byte_count = byte_count
+
+    def numel(self) -> int:
+        return self.byte_count
+
+    def element_size(self) -> int:
+        return 1
+
+
+class FakeModule:
+    def __init__(self, byte_count: int):
+        self.weights = [FakeTensor(byte_count)]
+
+    def parameters(self):
+        return iter(self.weights)
+
+    def buffers(self):
+        return iter([])
+
+
+class FakeAutoModel:
+    def __init__(self, model: str, byte_count: int = 100, **kwargs):
+        self.model_name = model
+        self.model = FakeModule(byte_count)
+
+
+def fake_init_func(model_id: str, byte_count: int, load_calls: list):
+    def init_func(automodel_class):
+        load_calls.append(model_id)
+        return automodel_class(model=model_id, byte_count=byte_count)
+
+    return init_func
+
+
+@pytest.fixture(autouse=True)
+def fake_model_library(monkeypatch):
+    monkeypatch.setattr(model, "get_model", lambda: FakeAutoModel)
+    monkeypatch.setattr(model, "USE_MODEL_SNAPSHOTS", False)
+    monkeypatch.setattr(model, "MEMORY_BUDGET_BYTES", None)
+    model.unload_all_models()
+    yield
+    model.unload_all_models()
+
+
+def cached_model_ids() -> list[str]:
+    return [entry["model_id"] for entry in model.get_memory_usage()["models"]]
+
+
+def test_request_model_caches_by_model_device_and_options():
+    load_calls = []
+
+    first = model.request_model("asr", fake_init_func("asr", 100, load_calls))
+    again = model.request_model("asr", fake_init_func("asr", 100, load_calls))
+    on_cpu = model.request_model("asr", fake_init_func("asr", 100, load_calls), "cpu")
+    with_options = model.request_model(
+        "asr", fake_init_func("asr", 100, load_calls), "cpu", {"hub": "hf"}
+    )
+
+    assert first is again
+    assert len({id(first), id(on_cpu), id(with_options)}) == 3
+    assert load_calls == ["asr", "asr", "asr"]
+    assert model.get_memory_usage()["total_bytes"] == 300
+
+
+def test_memory_budget_evicts_least_recently_used_model():
+    load_calls = []
+    model.set_memory_budget(250)
+    model.request_model("vad", fake_init_func("vad", 100, load_calls))
+    model.request_model("asr", fake_init_func("asr", 100, load_calls))
+    # 再次使用 vad，使 asr 成为最近最少使用的模型
+    model.request_model("vad", fake_init_func("vad", 100, load_calls))
+
+    model.request_model("punc", fake_init_func("punc", 100, load_calls))
+
+    assert cached_model_ids() == ["vad", "punc"]
+    assert model.get_memory_usage()["total_bytes"] == 200
+
+
+def test_model_larger_than_budget_stays_loaded_alone():
+    load_calls = []
+    model.set_memory_budget(150)
+    model.request_model("vad", fake_init_func("vad", 100, load_calls))
+
+    model.request_model("asr", fake_init_func("asr", 400, load_calls))
+
+    assert cached_model_ids() == ["asr"]
+
+
+def request_concurrently(request_count: int, init_func) -> list:
+    results = [None] * request_count
+
+    def request(request_index):
+        try:
+            results[request_index] = model.request_model("asr", init_func)
+        except Exception as error:
+            results[request_index] = error
+
+    requesters = [
+        threading.Thread(target=request, args=(request_index,))
+        for request_index in range(request_count)
+    ]
+    for requester in requesters:
+        requester.start()
+    for requester in requesters:
+        requester.join()
+    return results
+
+
+def test_concurrent_requests_share_one_load():
+    load_calls = []
+    load_started = threading.Event()
+    release_load = threading.Event()
+    loading_while_waiting = []
+    load_model = fake_init_func("asr", 100, load_calls)
+
+    def slow_init_func(automodel_class):
+        load_started.set()
+        release_load.wait(timeout=10)
+        return load_model(automodel_class)
+
+    def release_when_waiting():
+        load_started.wait(timeout=10)
+        # 给其余请求留出时间进入等待
+        time.sleep(0.2)
+        loading_while_waiting.append(model.get_memory_usage()["loading"])
+        release_load.set()
+
+    releaser = threading.Thread(target=release_when_waiting)
+    releaser.start()
+    instances = request_concurrently(8, slow_init_func)
+    releaser.join()
+
+    assert loading_while_waiting == [1]
+    assert load_calls == ["asr"]
+    assert all(instance is instances[0] for instance in instances)
+
+
+def test_failed_load_reaches_every_waiter_and_is_retried():
+    load_attempts = []
+
+    def failing_init_func(automodel_class):
+        load_attempts.append(1)
+        time.sleep(0.1)
+        raise RuntimeError("下载模型失败")
+
+    results = request_concurrently(4, failing_init_func)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert model.get_memory_usage()["loading"] == 0
+    # 失败不会被缓存，之后的请求重新加载
+    assert model.request_model("asr", fake_init_func("asr", 100, [])) is not None
+    assert len(load_attempts) == 1
@@ -0,0 +1,61 @@
+import threading
+
+import progress
+from progress import RTFHistory
+
+
+def test_record_merges_samples_written_by_other_instances(tmp_path):
+    history_path = tmp_path / "rtf_history_test.json"
+    first_history = RTFHistory(history_path)
+    second_history = RTFHistory(history_path)
+
+    first_history.record({"transcode:cpu": 0.1})
+    second_history.record({"transcode:cpu": 0.3, "vad:cpu": 0.02})
+
+    assert RTFHistory(history_path).samples == {
+        "transcode:cpu": [0.1, 0.3],
+        "vad:cpu": [0.02],
+    }
+    assert second_history.median_rtf("transcode:cpu") == 0.2
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "rtf_history_test.json",
+        "rtf_history_test.json.lock",
+    ]
+
+
+def test_concurrent_records_keep_every_sample(tmp_path):
+    history_path = tmp_path / "rtf_history_test.json"
+    recorder_count = 8
+    records_per_recorder = 5
+
+    def record_samples(recorder_index):
+        history = RTFHistory(history_path)
+        for _ in range(records_per_recorder):
+            history.record({f"recognize:worker{recorder_index}": 0.5})
+
+    recorders = [
+        threading.Thread(target=record_samples, args=(recorder_index,))
+        for recorder_index in range(recorder_count)
+    ]
+    for recorder in recorders:
+        recorder.start()
+    for recorder in recorders:
+        recorder.join()
+
+    samples = RTFHistory(history_path).samples
+    assert len(samples) == recorder_count
+    assert all(
+        len(stage_samples) == records_per_recorder
+        for stage_samples in samples.values()
+    )
+
+
+def test_record_keeps_only_recent_samples(tmp_path):
+    history = RTFHistory(tmp_path / "rtf_history_test.json")
+    for sample_index in range(progress.RTF_HISTORY_SIZE + 5):
+        history.record({"download:cpu": float(sample_index)})
+
+    assert history.samples["download:cpu"] == [
+        float(sample_index)
+        for sample_index in range(5, progress.RTF_HISTORY_SIZE + 5)
+    ]
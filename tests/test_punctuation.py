@@ -0,0 +1,56 @@
+import re
+
+import init
+
+
+class FakePuncModel:
+    """与 ct-punc 相同，每次 generate 只接受一条输入；每 7 个词后加逗号，结尾加句号"""
+
+    def __init__(self):
+        self.inputs = []
+
+    def generate(self, input, **kwargs):
+        assert isinstance(input, str), "ct-punc 每次只接受一条输入"
+        self.inputs.append(input)
+        words = input.split(" ")
+        punctuated = "".join(
+            word + ("，" if index % 7 == 6 else "")
+            for index, word in enumerate(words)
+        )
+        return [{"key": "fake", "text": punctuated.rstrip("，") + "。"}]
+
+
+def test_plan_punctuation_windows_cover_tokens_without_gaps(monkeypatch):
+    monkeypatch.setattr(init, "PUNC_WINDOW_TOKENS", 10)
+    monkeypatch.setattr(init, "PUNC_CONTEXT_TOKENS", 3)
+    windows = init.plan_punctuation_windows(25)
+    assert windows == [(0, 0, 10, 13), (7, 10, 20, 23), (17, 20, 25, 25)]
+    assert init.plan_punctuation_windows(0) == []
+
+
+def test_multi_window_transcript_is_punctuated_window_by_window(
+    monkeypatch, tmp_path
+):
+    monkeypatch.setattr(init, "PUNC_WINDOW_TOKENS", 10)
+    monkeypatch.setattr(init, "PUNC_CONTEXT_TOKENS", 3)
+    monkeypatch.setattr(init, "PUNC_BATCH_WINDOWS", 2)
+    punc_model = FakePuncModel()
+    monkeypatch.setattr(
+        init, "get_initialized_punc_model", lambda logger_callback=print: punc_model
+    )
+    tokens = [chr(0x4E00 + index) for index in range(53)]
+    progress_values = []
+
+    txt_file_path = init.generate_text_with_punctuation(
+        {"text": " ".join(tokens)},
+        tmp_path,
+        logger_callback=lambda *args: None,
+        progress_callback=progress_values.append,
+    )
+
+    assert len(punc_model.inputs) == 6
+    punctuated_text = txt_file_path.read_text(encoding="utf-8")
+    assert re.sub("[，。]", "", punctuated_text) == "".join(tokens)
+    assert punctuated_text.endswith("。")
+    assert progress_values[0] == 0.0 and progress_values[-1] == 1.0
+    assert (tmp_path / "04_text_output" / "donefile").exists()
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+import segment
+from process import WordTimestamps
+
+
+def calculate_text_weighted_length(input_text: str) -> int:
+    return sum(1 if ord(character) < 128 else 2 for character in input_text)
+
+
+def merge_words_word_by_word(
+    word_sequence, base_silence_threshold_ms, length_penalty_factor
+):
+    """向量化之前 SRTGenerator 的逐词实现（不做标点恢复）"""
+    if not word_sequence:
+        return []
+    merged_sentences = []
+    current_sentence = dict(word_sequence[0])
+    for word_index in range(1, len(word_sequence)):
+        current_word = word_sequence[word_index]
+        previous_word = word_sequence[word_index - 1]
+        silence_gap_duration = current_word["start"] - previous_word["finish"]
+        dynamic_silence_threshold = base_silence_threshold_ms - (
+            calculate_text_weighted_length(current_sentence["text"])
+            * length_penalty_factor
+            * 1000
+        )
+        dynamic_silence_threshold = max(dynamic_silence_threshold, 100)
+        if silence_gap_duration >= dynamic_silence_threshold:
+            merged_sentences.append(current_sentence)
+            current_sentence = dict(current_word)
+        else:
+            current_sentence["text"] += " " + current_word["text"]
+            current_sentence["finish"] = current_word["finish"]
+    merged_sentences.append(current_sentence)
+    return merged_sentences
+
+
+def generate_words(word_count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    vocabulary = ["今", "天", "气", "很好", "hello", "world", "AI", "模型", "a"]
+    word_sequence = []
+    current_ms = 0
+    for _ in range(word_count):
+        # 多数间隔很短，偶尔出现接近或超过各种阈值的停顿
+        current_ms += rng.choice(
+            [0, 20, 80, 99, 100, 101, 250, 400, 700, 1000, 2500]
+        )
+        duration_ms = rng.randint(50, 400)
+        word_sequence.append(
+            {
+                "text": rng.choice(vocabulary),
+                "start": current_ms,
+                "finish": current_ms + duration_ms,
+            }
+        )
+        current_ms += duration_ms
+    return word_sequence
+
+
+def to_word_timestamps(word_sequence: list[dict]) -> WordTimestamps:
+    return WordTimestamps.from_words(
+        [word["text"] for word in word_sequence],
+        [word["start"] for word in word_sequence],
+        [word["finish"] for word in word_sequence],
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(
+    "base_silence_threshold_ms, length_penalty_factor",
+    [(1000, 0.05), (600, 0.02), (1500, 0.08), (100, 0.0), (800, 0.3)],
+)
+def test_vectorized_boundaries_match_word_by_word_merge(
+    seed, base_silence_threshold_ms, length_penalty_factor
+):
+    word_sequence = generate_words(500, seed)
+
+    expected_cues = merge_words_word_by_word(
+        word_sequence, base_silence_threshold_ms, length_penalty_factor
+    )
+    actual_cues = segment.merge_words_into_cues(
+        to_word_timestamps(word_sequence),
+        base_silence_threshold_ms,
+        length_penalty_factor,
+    )
+
+    assert len(expected_cues) > 1
+    assert actual_cues == expected_cues
+
+
+def test_empty_and_single_word_inputs():
+    assert segment.find_cue_boundaries(to_word_timestamps([])).tolist() == []
+    single_word = [{"text": "好", "start": 0, "finish": 100}]
+    single_word_boundaries = segment.find_cue_boundaries(
+        to_word_timestamps(single_word)
+    )
+    assert single_word_boundaries.tolist() == [0]
@@ -0,0 +1,39 @@
+import pytest
+
+from process import WordTimestamps
+from srt import SRTGenerator
+
+WORDS = [
+    {"text": "今", "start": 0, "finish": 200},
+    {"text": "天", "start": 200, "finish": 400},
+    {"text": "好", "start": 2000, "finish": 2200},
+    {"text": "hello", "start": 2200, "finish": 2600},
+]
+
+
+def test_merge_accepts_word_dict_list():
+    generator = SRTGenerator(use_cpu=True)
+    word_timestamps = WordTimestamps.from_words(
+        [word["text"] for word in WORDS],
+        [word["start"] for word in WORDS],
+        [word["finish"] for word in WORDS],
+    )
+
+    merged_from_dicts = generator.merge_words_into_sentences_with_dynamic_threshold(
+        WORDS, enable_punctuation_restoration=False
+    )
+
+    assert merged_from_dicts == (
+        generator.merge_words_into_sentences_with_dynamic_threshold(
+            word_timestamps, enable_punctuation_restoration=False
+        )
+    )
+    assert [sentence["start"] for sentence in merged_from_dicts] == [0, 2000]
+    assert generator.merge_words_into_sentences_with_dynamic_threshold([]) == []
+
+
+def test_merge_rejects_words_without_timestamps():
+    with pytest.raises(ValueError):
+        SRTGenerator(use_cpu=True).merge_words_into_sentences_with_dynamic_threshold(
+            [{"text": "今", "start": 0}]
+        )
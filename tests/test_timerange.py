@@ -0,0 +1,88 @@
+import pytest
+
+import timerange
+from timerange import TimeRange
+
+
+@pytest.mark.parametrize(
+    "text, timestamp_ms",
+    [
+        ("0", 0),
+        ("45", 45000),
+        ("1.5", 1500),
+        ("30:00", 1800000),
+        (" 1:02:03.25 ", 3723250),
+        ("90:00", 5400000),
+    ],
+)
+def test_parse_timestamp(text, timestamp_ms):
+    assert timerange.parse_timestamp(text) == timestamp_ms
+
+
+@pytest.mark.parametrize("text", ["", "1::2", "1:2:3:4", "abc", "1:xx", "1.5:00", "-5"])
+def test_parse_timestamp_rejects_invalid_text(text):
+    with pytest.raises(ValueError):
+        timerange.parse_timestamp(text)
+
+
+def test_parse_time_range():
+    assert timerange.parse_time_range(None, None) is None
+    assert timerange.parse_time_range("", "") is None
+    assert timerange.parse_time_range("30:00", "45:00") == TimeRange(1800000, 2700000)
+    assert timerange.parse_time_range("1:30:00", None) == TimeRange(5400000, None)
+    assert timerange.parse_time_range(None, "10") == TimeRange(0, 10000)
+
+
+@pytest.mark.parametrize("start, end", [("10", "10"), ("45:00", "30:00")])
+def test_parse_time_range_requires_end_after_start(start, end):
+    with pytest.raises(ValueError):
+        timerange.parse_time_range(start, end)
+
+
+def test_parse_link_line():
+    url = "https://www.bilibili.com/video/BV1xx"
+
+    assert timerange.parse_link_line(url) == (url, None)
+    assert timerange.parse_link_line(f"{url} 1:30:00") == (url, TimeRange(5400000))
+    assert timerange.parse_link_line(f"{url}  30:00\t45:00") == (
+        url,
+        TimeRange(1800000, 2700000),
+    )
+    with pytest.raises(ValueError):
+        timerange.parse_link_line(f"{url} 1 2 3")
+
+
+def test_range_names_and_formats():
+    time_range = TimeRange(1800000, 2700000)
+
+    assert time_range.directory_name() == "range_1800000-2700000"
+    assert time_range.label() == "0030m00s-0045m00s"
+    assert TimeRange(5400000).label() == "0090m00s-end"
+    assert timerange.format_timestamp(3723250) == "01:02:03.250"
+
+
+def test_slice_recognition_result_keeps_words_starting_in_range():
+    recognition_data = {
+        "text": "a b c d",
+        "timestamp": [[0, 100], [1000, 1100], [2000, 2100], [3000, 3100]],
+        "raw_inference_output": {"key": "audio"},
+    }
+
+    sliced = timerange.slice_recognition_result(
+        recognition_data, TimeRange(1000, 3000)
+    )
+
+    assert sliced["text"] == "b c"
+    assert sliced["timestamp"] == [[1000, 1100], [2000, 2100]]
+    assert sliced["raw_inference_output"]["key"] == "audio"
+    assert timerange.slice_recognition_result({"text": "a"}, TimeRange(0)) is None
+
+
+def test_offset_recognition_result_shifts_to_original_media():
+    shifted = timerange.offset_recognition_result(
+        {"text": "a b", "timestamp": [[0, 100], [500, 600]]}, 1800000
+    )
+
+    assert shifted["timestamp"] == [[1800000, 1800100], [1800500, 1800600]]
+    assert shifted["raw_inference_output"]["timestamp"] == shifted["timestamp"]
+    assert shifted["timestamp_offset_ms"] == 1800000
@@ -0,0 +1,58 @@
+import os
+import wave
+
+import numpy as np
+
+import init
+
+
+def test_slice_plan_covers_every_sample_once():
+    slice_plan = init.build_transcode_slice_plan(10.0, 3)
+
+    assert slice_plan == [(0, 53333), (53333, 53333), (106666, None)]
+    for (start_sample, sample_count), (next_start_sample, _) in zip(
+        slice_plan, slice_plan[1:]
+    ):
+        assert start_sample + sample_count == next_start_sample
+
+
+def test_single_slice_plan_reads_to_end():
+    assert init.build_transcode_slice_plan(3600.5, 1) == [(0, None)]
+
+
+def test_slice_count_follows_duration_and_cores(monkeypatch):
+    monkeypatch.setattr(init, "TRANSCODE_SLICE_COUNT", 0)
+    monkeypatch.setattr(
+        os, "sched_getaffinity", lambda pid: set(range(8)), raising=False
+    )
+
+    assert init.choose_transcode_slice_count(None) == 1
+    assert init.choose_transcode_slice_count(600) == 1
+    # 每片至少 MIN_TRANSCODE_SLICE_SECONDS 秒
+    assert init.choose_transcode_slice_count(1800) == 6
+    assert init.choose_transcode_slice_count(36000) == 8
+
+    monkeypatch.setattr(init, "TRANSCODE_SLICE_COUNT", 3)
+    assert init.choose_transcode_slice_count(600) == 3
+
+
+def write_pcm(pcm_path, samples):
+    pcm_path.write_bytes(np.asarray(samples, dtype=np.int16).tobytes())
+
+
+def test_assembled_wav_trims_overlap_and_pads_short_slices(tmp_path):
+    slice_plan = [(0, 4), (4, 4), (8, None)]
+    slice_pcm_paths = [tmp_path / f"slice_{index:03d}.pcm" for index in range(3)]
+    # 第一片多解码了重叠部分，第二片比预期短，最后一片读到结尾
+    write_pcm(slice_pcm_paths[0], [1, 2, 3, 4, 99, 99])
+    write_pcm(slice_pcm_paths[1], [5, 6])
+    write_pcm(slice_pcm_paths[2], [9, 10, 11])
+    target_wav_path = tmp_path / "audio.wav"
+
+    init.assemble_wav_from_slices(slice_pcm_paths, slice_plan, target_wav_path)
+
+    with wave.open(str(target_wav_path), "rb") as wav_file:
+        assert wav_file.getframerate() == init.AUDIO_SAMPLING_RATE
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), np.int16)
+    assert samples.tolist() == [1, 2, 3, 4, 5, 6, 0, 0, 9, 10, 11]
+    assert not any(path.exists() for path in slice_pcm_paths)
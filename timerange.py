@@ -0,0 +1,133 @@
+"""
+只转录媒体中的一段时间：解析 --start/--end 与批量链接文件中的时间范围，
+并从完整任务的识别结果中截取范围内的单词。范围任务的时间戳始终以原始媒体为准。
+
+批量链接文件每行为 "<链接> [开始] [结束]"，如：
+    https://www.bilibili.com/video/BV1xx 30:00 45:00
+    https://www.bilibili.com/video/BV1xx 1:30:00        从 1:30:00 到结尾
+"""
+
+from typing import NamedTuple, Optional
+
+from process import WordTimestamps
+
+
+class TimeRange(NamedTuple):
+    start_ms: int
+    # None 表示直到媒体结尾
+    end_ms: Optional[int] = None
+
+    def directory_name(self) -> str:
+        end_label = "end" if self.end_ms is None else str(self.end_ms)
+        return f"range_{self.start_ms}-{end_label}"
+
+    def label(self) -> str:
+        """用于输出文件名，如 0030m00s-0045m00s"""
+        end_label = "end" if self.end_ms is None else format_label(self.end_ms)
+        return f"{format_label(self.start_ms)}-{end_label}"
+
+
+def parse_timestamp(text: str) -> int:
+    """解析 "SS"、"MM:SS"、"HH:MM:SS"（秒可带小数），返回毫秒"""
+    fields = text.strip().split(":")
+    if not 1 <= len(fields) <= 3 or not all(fields):
+        raise ValueError(f"无法解析时间: {text!r}")
+    try:
+        seconds = float(fields[-1])
+        minutes_and_hours = [int(field) for field in fields[:-1]]
+    except ValueError:
+        raise ValueError(f"无法解析时间: {text!r}") from None
+    for multiplier, value in zip((60, 3600), reversed(minutes_and_hours)):
+        seconds += multiplier * value
+    if seconds < 0:
+        raise ValueError(f"时间不能为负: {text!r}")
+    return round(seconds * 1000)
+
+
+def parse_time_range(
+    start: Optional[str], end: Optional[str]
+) -> Optional[TimeRange]:
+    """两者都未指定时返回 None，表示处理完整媒体"""
+    if not start and not end:
+        return None
+    time_range = TimeRange(
+        parse_timestamp(start) if start else 0,
+        parse_timestamp(end) if end else None,
+    )
+    if time_range.end_ms is not None and time_range.end_ms <= time_range.start_ms:
+        raise ValueError("结束时间必须晚于开始时间")
+    return time_range
+
+
+def parse_link_line(line: str) -> tuple[str, Optional[TimeRange]]:
+    """拆分批量链接文件中的一行为 (链接, 时间范围)"""
+    fields = line.split()
+    if len(fields) > 3:
+        raise ValueError(f"链接行格式应为 '<链接> [开始] [结束]': {line!r}")
+    return fields[0], parse_time_range(*(fields[1:] + [None, None])[:2])
+
+
+def format_timestamp(timestamp_ms: int) -> str:
+    """格式化为 HH:MM:SS.mmm，供 yt-dlp 与 ffmpeg 使用"""
+    seconds, milliseconds = divmod(timestamp_ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def format_label(timestamp_ms: int) -> str:
+    minutes, seconds = divmod(timestamp_ms // 1000, 60)
+    return f"{minutes:04d}m{seconds:02d}s"
+
+
+def offset_recognition_result(recognition_data: dict, offset_ms: int) -> dict:
+    """把从范围起点开始计时的识别结果平移到原始媒体的时间轴"""
+    shifted_timestamps = [
+        [word_start + offset_ms, word_end + offset_ms]
+        for word_start, word_end in recognition_data.get("timestamp") or []
+    ]
+    return {
+        **recognition_data,
+        "timestamp": shifted_timestamps,
+        "raw_inference_output": {
+            **recognition_data.get("raw_inference_output", {}),
+            "timestamp": shifted_timestamps,
+        },
+        "timestamp_offset_ms": offset_ms,
+    }
+
+
+def slice_recognition_result(
+    recognition_data: dict, time_range: TimeRange
+) -> Optional[dict]:
+    """
+    从完整任务的识别结果中截取起始时间落在范围内的单词，时间戳保持不变。
+    完整结果缺少时间戳时无法按时间截取，返回 None。
+    """
+    if not recognition_data.get("timestamp"):
+        return None
+    words = WordTimestamps.from_recognition_result(recognition_data)
+    in_range = words.starts >= time_range.start_ms
+    if time_range.end_ms is not None:
+        in_range &= words.starts < time_range.end_ms
+    word_indices = in_range.nonzero()[0]
+    if len(word_indices):
+        first_word, end_word = int(word_indices[0]), int(word_indices[-1]) + 1
+    else:
+        first_word = end_word = 0
+    sliced_text = words.join_text(first_word, end_word)
+    sliced_timestamps = [
+        [int(word_start), int(word_end)]
+        for word_start, word_end in zip(
+            words.starts[first_word:end_word], words.ends[first_word:end_word]
+        )
+    ]
+    return {
+        "text": sliced_text,
+        "timestamp": sliced_timestamps,
+        "raw_inference_output": {
+            "key": recognition_data.get("raw_inference_output", {}).get("key", ""),
+            "text": sliced_text,
+            "timestamp": sliced_timestamps,
+        },
+    }